@@ -0,0 +1,121 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# Compares the offset table parse in Block.read against the loops it replaced: the original one that read one
+# pointer at a time with int.from_bytes and scanned forward past empty slots, and the struct.unpack_from version
+# that decoded the table at once but walked it back in python
+# usage: python benchmarks/block_header.py [path/to/out_splineblock.bin or a folder of .bin files] [items_per_asset]
+
+import os
+import sys
+import struct
+import random
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swe1r.block import read_offset_table
+
+def original_readUInt32BE(buffer, cursor):
+    return int.from_bytes(buffer[cursor:cursor + 4], byteorder='big')
+
+def original_offset_table(file, items_per_asset):
+    asset_count = original_readUInt32BE(file, 0)
+    offsets = [[] for asset in range(asset_count)]
+    for i in range(asset_count):
+        for j in range(items_per_asset):
+            offset = i * 4 * items_per_asset + j * 4
+            asset_start = original_readUInt32BE(file, 4 + offset)
+            
+            if not asset_start:
+                offsets[i].append(None)
+                continue
+
+            asset_end = 0
+            while not asset_end and offset < len(file):
+                asset_end = original_readUInt32BE(file, 4 + offset + 4)
+                offset += 4
+                
+            offsets[i].append((asset_start, asset_end))
+    return offsets
+
+def unpacked_offset_table(buffer, items_per_asset):
+    asset_count = struct.unpack_from('>I', buffer, 0)[0]
+    item_count = asset_count * items_per_asset
+    pointers = struct.unpack_from(f'>{item_count + 1}I', buffer, 4)
+    
+    ends = [0] * item_count
+    end = pointers[item_count] or len(buffer)
+    for k in range(item_count - 1, -1, -1):
+        ends[k] = end
+        if pointers[k]:
+            end = pointers[k]
+    
+    return [[(pointers[k], ends[k]) if pointers[k] else None for k in range(i * items_per_asset, (i + 1) * items_per_asset)] for i in range(asset_count)]
+
+def synthetic_block(asset_count, items_per_asset, empty_ratio = 0.6, seed = 0):
+    random.seed(seed)
+    item_count = asset_count * items_per_asset
+    header = bytearray((item_count + 2) * 4)
+    struct.pack_into('>I', header, 0, asset_count)
+    cursor = len(header)
+    for k in range(item_count):
+        if random.random() < empty_ratio:
+            continue
+        struct.pack_into('>I', header, 4 + k * 4, cursor)
+        cursor += random.randint(16, 256)
+    struct.pack_into('>I', header, (item_count + 1) * 4, cursor)
+    return bytes(header) + bytes(cursor - len(header))
+
+def blocks(path, items_per_asset):
+    # a folder is read file by file, models and textures keep two items per asset
+    if not os.path.isdir(path):
+        yield path, items_per_asset or 1
+        return
+    for name in sorted(os.listdir(path)):
+        if name.endswith('.bin') and os.path.isfile(os.path.join(path, name)):
+            yield os.path.join(path, name), items_per_asset or (2 if name in ['out_modelblock.bin', 'out_textureblock.bin'] else 1)
+
+def compare(label, buffer, items_per_asset):
+    current = read_offset_table(buffer, items_per_asset)
+    assert current == original_offset_table(buffer, items_per_asset) == unpacked_offset_table(buffer, items_per_asset), "Offset tables do not match"
+    
+    runs = 20
+    print(f"{label} ({len(current)} assets, {items_per_asset} per asset)")
+    timings = [(name, min(timeit.repeat(lambda: parse(buffer, items_per_asset), number = runs, repeat = 3)) / runs) for name, parse in [
+        ('original loop', original_offset_table),
+        ('struct.unpack_from', unpacked_offset_table),
+        ('read_offset_table', read_offset_table),
+    ]]
+    for name, elapsed in timings:
+        print(f"{name:>20}: {elapsed * 1000:8.3f} ms  ({timings[0][1] / elapsed:.1f}x)")
+
+def main():
+    items_per_asset = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    if len(sys.argv) > 1:
+        for path, items in blocks(sys.argv[1], items_per_asset):
+            with open(path, 'rb') as file:
+                compare(path, file.read(), items)
+        return
+    compare('synthetic sparse block (4096 slots, 60% empty)', synthetic_block(4096, 1), 1)
+
+if __name__ == "__main__":
+    main()
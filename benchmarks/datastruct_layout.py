@@ -0,0 +1,173 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# Memory and time of the DataStruct hierarchy with class level layouts and __slots__.
+# the Trak report parses the largest Trak models of a modelblock (or the largest synthetic fixtures without one)
+# twice: as they are, and with every slotted DataStruct swapped for a subclass that has a __dict__ and computes
+# its layout per instance again, the way the hierarchy used to work
+# usage: python benchmarks/datastruct_layout.py [folder with out_modelblock.bin] [--models 5]
+
+import os
+import sys
+import struct
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swe1r import general, modelblock, textureblock, splineblock
+from swe1r.general import FloatPosition, ShortPosition, RGBA4Bytes, DataStruct
+from swe1r.block import Block
+from swe1r.model_list import model_list
+import fixtures
+
+class LegacyDataStruct:
+    def __init__(self, format_string):
+        self.parent = None
+        self.format_string = format_string
+        self.size = struct.calcsize(self.format_string)
+        
+    def read(self, buffer, cursor):
+        self.data = struct.unpack_from(self.format_string, buffer, cursor)
+        return self
+
+class LegacyFloatPosition(LegacyDataStruct):
+    def __init__(self):
+        super().__init__('>3f')
+        self.data = [0,0,0]
+
+class LegacyShortPosition(LegacyDataStruct):
+    def __init__(self):
+        super().__init__('>3h')
+        self.data = [0,0,0]
+
+class LegacyRGBA4Bytes(LegacyDataStruct):
+    def __init__(self):
+        super().__init__('>4B')
+        self.data = [255, 255, 255, 255]
+
+def measure(factory, count, buffer):
+    tracemalloc.start()
+    start = time.perf_counter()
+    items = [factory().read(buffer, (i * 4) % 1024) for i in range(count)]
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    return elapsed, memory
+
+def compare_leaves(count = 200000):
+    buffer = os.urandom(2048)
+    print(f"{count} instances each")
+    for name, legacy, current in [
+        ('FloatPosition', LegacyFloatPosition, FloatPosition),
+        ('ShortPosition', LegacyShortPosition, ShortPosition),
+        ('RGBA4Bytes', LegacyRGBA4Bytes, RGBA4Bytes),
+    ]:
+        legacy_time, legacy_memory = measure(legacy, count, buffer)
+        current_time, current_memory = measure(current, count, buffer)
+        print(f"{name:>14}: {legacy_memory / count:6.1f} -> {current_memory / count:6.1f} bytes each, {legacy_time * 1000:7.1f} -> {current_time * 1000:7.1f} ms")
+
+def unslotted(cls):
+    def __init__(self, *args, **kwargs):
+        cls.__init__(self, *args, **kwargs)
+        self.format_string = cls.format_string
+        self.size = struct.calcsize(self.format_string) if self.format_string else 0
+    return type(cls.__name__, (cls,), {'__init__': __init__})
+
+def with_legacy_layouts(run):
+    modules = [general, modelblock, textureblock, splineblock]
+    swapped = {}
+    saved = []
+    for module in modules:
+        for name, value in list(vars(module).items()):
+            if isinstance(value, type) and issubclass(value, DataStruct) and '__slots__' in value.__dict__:
+                swapped.setdefault(value, unslotted(value))
+                saved.append((module, name, value))
+    for module, name, value in saved:
+        setattr(module, name, swapped[value])
+    try:
+        return run()
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+
+def read(block, id):
+    model = modelblock.Model(id, fps = 24)
+    model.modelblock = block
+    return model.read(block.fetch(id)[1])
+
+def parse(block, id, repeat = 3):
+    # timed without tracemalloc, which slows every allocation down, then read once more for the memory
+    elapsed = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        read(block, id)
+        elapsed = min(elapsed or float('inf'), time.perf_counter() - start)
+    tracemalloc.start()
+    model = read(block, id)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del model
+    return elapsed, memory
+
+def parse_trak_models(path, count, traks_only = True):
+    block = Block(path, 2).read(lazy = True)
+    block.update_progress = lambda message: None
+    ids = [id for id in range(len(block.offsets)) if block.offsets[id][1] is not None]
+    if traks_only:
+        ids = [id for id in ids if id < len(model_list) and model_list[id]['extension'] == 'Trak']
+    ids.sort(key = lambda id: -len(block.fetch(id)[1]))
+    
+    print("model                                     size      legacy        slotted")
+    totals = [0, 0, 0, 0]
+    for id in ids[:count]:
+        legacy_time, legacy_memory = with_legacy_layouts(lambda: parse(block, id))
+        current_time, current_memory = parse(block, id)
+        name = model_list[id]['name'] if traks_only else ''
+        print(f"{id:>5} {name:<28} {len(block.fetch(id)[1]) / 1024:8.1f} KB  {legacy_time * 1000:7.1f} ms {legacy_memory / 1024 / 1024:6.2f} MB  {current_time * 1000:7.1f} ms {current_memory / 1024 / 1024:6.2f} MB")
+        for i, value in enumerate([legacy_time, legacy_memory, current_time, current_memory]):
+            totals[i] += value
+    if totals[2] and totals[3]:
+        print(f"parse time {totals[0] / totals[2]:.2f}x faster, memory {100 - totals[3] / totals[1] * 100:.1f}% lower")
+    block.close()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Memory and parse time of the DataStruct hierarchy")
+    parser.add_argument('folder', nargs = '?', help = "folder with out_modelblock.bin, synthetic fixtures are used without it")
+    parser.add_argument('--models', type = int, default = 5, help = "how many of the largest models to parse")
+    args = parser.parse_args(argv)
+    
+    compare_leaves()
+    if args.folder:
+        parse_trak_models(os.path.join(args.folder, 'out_modelblock.bin'), args.models)
+        return 0
+    with tempfile.TemporaryDirectory() as folder:
+        # the fixtures are Parts, big ones stand in for tracks
+        fixtures.generate(folder, models = args.models, nodes = 24, meshes = 4, verts = 200, textures = 0)
+        print("synthetic fixtures")
+        parse_trak_models(os.path.join(folder, 'out_modelblock.bin'), args.models, traks_only = False)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
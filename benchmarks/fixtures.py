@@ -0,0 +1,204 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# Writes synthetic out_modelblock.bin, out_textureblock.bin and out_splineblock.bin files with the add-on's own writers,
+# so the benchmarks (and anything else that needs .bin files) can run without a copy of the game.
+# usage: python benchmarks/fixtures.py <output folder> [--models 20] [--nodes 4] [--meshes 3] [--verts 60]
+#                                       [--textures 10] [--texture-size 32] [--formats 3 512 513 1024 1025]
+#                                       [--splines 4] [--points 64] [--seed 0]
+#        python benchmarks/roundtrip.py <output folder>
+
+import os
+import sys
+import math
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swe1r.block import Block
+from swe1r.general import FloatPosition, FloatVector
+from swe1r.modelblock import Model, Mesh, CollisionTags, CollisionTrigger, Anim, AnimList, Material, MaterialTexture, MeshBoundingBox, CollisionVertBuffer, CollisionVertStrips, VisualsVertBuffer, VisualsIndexBuffer, visuals_vert_dtype, create_node
+from swe1r.textureblock import Texture, Palette, Pixels, RGBA5551
+from swe1r.splineblock import Spline, SplinePoint
+
+texture_formats = [3, 512, 513, 1024, 1025]
+
+def make_mesh(group, model, material, verts, rng):
+    # a grid strip: collision and visuals share the same vertices
+    mesh = Mesh(group, model)
+    co = np.zeros((verts, 3), dtype = np.int64)
+    co[:, 0] = np.arange(verts) // 2 * 100
+    co[:, 1] = np.arange(verts) % 2 * 100
+    co += rng.integers(-20, 20, (verts, 3)) + rng.integers(-10000, 10000, 3)
+    
+    mesh.collision_vert_buffer = CollisionVertBuffer(mesh, model).from_array(co)
+    mesh.vert_strips = CollisionVertStrips(mesh, model).from_array([verts])
+    mesh.vert_strips.set_format('>1I')
+    mesh.vert_strips.strip_count = mesh.strip_count = 1
+    mesh.vert_strips.strip_size = mesh.strip_size = 5
+    mesh.vert_strips.include_buffer = True
+    
+    array = np.zeros(verts, dtype = visuals_vert_dtype)
+    array['co'] = co
+    array['uv'] = rng.integers(0, 4096, (verts, 2))
+    array['color'] = rng.integers(0, 256, (verts, 4))
+    mesh.visuals_vert_buffer = VisualsVertBuffer(mesh, model, verts)
+    mesh.visuals_vert_buffer.array = array
+    mesh.visuals_vert_buffer.chunks = None
+    mesh.visuals_index_buffer = VisualsIndexBuffer(mesh, model).unmake([[i, i + 1, i + 2] for i in range(verts - 2)])
+    
+    mesh.material = material
+    mesh.bounding_box = MeshBoundingBox(mesh, model).unmake(mesh)
+    return mesh
+
+def make_model(id, nodes, meshes, verts, textures, rng, triggers = 0, anims = 0):
+    # a Part: a transformed root holding mesh groups, every other one behind a pivot node.
+    # triggers hang off the first mesh and point at the root, anims move the root
+    model = Model(id, fps = 24)
+    model.type = '3'
+    root = create_node(53348, model, model)
+    root.header = [0]
+    model.nodes.append(root)
+    
+    material = Material(None, model)
+    if len(textures):
+        texture = textures[id % len(textures)]
+        material.texture = MaterialTexture(material, model)
+        material.texture.id, material.texture.format, material.texture.width, material.texture.height = texture.id, texture.format, texture.width, texture.height
+    
+    for n in range(nodes):
+        parent = root
+        if n % 2:
+            parent = create_node(53349, root, model)
+            parent.bonus = FloatPosition().from_array(rng.uniform(-100, 100, 3).tolist())
+            root.children.append(parent)
+        group = create_node(12388, parent, model)
+        parent.children.append(group)
+        for m in range(meshes):
+            group.children.append(make_mesh(group, model, material, verts, rng))
+        group.calc_bounding()
+    
+    if triggers:
+        mesh = root.children[0].children[0]
+        mesh.collision_tags = CollisionTags(mesh, model)
+        for t in range(triggers):
+            trigger = CollisionTrigger(mesh.collision_tags, model)
+            trigger.id = t + 1
+            trigger.target = root
+            trigger.position.from_array(rng.uniform(-1000, 1000, 3).tolist())
+            mesh.collision_tags.triggers.append(trigger)
+            model.triggers.append(trigger)
+    
+    for a in range(anims):
+        poses = rng.uniform(-100, 100, (3, 3)).tolist()
+        model.animations.append(Anim(root, model).unmake([0, 12, 24], poses, 'location'))
+    if anims:
+        model.Anim = AnimList(model.header, model).unmake()
+    
+    return model.write()
+
+def make_texture(id, format, size, rng):
+    texture = Texture(id, format, size, size)
+    texture.pixels = Pixels(texture)
+    if format == 3:
+        texture.pixels.data = rng.random(size * size * 4).tolist()
+        return [texture.pixels.write(), None]
+    
+    if format in [512, 513]:
+        colors = 16 if format == 512 else 256
+        texture.palette = Palette(texture)
+        texture.palette.data = [RGBA5551().from_array([*(rng.integers(0, 32, 3) / 0x1F).tolist(), 1.0]) for i in range(colors)]
+        texture.pixels.data = rng.integers(0, colors, size * size).tolist()
+        return [texture.pixels.write(), texture.palette.write()]
+    
+    texture.pixels.data = rng.integers(0, 16 if format == 1024 else 256, size * size).tolist()
+    return [texture.pixels.write(), None]
+
+def make_spline(id, points, rng):
+    # a loop with a shortcut between two opposite points
+    spline = Spline(id)
+    radius = 10000
+    for i in range(points):
+        angle = 2 * math.pi * i / points
+        point = SplinePoint()
+        point.id = i
+        point.next = [(i + 1) % points]
+        point.previous = [(i - 1) % points]
+        position = [radius * math.cos(angle), radius * math.sin(angle), rng.uniform(-100, 100)]
+        tangent = [-math.sin(angle) * 500, math.cos(angle) * 500, 0]
+        point.position = FloatPosition().from_array(position)
+        point.rotation = FloatVector().from_array([0, 0, 1])
+        point.handle1 = FloatPosition().from_array([p - t for p, t in zip(position, tangent)])
+        point.handle2 = FloatPosition().from_array([p + t for p, t in zip(position, tangent)])
+        spline.points.append(point)
+    if points >= 8:
+        a, b = points // 4, points // 4 * 3
+        spline.points[a].next.append(b)
+        spline.points[b].previous.append(a)
+    spline.calculate_progress(True)
+    spline.point_count = len(spline.points)
+    spline.segment_count = sum([len(point.next) for point in spline.points])
+    return [spline.write()]
+
+def write_block(path, items_per_asset, assets):
+    block = Block(path, items_per_asset)
+    block.data = assets
+    with open(path, 'wb') as file:
+        file.write(block.write())
+    return os.path.getsize(path)
+
+def generate(folder, models = 20, nodes = 4, meshes = 3, verts = 60, textures = 10, texture_size = 32, formats = texture_formats, splines = 4, points = 64, seed = 0):
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok = True)
+    
+    texture_list = [Texture(i, formats[i % len(formats)], texture_size, texture_size) for i in range(textures)]
+    sizes = {
+        'out_textureblock.bin': write_block(os.path.join(folder, 'out_textureblock.bin'), 2, [make_texture(texture.id, texture.format, texture_size, rng) for texture in texture_list]),
+        'out_modelblock.bin': write_block(os.path.join(folder, 'out_modelblock.bin'), 2, [make_model(id, nodes, meshes, verts, texture_list, rng) for id in range(models)]),
+        'out_splineblock.bin': write_block(os.path.join(folder, 'out_splineblock.bin'), 1, [make_spline(id, points, rng) for id in range(splines)]),
+    }
+    return sizes
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Write synthetic SWE1R .bin files for benchmarks and tests")
+    parser.add_argument('folder')
+    parser.add_argument('--models', type = int, default = 20)
+    parser.add_argument('--nodes', type = int, default = 4, help = "mesh groups per model")
+    parser.add_argument('--meshes', type = int, default = 3, help = "meshes per mesh group")
+    parser.add_argument('--verts', type = int, default = 60, help = "vertices per mesh")
+    parser.add_argument('--textures', type = int, default = 10)
+    parser.add_argument('--texture-size', type = int, default = 32, help = "width and height, a multiple of 16")
+    parser.add_argument('--formats', type = int, nargs = '+', choices = texture_formats, default = texture_formats)
+    parser.add_argument('--splines', type = int, default = 4)
+    parser.add_argument('--points', type = int, default = 64, help = "points per spline")
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args(argv)
+    
+    assert args.verts >= 3, "Meshes need at least 3 vertices"
+    assert args.texture_size % 16 == 0, "Texture size has to be a multiple of 16"
+    sizes = generate(args.folder, args.models, args.nodes, args.meshes, args.verts, args.textures, args.texture_size, args.formats, args.splines, args.points, args.seed)
+    for name, size in sizes.items():
+        print(f"{name:<22} {size / 1024:10.1f} KB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# Compares the scalar helpers in swe1r/general.py against the old slice + int.from_bytes versions, first by
+# decoding every word of every model in a modelblock (also through a BinaryReader, one value at a time and with
+# read_array), then on a full Model.read of every model with the modelblock's read helpers swapped for the old ones.
+# without a modelblock the synthetic fixtures are used
+# usage: python benchmarks/general_codecs.py [path/to/out_modelblock.bin] [--repeat N]
+
+import os
+import sys
+import struct
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from swe1r import modelblock as modelblock_module
+from swe1r.block import Block
+from swe1r.general import readUInt8, readInt16BE, readUInt32BE, readFloatBE, BinaryReader
+from swe1r.modelblock import Model
+import fixtures
+
+def legacy_readUInt8(buffer, cursor):
+    return int.from_bytes(buffer[cursor: cursor+1], byteorder='big')
+
+def legacy_readInt16BE(buffer, cursor):
+    return int.from_bytes(buffer[cursor:cursor + 2], byteorder='big', signed = True)
+
+def legacy_readUInt32BE(buffer, cursor):
+    return int.from_bytes(buffer[cursor:cursor + 4], byteorder='big')
+
+def legacy_readInt32BE(buffer, cursor):
+    return int.from_bytes(buffer[cursor:cursor + 4], byteorder='big', signed = True)
+
+def legacy_readFloatBE(buffer, cursor):
+    return struct.unpack_from('>f', buffer, cursor)[0]
+
+def legacy_readString(buffer, cursor):
+    return buffer[cursor:cursor + 4].decode('utf-8', errors='replace')
+
+# the helpers modelblock imported from general, as they were before the codecs were precompiled
+legacy_helpers = {
+    'readUInt8': legacy_readUInt8,
+    'readUInt32BE': legacy_readUInt32BE,
+    'readInt32BE': legacy_readInt32BE,
+    'readFloatBE': legacy_readFloatBE,
+    'readString': legacy_readString,
+}
+
+def decode(buffers, u8, i16, u32, f32):
+    total = 0
+    for buffer in buffers:
+        words = len(buffer) // 4 * 4
+        for i in range(0, words, 4):
+            total += u32(buffer, i)
+        for i in range(0, words, 2):
+            total += i16(buffer, i)
+        for i in range(0, words):
+            total += u8(buffer, i)
+        for i in range(0, words, 4):
+            f32(buffer, i)
+    return total
+
+def decode_reader(buffers):
+    total = 0
+    for buffer in buffers:
+        reader = BinaryReader(buffer)
+        words = len(buffer) // 4 * 4
+        for i in range(0, words, 4):
+            total += reader.u32()
+        reader.seek(0)
+        for i in range(0, words, 2):
+            total += reader.i16()
+        reader.seek(0)
+        for i in range(0, words):
+            total += reader.u8()
+        reader.seek(0)
+        for i in range(0, words, 4):
+            reader.f32()
+    return total
+
+def decode_arrays(buffers):
+    total = 0
+    for buffer in buffers:
+        reader = BinaryReader(buffer)
+        words = len(buffer) // 4
+        total += int(reader.read_array('>u4', words).sum(dtype = np.int64))
+        total += int(reader.seek(0).read_array('>i2', words * 2).sum(dtype = np.int64))
+        total += int(reader.seek(0).read_array(np.uint8, words * 4).sum(dtype = np.int64))
+        reader.seek(0).read_array('>f4', words).tolist()
+    return total
+
+def read_models(block, ids):
+    nodes = 0
+    for id in ids:
+        model = Model(id, fps = 24)
+        model.modelblock = block
+        model = model.read(block.fetch(id)[1])
+        nodes += len(model.nodes)
+    return nodes
+
+def with_helpers(helpers, run):
+    saved = {name: getattr(modelblock_module, name) for name in helpers}
+    for name, helper in helpers.items():
+        setattr(modelblock_module, name, helper)
+    try:
+        return run()
+    finally:
+        for name, helper in saved.items():
+            setattr(modelblock_module, name, helper)
+
+def best_of(run, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def report(label, timings):
+    print(label)
+    baseline = timings['legacy int.from_bytes']
+    for name, elapsed in timings.items():
+        print(f"{name:>24}: {elapsed * 1000:8.1f} ms  ({baseline / elapsed:.2f}x)")
+
+def run(path, repeat):
+    block = Block(path, 2).read()
+    block.update_progress = lambda message: None
+    ids = [i for i in range(len(block.data)) if block.fetch(i)[1]]
+    buffers = [bytes(block.fetch(i)[1]) for i in ids]
+    
+    timings = {}
+    results = []
+    for name, decoder in [
+        ('legacy int.from_bytes', lambda: decode(buffers, legacy_readUInt8, legacy_readInt16BE, legacy_readUInt32BE, legacy_readFloatBE)),
+        ('precompiled helpers', lambda: decode(buffers, readUInt8, readInt16BE, readUInt32BE, readFloatBE)),
+        ('BinaryReader', lambda: decode_reader(buffers)),
+        ('BinaryReader.read_array', lambda: decode_arrays(buffers)),
+    ]:
+        timings[name], result = best_of(decoder, repeat)
+        results.append(result)
+    assert len(set(results)) == 1, "the helpers decoded different values"
+    report(f"every word of {len(buffers)} models in {path}", timings)
+    
+    timings = {}
+    results = []
+    for name, helpers in [
+        ('legacy int.from_bytes', legacy_helpers),
+        ('precompiled helpers', {}),
+    ]:
+        timings[name], result = best_of(lambda: with_helpers(helpers, lambda: read_models(block, ids)), repeat)
+        results.append(result)
+    assert results[0] == results[1], "Model.read found different nodes"
+    report(f"Model.read of {len(ids)} models", timings)
+    block.close()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Time the struct helpers on raw model data and in Model.read")
+    parser.add_argument('modelblock', nargs = '?', help = "out_modelblock.bin, the synthetic fixtures are used without it")
+    parser.add_argument('--repeat', type = int, default = 3, help = "best of this many runs")
+    args = parser.parse_args(argv)
+    
+    if args.modelblock:
+        run(args.modelblock, args.repeat)
+        return 0
+    with tempfile.TemporaryDirectory() as folder:
+        fixtures.generate(folder, models = 40, nodes = 8, verts = 120)
+        run(os.path.join(folder, 'out_modelblock.bin'), args.repeat)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
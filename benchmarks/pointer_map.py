@@ -0,0 +1,82 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# Building the pointer map one bit per highlight() call against collecting the locations and packing them once.
+# usage: python benchmarks/pointer_map.py [folder with out_modelblock.bin]
+# with a folder, the pointer map of every model is read back and checked for pointers that lead outside the model
+
+import os
+import sys
+import math
+import time
+import random
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+from swe1r.general import PointerMap
+from swe1r.block import Block
+
+def legacy_map(pointers, size):
+    hl = bytearray(1000000)
+    for cursor in pointers:
+        highlight_offset = cursor // 32
+        bit = 2 ** (7 - ((cursor % 32) // 4))
+        hl[highlight_offset] = hl[highlight_offset] | bit
+    return hl[:math.ceil(size / (32 * 4)) * 4]
+
+def packed_map(pointers, size):
+    hl = PointerMap()
+    for cursor in pointers:
+        hl.add(cursor)
+    return hl.pack(size)
+
+def compare(count = 50000, size = 4000000):
+    pointers = [random.randrange(0, size // 4) * 4 for i in range(count)]
+    results = []
+    for name, build in [('per bit', legacy_map), ('packbits', packed_map)]:
+        start = time.perf_counter()
+        result = build(pointers, size)
+        print(f"{name:>9}: {(time.perf_counter() - start) * 1000:7.1f} ms for {count} pointers")
+        results.append(bytes(result))
+    assert results[0] == results[1], "Pointer maps differ"
+    assert sorted(set(pointers)) == PointerMap.unpack(results[1]).pointers, "Pointer map does not read back"
+
+def check_block(folder):
+    models = Block(os.path.join(folder, 'out_modelblock.bin'), 2).read(lazy = True)
+    start = time.perf_counter()
+    count = 0
+    for id in range(len(models.offsets)):
+        offset_buffer, model_buffer = models.fetch(id)
+        if offset_buffer is None or model_buffer is None:
+            continue
+        hl = PointerMap.unpack(offset_buffer, len(model_buffer))
+        count += len(hl)
+        stray = hl.stray(model_buffer)
+        if len(stray):
+            print(f"model {id}: {len(stray)} stray pointer{'' if len(stray) == 1 else 's'}, first at {stray[0]}")
+    print(f"checked {count} pointers in {(time.perf_counter() - start) * 1000:.1f} ms")
+    models.close()
+
+if __name__ == "__main__":
+    compare()
+    if len(sys.argv) > 1:
+        check_block(sys.argv[1])
@@ -0,0 +1,245 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# Reads every model in a modelblock, writes it back and reads the result again. Times each step, records peak memory
+# and checks the round trip byte for byte and structurally (the same tree, buffers and materials, wherever they ended up)
+# usage: python benchmarks/roundtrip.py <folder with out_modelblock.bin> [--ids 1 2 3] [--json out.json] [--baseline old.json]
+#        blender -b --python benchmarks/roundtrip.py -- <folder> --make    (also times make and unmake)
+# the folder can be a game folder or one made by the fixture generator
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tracemalloc
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+from swe1r.block import Block
+from swe1r.general import PointerMap, compute_hash
+from swe1r.model_list import model_list
+from swe1r.modelblock import Model, Mesh, Node
+
+class WrittenBlock:
+    # stands in for the modelblock when reading a written model back, Podd models still need their MAlt
+    def __init__(self, block, id, items):
+        self.block = block
+        self.id = id
+        self.items = items
+        self.textureblock = getattr(block, 'textureblock', None)
+    
+    def fetch(self, id):
+        return self.items if id == self.id else self.block.fetch(id)
+    
+    def update_progress(self, message):
+        pass
+
+def fingerprint(model):
+    # nodes, meshes and materials are numbered in the order they are reached so addresses don't matter
+    order = {}
+    materials = {}
+    prints = [('model', model.type, [offset > 0 for offset in model.header.offsets])]
+    
+    def visit(node):
+        if isinstance(node, dict):
+            prints.append(('ref', order.get(node['id'], node['id'] is not None)))
+            return
+        if node is None:
+            prints.append(('empty',))
+            return
+        order[node.id] = len(order)
+        
+        if isinstance(node, Mesh):
+            material = None
+            if node.material is not None:
+                if node.material.id not in materials:
+                    materials[node.material.id] = len(materials)
+                texture = node.material.texture
+                material = (materials[node.material.id], node.material.format, tuple(node.material.shader.to_array()), None if texture is None else (texture.id, texture.format, texture.width, texture.height))
+            prints.append(('mesh', node.strip_count, node.strip_size, node.group_count, tuple(node.bounding_box.to_array()), order.get(node.group_parent_id, node.group_parent_id > 0),
+                None if node.vert_strips is None else tuple(node.vert_strips.data),
+                None if node.collision_vert_buffer is None else compute_hash(node.collision_vert_buffer.array.tobytes()),
+                None if node.visuals_vert_buffer is None else compute_hash(node.visuals_vert_buffer.as_array().tobytes()),
+                None if node.visuals_index_buffer is None else compute_hash(str(node.visuals_index_buffer.make()).encode()),
+                None if node.collision_tags is None else tuple(node.collision_tags.to_array()),
+                material))
+            return
+        
+        extra = []
+        for name in ['matrix', 'bonus', 'bounding_box', 'up_vector']:
+            value = getattr(node, name, None)
+            if value is not None:
+                extra.append(tuple(value.to_array()))
+        for name in ['floats', 'follow_position', 'track_position']:
+            if hasattr(node, name):
+                extra.append(getattr(node, name))
+        prints.append((type(node).__name__, node.node_type, node.vis_flags, node.col_flags, node.transform_flags, node.light_index, node.mirror_flags, tuple(node.header), len(node.children), tuple(extra)))
+        for child in node.children:
+            visit(child)
+    
+    for node in model.nodes:
+        visit(node)
+    for anim in (model.Anim.data if model.Anim else []):
+        prints.append(('anim', anim.flag2, tuple(anim.keyframe_times), tuple([tuple(pose.to_array()) if hasattr(pose.to_array(), '__len__') else pose.to_array() for pose in anim.keyframe_poses]), order.get(anim.target, materials.get(anim.target, anim.target))))
+    return prints
+
+def measure(step):
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = step()
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+def roundtrip(modelblock, id, make = False):
+    result = {'id': id, 'name': model_list[id]['name'] if id < len(model_list) else '', 'error': None}
+    offset_buffer, model_buffer = modelblock.fetch(id)
+    result['size'] = len(model_buffer)
+    step = 'read'
+    try:
+        def read():
+            model = Model(id, fps = 24)
+            model.modelblock = modelblock
+            return model.read(model_buffer)
+        model, result['read_ms'], result['read_peak'] = measure(read)
+        assert model is not None, "unrecognized model"
+        
+        step = 'write'
+        (written_offsets, written), result['write_ms'], result['write_peak'] = measure(model.write)
+        result['written_size'] = len(written)
+        result['identical'] = bytes(written) == bytes(model_buffer) and bytes(written_offsets) == bytes(offset_buffer)
+        result['stray'] = len(PointerMap.unpack(written_offsets, len(written)).stray(written))
+        
+        step = 'read back'
+        again = Model(id, fps = 24)
+        again.modelblock = WrittenBlock(modelblock, id, [written_offsets, written])
+        again = again.read(written)
+        result['structural'] = again is not None and fingerprint(again) == fingerprint(model)
+        
+        if make:
+            step = 'make'
+            collection, result['make_ms'], result['make_peak'] = measure(model.make)
+            step = 'unmake'
+            unmade, result['unmake_ms'], result['unmake_peak'] = measure(lambda: Model(id).unmake(collection, False, modelblock.textureblock))
+    except Exception as error:
+        result['error'] = f"{step}: {type(error).__name__}: {error}"
+    return result
+
+def run(folder, ids = None, make = False):
+    modelblock = Block(os.path.join(folder, 'out_modelblock.bin'), 2).read(lazy = True)
+    modelblock.update_progress = lambda message: None
+    texture_path = os.path.join(folder, 'out_textureblock.bin')
+    modelblock.textureblock = Block(texture_path, 2).read(lazy = True) if os.path.exists(texture_path) else None
+    
+    if ids is None:
+        ids = [id for id in range(len(modelblock.offsets)) if modelblock.offsets[id][1] is not None]
+    results = [roundtrip(modelblock, id, make) for id in ids]
+    
+    modelblock.close()
+    if modelblock.textureblock:
+        modelblock.textureblock.close()
+    return results
+
+def totals(results):
+    done = [result for result in results if not result['error']]
+    total = {
+        'models': len(results),
+        'failed': len(results) - len(done),
+        'identical': len([result for result in done if result['identical']]),
+        'structural': len([result for result in done if result['structural']]),
+        'peak': max([max(result['read_peak'], result['write_peak']) for result in done] or [0])
+    }
+    for key in ['read_ms', 'write_ms', 'make_ms', 'unmake_ms']:
+        if any([key in result for result in done]):
+            total[key] = sum([result.get(key, 0) * 1000 for result in done])
+    return total
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd = root, capture_output = True, text = True).stdout.strip() or None
+    except OSError:
+        return None
+
+def regressions(report, baseline, threshold):
+    # slower than threshold times the baseline, or no longer surviving the round trip
+    found = []
+    old = {result['id']: result for result in baseline['models']}
+    for result in report['models']:
+        before = old.get(result['id'])
+        if before is None:
+            continue
+        if result['error'] and not before['error']:
+            found.append(f"model {result['id']}: {result['error']}")
+            continue
+        if before['error'] or result['error']:
+            continue
+        for key in ['identical', 'structural']:
+            if before[key] and not result[key]:
+                found.append(f"model {result['id']}: no longer {key}")
+    for key in ['read_ms', 'write_ms', 'make_ms', 'unmake_ms']:
+        if key in report['totals'] and baseline['totals'].get(key):
+            ratio = report['totals'][key] / baseline['totals'][key]
+            if ratio > threshold:
+                found.append(f"{key}: {baseline['totals'][key]:.1f} -> {report['totals'][key]:.1f} ({ratio:.2f}x)")
+    return found
+
+def main(argv):
+    parser = argparse.ArgumentParser(description = "Round trip every model through Model.read and Model.write")
+    parser.add_argument('folder')
+    parser.add_argument('--ids', type = int, nargs = '+')
+    parser.add_argument('--make', action = 'store_true', help = "also time make and unmake (inside blender)")
+    parser.add_argument('--json', help = "save the report to this file")
+    parser.add_argument('--baseline', help = "report from an earlier run to compare against")
+    parser.add_argument('--threshold', type = float, default = 1.2, help = "slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+    
+    results = run(args.folder, args.ids, args.make)
+    report = {'commit': git_commit(), 'folder': os.path.abspath(args.folder), 'totals': totals(results), 'models': results}
+    
+    for result in results:
+        if result['error']:
+            print(f"{result['id']:>4} {result['name']:<32} {result['error']}")
+            continue
+        status = 'identical' if result['identical'] else 'structural' if result['structural'] else 'DIFFERENT'
+        print(f"{result['id']:>4} {result['name']:<32} {result['size']:>9} -> {result['written_size']:>9} bytes  read {result['read_ms'] * 1000:8.2f} ms  write {result['write_ms'] * 1000:8.2f} ms  {status}")
+    total = report['totals']
+    print(f"{total['models']} models, {total['failed']} failed, {total['identical']} identical, {total['structural']} structurally equal, peak {total['peak'] / 1024:.0f} KB")
+    
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent = 1)
+    
+    if args.baseline:
+        with open(args.baseline) as file:
+            found = regressions(report, json.load(file), args.threshold)
+        for line in found:
+            print(f"regression: {line}")
+        return 1 if len(found) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]))
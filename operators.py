@@ -24,6 +24,7 @@ import sys
 import importlib
 import traceback
 import uuid
+import time
 from bpy_extras.io_utils import ImportHelper
 from .swe1r.modelblock import SurfaceEnum, Model
 
@@ -32,8 +33,10 @@ modules = [
     'swr_export',
     'operators',
     'swe1r.model_list',
+    'swe1r.model_types',
     'swe1r.modelblock',
     'swe1r.block',
+    'swe1r.patch',
     'swe1r.textureblock',
     'swe1r.splineblock',
     'swe1r.general',
@@ -54,6 +57,7 @@ from .swe1r.block import *
 from .swe1r.textureblock import *
 from .swe1r.splineblock import *
 from .swe1r.general import *
+from .swe1r.patch import apply_patch
 #from .panels import *
 from .swr_import import *
 from .swr_export import *
@@ -65,9 +69,23 @@ class ImportOperator(bpy.types.Operator):
     bl_idname = "view3d.import_operator"
     bl_info = "Import the selected model"
     
-
+    # the scene is built from a timer so blender keeps drawing, each tick makes at most this many nodes
+    nodes_per_tick = 64
+    tick_seconds = 0.05
+    
+    @classmethod
+    def poll(cls, context):
+        return ImportJob.active is None
+    
+    def selector(self, context):
+        id = int(context.scene.import_model)
+        import_type = next((item[1] for item in model_types if item[0] == context.scene.import_type), None)
+        if id == -1:
+            return [model["index"] for model in model_list if model['extension'] == import_type]
+        return [id]
+    
     def execute(self, context):
-        
+        # scripts and redo get the blocking import, only invoke (the button) builds the scene from a timer
         folder_path = validate_folder_path(context.scene.import_folder, "out_modelblock.bin")
         if folder_path is None or folder_path == {"CANCELLED"}:
             return {"CANCELLED"}
@@ -84,13 +102,7 @@ class ImportOperator(bpy.types.Operator):
             bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
            
         try: 
-            id = int(context.scene.import_model)
-            import_type = next((item[1] for item in model_types if item[0] == context.scene.import_type), None)
-            if id == -1:
-                selector = [model["index"] for model in model_list if model['extension'] == import_type]
-            else:
-                selector = [int(context.scene.import_model)]
-            import_model(folder_path, selector, update_progress)
+            import_model(folder_path, self.selector(context), update_progress)
         except Exception as e:
             context.scene.import_progress = 1.0
             context.scene.import_status = ""
@@ -103,8 +115,93 @@ class ImportOperator(bpy.types.Operator):
         context.scene.import_status = ""
         
         return {'FINISHED'}
+
+    def invoke(self, context, event):
+        if ImportJob.active is not None:
+            self.report({'WARNING'}, "An import is already running")
+            return {'CANCELLED'}
+        
+        folder_path = validate_folder_path(context.scene.import_folder, "out_modelblock.bin")
+        if folder_path is None or folder_path == {"CANCELLED"}:
+            return {"CANCELLED"}
+        
+        # blocks and models are parsed on a worker thread while the timer below waits for them
+        self.job = ImportJob(folder_path, self.selector(context), context.scene.render.fps)
+        self.steps = None
+        self.job.begin()
+        self.job.start()
+        
+        context.scene.import_progress = 0.01
+        context.scene.import_status = 'Importing...'
+        wm = context.window_manager
+        wm.progress_begin(0, 100)
+        self.timer = wm.event_timer_add(self.tick_seconds, window = context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+    
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.job.cancel()
+            self.end(context)
+            self.report({'INFO'}, "Import cancelled")
+            return {'CANCELLED'}
+        
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        
+        try:
+            if self.job.reading:
+                self.show_progress(context)
+                return {'PASS_THROUGH'}
+            if self.job.error is not None:
+                raise self.job.error
+            
+            if self.steps is None:
+                self.steps = self.job.make_steps()
+            deadline = time.perf_counter() + self.tick_seconds
+            for i in range(self.nodes_per_tick):
+                next(self.steps)
+                if time.perf_counter() > deadline:
+                    break
+        except StopIteration:
+            self.end(context)
+            self.job.finish()
+            return {'FINISHED'}
+        except Exception as e:
+            self.job.cancel()
+            self.end(context)
+            print("Complete exception details:")
+            traceback.print_exception(type(e), e, e.__traceback__)
+            show_custom_popup(bpy.context, "An error occurred during import", str(e))
+            return {'CANCELLED'}
+        
+        self.show_progress(context)
+        return {'PASS_THROUGH'}
+    
+    def show_progress(self, context):
+        context.scene.import_progress = min(max(self.job.progress, 0.01), 0.99)
+        context.scene.import_status = self.job.status
+        context.window_manager.progress_update(int(self.job.progress * 100))
+        for area in context.screen.areas if context.screen else []:
+            area.tag_redraw()
+            
+    def end(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self.timer)
+        wm.progress_end()
+        context.scene.import_progress = 1.0
+        context.scene.import_status = ""
+        for area in context.screen.areas if context.screen else []:
+            area.tag_redraw()
     
 
+def model_collection(collection):
+    # objects usually sit in a sub collection (track, skybox, engines...), the model is the collection above it
+    parents = {child: parent for parent in bpy.data.collections for child in parent.children}
+    while collection is not None and collection.collection_type not in ['MODEL', 'NONE']:
+        collection = parents.get(collection)
+    return collection
+
 class ExportOperator(bpy.types.Operator):
     """Export the selected collection to the game files"""
     bl_label = "SWE1R Import/Export"
@@ -112,17 +209,24 @@ class ExportOperator(bpy.types.Operator):
 
     def execute(self, context):
         selected_objects = context.selected_objects
-        selected_collection = context.view_layer.active_layer_collection.collection
+        collections = [context.view_layer.active_layer_collection.collection]
         if selected_objects:
-            selected_collection = selected_objects[0].users_collection[0]
+            # every model with a selected object is exported together
+            collections = [obj.users_collection[0] for obj in selected_objects if len(obj.users_collection)]
             
-        if selected_collection is None:
+        if not len(collections):
             show_custom_popup(bpy.context, "No collection", "Exported items must be part of a collection")
             return {'CANCELLED'}
+        
+        selected_collections = []
+        for collection in collections:
+            collection = model_collection(collection)
+            if collection is not None and collection.export_model and collection not in selected_collections:
+                selected_collections.append(collection)
                 
         folder_path = context.scene.export_folder if context.scene.export_folder else context.scene.import_folder
         
-        if selected_collection.export_model is None:
+        if not len(selected_collections):
             show_custom_popup(bpy.context, "Invalid collection selected", "Please select a model collection to export")
             return {'CANCELLED'}
         if folder_path == "":
@@ -144,7 +248,7 @@ class ExportOperator(bpy.types.Operator):
             bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
             
         try:
-            export_model(selected_collection, folder_path, [context.scene.is_export_model, context.scene.is_export_texture, context.scene.is_export_spline], update_progress)
+            export_models(selected_collections, folder_path, [context.scene.is_export_model, context.scene.is_export_texture, context.scene.is_export_spline], update_progress)
         except Exception as e:
             print("Complete exception details:")
             traceback.print_exception(type(e), e, e.__traceback__)
@@ -158,6 +262,45 @@ class ExportOperator(bpy.types.Operator):
         
         return {'FINISHED'}
     
+class ApplyPatchOperator(bpy.types.Operator, ImportHelper):
+    """Apply a .swrp patch file to the .bin files in the export folder"""
+    bl_label = "Apply Patch"
+    bl_idname = "view3d.apply_patch"
+    
+    filename_ext = ".swrp"
+    filter_glob: bpy.props.StringProperty(
+        default="*.swrp",
+        options={'HIDDEN'},
+        maxlen=255
+    )
+    
+    def execute(self, context):
+        folder_path = context.scene.export_folder if context.scene.export_folder else context.scene.import_folder
+        if folder_path == "":
+            show_custom_popup(bpy.context, "No set export folder", "Select your folder containing the .bin files")
+            return {'CANCELLED'}
+        
+        context.scene.export_progress = 0.01
+        
+        def update_progress(status):
+            context.scene.export_progress = context.scene.export_progress + 0.1*(1.0 - context.scene.export_progress)
+            context.scene.export_status = status
+            bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
+        
+        try:
+            patch = apply_patch(self.filepath, folder_path, update_progress)
+        except Exception as e:
+            print("Complete exception details:")
+            traceback.print_exception(type(e), e, e.__traceback__)
+            show_custom_popup(bpy.context, "An error occurred while applying the patch", str(e))
+            return {'CANCELLED'}
+        finally:
+            context.scene.export_progress = 1.0
+            context.scene.export_status = ""
+        
+        show_custom_popup(bpy.context, "Patched!", f"Updated {', '.join([entry['name'] for entry in patch])}")
+        return {'FINISHED'}
+    
 class NewModelOperator(bpy.types.Operator):
     """Create a new model"""
     bl_label = "SWE1R Import/Export"
@@ -1037,12 +1180,15 @@ class OBJECT_OT_generate_material_assets(bpy.types.Operator):
             # Create a new empty blend file
             bpy.ops.wm.read_homefile(use_empty=True)
             
+            # textures shared between models are decoded once for the whole run
+            texture_cache.clear()
+            
             # Create a collection to organize all materials
             materials_collection = bpy.data.collections.new("SWE1R Materials")
             bpy.context.scene.collection.children.link(materials_collection)
             
-            modelblock = Block(folder_path + 'out_modelblock.bin', 2).read()
-            textureblock = Block(folder_path + 'out_textureblock.bin', 2).read()
+            modelblock = load_block(folder_path + 'out_modelblock.bin', 2)
+            textureblock = load_block(folder_path + 'out_textureblock.bin', 2)
             modelblock.textureblock = textureblock
             
             # PASS 1: Process models and extract materials, collecting metadata
@@ -1114,6 +1260,10 @@ class OBJECT_OT_generate_material_assets(bpy.types.Operator):
                         
                         bpy.data.materials.remove(mat)
 
+            modelblock.close()
+            textureblock.close()
+            print(f'Texture cache: {texture_cache.hits} hits, {texture_cache.misses} misses')
+            texture_cache.clear()
 
             # convert texture_models sets to sorted lists for easier reading
             for tex_id in texture_models:
@@ -1202,6 +1352,7 @@ register_classes = (
     ResetCollidable,
     ImportOperator,
     ExportOperator,
+    ApplyPatchOperator,
     NewModelOperator,
     ResetVColor,
     PreviewLoadTrigger,
@@ -1218,10 +1369,23 @@ register_classes = (
     OBJECT_OT_generate_material_assets
 )
 
+@bpy.app.handlers.persistent
+def invalidate_id_indexes(*args):
+    # ids can be edited in the ui and files reloaded, so the bpy.data side of the lookups is rescanned afterwards
+    obj_index.invalidate()
+    mat_index.invalidate()
+
+id_index_handlers = (bpy.app.handlers.depsgraph_update_post, bpy.app.handlers.load_post)
+
 def register():
     for c in register_classes:
         bpy.utils.register_class(c)
+    for handlers in id_index_handlers:
+        handlers.append(invalidate_id_indexes)
     
 def unregister():
+    for handlers in id_index_handlers:
+        if invalidate_id_indexes in handlers:
+            handlers.remove(invalidate_id_indexes)
     for c in register_classes:
         bpy.utils.unregister_class(c)
@@ -446,6 +446,7 @@ class ExportPanel(bpy.types.Panel):
             row.enabled = False
             
         layout.prop(context.scene, "is_export_separate", text = "Save copy to individual .bin file(s)")
+        layout.prop(context.scene, "is_export_patch", text = "Save as patch file instead")
         row = layout.row()
             
             
@@ -461,6 +462,8 @@ class ExportPanel(bpy.types.Panel):
             if collection.collection_type != "MODEL":
                 row = layout.row()
                 row.label(text = "Please select a model collection")
+        
+        layout.operator("view3d.apply_patch", text="Apply Patch", icon='FILE_TICK')
 
 # MARK: Tools   
 class ToolPanel(bpy.types.Panel):
@@ -805,6 +808,7 @@ class SelectedPanel(bpy.types.Panel):
                 row.enabled = False
                 
             layout.prop(context.scene, "is_export_separate", text = "Save copy to individual .bin file(s)")
+            layout.prop(context.scene, "is_export_patch", text = "Save as patch file instead")
             row = layout.row()
                 
             row.scale_y = 1.5
@@ -50,6 +50,7 @@ def register():
     bpy.types.Scene.is_export_texture = bpy.props.BoolProperty(name="Texture", update=save_settings, default=get_setting('is_export_texture', True))
     bpy.types.Scene.is_export_spline = bpy.props.BoolProperty(name="Spline", update=save_settings, default=get_setting('is_export_spline', True))
     bpy.types.Scene.is_export_separate = bpy.props.BoolProperty(name ="Separate", update =save_settings, default=get_setting('export_separate', False), description = "Save a copy of the exported elements as individual .bin files")
+    bpy.types.Scene.is_export_patch = bpy.props.BoolProperty(name ="Patch", update =save_settings, default=get_setting('is_export_patch', False), description = "Save only the changed assets to a .swrp patch file instead of rewriting the .bin files")
     
     bpy.types.Scene.flags_expanded = bpy.props.BoolProperty(name = 'flags_expanded', update=save_settings, default=get_setting('flags_expanded', False))
     bpy.types.Scene.fog_expanded = bpy.props.BoolProperty(name = 'fog_expanded', update=save_settings, default=get_setting('fog_expanded', False))
@@ -237,6 +238,7 @@ def unregister():
     del bpy.types.Scene.is_export_texture
     del bpy.types.Scene.is_export_spline
     del bpy.types.Scene.is_export_separate
+    del bpy.types.Scene.is_export_patch
     del bpy.types.Scene.collision_visible
     del bpy.types.Scene.collision_selectable
     del bpy.types.Scene.visuals_visible
@@ -0,0 +1,156 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# parses many models at once on every core. each worker maps the modelblock itself, so the file is shared through
+# the page cache instead of being copied into every process, and only small picklable summaries come back
+# usage (from the add-on folder): python -m swe1r.batch <folder> [--workers n] [--json file]
+
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .block import Block
+from .general import PointerMap
+from .model_list import model_list
+from .modelblock import Model, Mesh
+
+worker_block = None
+
+def init_worker(path):
+    global worker_block
+    worker_block = Block(path, 2).read(lazy = True)
+
+def walk_nodes(model):
+    # nodes can be shared between parents, every node is visited once
+    seen = set()
+    stack = list(model.nodes)
+    while len(stack):
+        node = stack.pop()
+        if node is None or id(node) in seen:
+            continue
+        seen.add(id(node))
+        yield node
+        stack.extend(getattr(node, 'children', []))
+
+def summarize_model(model, offset_buffer, model_buffer):
+    summary = {'nodes': 0, 'meshes': 0, 'visuals_verts': 0, 'collision_verts': 0, 'triggers': 0}
+    for node in walk_nodes(model):
+        if isinstance(node, Mesh):
+            summary['meshes'] += 1
+            # triggers hang off the collision tags of the mesh that owns them
+            if node.collision_tags is not None:
+                summary['triggers'] += len(node.collision_tags.triggers)
+            if node.visuals_vert_buffer is not None:
+                summary['visuals_verts'] += node.visuals_vert_buffer.length
+            if node.collision_vert_buffer is not None:
+                summary['collision_verts'] += node.collision_vert_buffer.length
+        else:
+            summary['nodes'] += 1
+    
+    hl = PointerMap.unpack(offset_buffer, len(model_buffer))
+    summary.update({
+        'materials': len(model.materials),
+        'textures': sorted(set([texture.id for texture in model.textures.values() if texture is not None])),
+        'animations': len(model.Anim.data) if model.Anim else 0,
+        'pointers': len(hl),
+        'stray': hl.stray(model_buffer)
+    })
+    return summary
+
+def read_model(id, summarize = summarize_model):
+    # runs in the worker
+    entry = model_list[id] if id < len(model_list) else {'name': '', 'extension': ''}
+    result = {'id': id, 'name': entry['name'], 'extension': entry['extension'], 'size': 0, 'error': None}
+    try:
+        offset_buffer, model_buffer = worker_block.fetch(id)
+        result['size'] = len(model_buffer)
+        # a forked worker still has bpy but no blender to ask for the scene fps
+        model = Model(id, fps = 24)
+        model.modelblock = worker_block
+        if model.read(model_buffer) is None:
+            result['error'] = "unrecognized model"
+            return result
+        result.update(summarize(model, offset_buffer, model_buffer))
+    except Exception:
+        result['error'] = traceback.format_exc(limit = -1).strip().split('\n')[-1]
+    return result
+
+def scan_models(folder, ids = None, workers = None, summarize = summarize_model, update_progress = None):
+    # summarize has to be a module level function so it can be sent to the workers
+    path = os.path.join(folder, 'out_modelblock.bin')
+    block = Block(path, 2).read(lazy = True)
+    try:
+        if ids is None:
+            ids = range(len(block.offsets))
+        sizes = {id: sum([item[1] - item[0] for item in block.offsets[id] if item is not None]) for id in ids if id < len(block.offsets) and block.offsets[id][1] is not None}
+    finally:
+        block.close()
+    # biggest models first so no worker is left with a long one at the end, empty slots are skipped
+    ids = sorted(sizes, key = lambda id: -sizes[id])
+    
+    # forking keeps the workers from importing the add-on (and bpy) again, spawn works when run outside of blender
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    results = {}
+    with ProcessPoolExecutor(max_workers = workers, mp_context = context, initializer = init_worker, initargs = (path,)) as executor:
+        futures = [executor.submit(read_model, id, summarize) for id in ids]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result['id']] = result
+            if update_progress:
+                update_progress(f"Read {len(results)}/{len(ids)} models")
+    
+    return [results[id] for id in sorted(results)]
+
+def format_scan(results):
+    lines = []
+    for result in results:
+        if result['error']:
+            lines.append(f"{result['id']:>4} {result['extension']:<4} {result['name']:<32} {result['error']}")
+            continue
+        stray = f"  {len(result['stray'])} stray pointers" if len(result['stray']) else ''
+        lines.append(f"{result['id']:>4} {result['extension']:<4} {result['name']:<32} {result['size']:>9} bytes {result['meshes']:>5} meshes {result['visuals_verts']:>7} verts{stray}")
+    return '\n'.join(lines)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Read every model in out_modelblock.bin on all cores")
+    parser.add_argument('folder')
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--json', help = "save the summaries to this file")
+    args = parser.parse_args(argv)
+    
+    start = time.perf_counter()
+    results = scan_models(args.folder, workers = args.workers)
+    elapsed = time.perf_counter() - start
+    
+    print(format_scan(results))
+    errors = len([result for result in results if result['error']])
+    print(f"{len(results)} models in {elapsed:.2f} s with {args.workers or os.cpu_count()} workers, {errors} failed")
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent = 1)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,51 +21,352 @@
 
 import struct
 import os
+import mmap
+import json
+import tempfile
+import shutil
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from .general import *
-from .textureblock import compute_hash
+
+HASH_INDEX_VERSION = 1
+
+# parsed blocks are shared between operators until the file on disk changes.
+# the limit is on what the cached blocks hold in memory, lazy blocks hold little more than their offsets
+# but keep a file map open each, so the number of entries is capped as well
+BLOCK_CACHE_LIMIT = 512 * 1024 * 1024
+BLOCK_CACHE_ENTRIES = 6
+block_cache = OrderedDict()
+block_cache_lock = threading.Lock()
+
+def read_offset_table(buffer, items_per_asset):
+    # a block starts with the asset count, then one pointer per item and a final pointer to the end of the block
+    asset_count = readUInt32BE(buffer, 0)
+    item_count = asset_count * items_per_asset
+    assert len(buffer) >= (item_count + 2) * 4, "Block is shorter than its offset table"
+    if not item_count:
+        return [[] for i in range(asset_count)]
+    
+    # copied out so nothing keeps a view into the file's map
+    pointers = np.frombuffer(buffer, dtype = '>u4', count = item_count + 1, offset = 4).astype(np.int64)
+    
+    # empty items have a null pointer, so each item ends at the next non-null pointer after it.
+    # the index of that pointer comes from a running minimum taken from the back of the table
+    following = pointers[1:].copy()
+    following[-1] = following[-1] or len(buffer)
+    index = np.where(following != 0, np.arange(item_count), item_count)
+    ends = following[np.minimum.accumulate(index[::-1])[::-1]]
+    
+    items = [item if item[0] else None for item in zip(pointers[:item_count].tolist(), ends.tolist())]
+    return [items[k:k + items_per_asset] for k in range(0, item_count, items_per_asset)]
+
+def write_all(fd, buffer):
+    view = memoryview(buffer)
+    while len(view):
+        written = os.write(fd, view)
+        view = view[written:]
+
+def copy_range(src, dst, offset, length):
+    # copy bytes between two file descriptors without pulling them through python where the os allows it,
+    # dst is written at its current position
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while length:
+                copied = os.copy_file_range(src, dst, length, offset)
+                if not copied:
+                    break
+                offset += copied
+                length -= copied
+        except OSError:
+            pass
+    if length and hasattr(os, 'sendfile'):
+        try:
+            while length:
+                copied = os.sendfile(dst, src, offset, length)
+                if not copied:
+                    break
+                offset += copied
+                length -= copied
+        except OSError:
+            pass
+    while length:
+        chunk = os.pread(src, min(length, 1 << 20), offset) if hasattr(os, 'pread') else None
+        if chunk is None:
+            os.lseek(src, offset, os.SEEK_SET)
+            chunk = os.read(src, min(length, 1 << 20))
+        assert len(chunk), "Source block ended early"
+        write_all(dst, chunk)
+        offset += len(chunk)
+        length -= len(chunk)
+
+def load_block(path, items_per_asset, update_progress = None, lazy = True):
+    # returns a private copy of a cached block, so callers can inject and close it freely
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns, items_per_asset, lazy)
+    
+    with block_cache_lock:
+        block = block_cache.get(key)
+        if block is not None:
+            block_cache.move_to_end(key)
+            if block.lazy and block.file is None:
+                # the map was released after the last import or export, the file has not changed since
+                block.remap()
+            return block.clone(update_progress)
+    
+    block = Block(path, items_per_asset, update_progress).read(lazy = lazy)
+    
+    with block_cache_lock:
+        if key in block_cache:
+            # another thread parsed it first
+            block.close()
+            block = block_cache[key]
+            if block.lazy and block.file is None:
+                block.remap()
+        else:
+            for other in [other for other in block_cache if other[0] == path and other[1:3] != key[1:3]]:
+                block_cache.pop(other).close()
+            block_cache[key] = block
+            trim_block_cache(key)
+        return block.clone(update_progress)
+
+def load_blocks(blocks, update_progress = None, lazy = True):
+    # loads several (path, items_per_asset) blocks at once, file reads and hashing release the gil.
+    # progress is only reported from the calling thread since blender can't redraw from the workers
+    if update_progress:
+        update_progress(f"Reading {', '.join([os.path.basename(path) for path, items_per_asset in blocks])}...")
+    
+    loaded = [None for block in blocks]
+    with ThreadPoolExecutor(max_workers = len(blocks) or 1) as executor:
+        futures = {executor.submit(load_block, path, items_per_asset, None, lazy): i for i, (path, items_per_asset) in enumerate(blocks)}
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                loaded[i] = future.result()
+                loaded[i].update_progress = update_progress
+                if update_progress:
+                    update_progress(f"Read {os.path.basename(blocks[i][0])}")
+        except BaseException:
+            for future in futures:
+                if not future.cancel() and future.exception() is None:
+                    future.result().close()
+            raise
+    return loaded
+
+def trim_block_cache(keep = None):
+    # oldest first, evicted blocks close their map
+    sizes = {key: block.resident_size() for key, block in block_cache.items()}
+    total = sum(sizes.values())
+    for key in list(block_cache):
+        if total <= BLOCK_CACHE_LIMIT and len(block_cache) <= BLOCK_CACHE_ENTRIES:
+            break
+        if key == keep:
+            continue
+        block_cache.pop(key).close()
+        total -= sizes[key]
+
+def invalidate_block(path = None):
+    # drops cached copies of a block, or all of them if no path is given
+    path = None if path is None else os.path.abspath(path)
+    with block_cache_lock:
+        for key in [key for key in block_cache if path is None or key[0] == path]:
+            block_cache.pop(key).close()
+
+def release_block_maps():
+    # closes the maps of every cached block once an import or export is done, so the game files are not held
+    # open in between. the parsed offsets and digests stay cached and load_block maps the file again
+    with block_cache_lock:
+        for block in block_cache.values():
+            block.close()
 
 class Block():
     def __init__(self, path, items_per_asset, update_progress = None):
         self.data = []
+        self.offsets = []
         self.hash_table = {}
+        self.digests = []
+        self.hashed = False
+        self.injected = set()
+        self.stat = None
         self.items_per_asset = items_per_asset
         self.path = path
         self.dir = os.path.dirname(self.path)
         self.update_progress = update_progress
+        self.lazy = False
+        self.file = None
+        self.view = None
+        self.owner = True
+        self.origin = None
+        # assets in the file on disk, inject() can pad offsets past it
+        self.file_count = 0
         
-    def read(self):
+    def read(self, lazy = False):
+        # lazy mode maps the file and only parses the offset table,
+        # assets are sliced out of the map (without copying) the first time they are fetched
         if self.update_progress:
             self.update_progress(f"Reading {self.path}...")
-        with open(self.path, 'rb') as file:
-            file = file.read()
+        self.lazy = lazy
+        self.owner = True
         
-        assert len(file) > 0, f"{self.dir} is an empty file"
+        if lazy:
+            with open(self.path, 'rb') as file:
+                assert os.fstat(file.fileno()).st_size > 0, f"{self.path} is an empty file"
+                self.file = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+            file = self.view = memoryview(self.file)
+        else:
+            with open(self.path, 'rb') as file:
+                file = file.read()
         
-        asset_count = readUInt32BE(file, 0)
+        # the sidecar hash index is keyed by the size and mtime of the file we actually read
+        stat = os.stat(self.path)
+        self.stat = (stat.st_size, stat.st_mtime_ns)
+        self.hash_table = {}
+        self.digests = []
+        self.hashed = False
+        self.injected = set()
         
-        #split into chunks
-        self.data = [[] for asset in range(asset_count)]
-        for i in range(asset_count):
-            for j in range(self.items_per_asset):
-                offset = i * 4 * self.items_per_asset + j * 4
-                asset_start = readUInt32BE(file, 4 + offset)
-                
-                if not asset_start:
-                    self.data[i].append(None)
-                    continue
-
-                asset_end = 0
-                while not asset_end and offset < len(file):
-                    asset_end = readUInt32BE(file, 4 + offset + 4)
-                    offset += 4
-                    
-                self.data[i].append(file[asset_start:asset_end])
-                
-            hash = compute_hash(b''.join([item for item in self.data[i] if item]))
-            self.hash_table[hash] = i
+        assert len(file) > 0, f"{self.path} is an empty file"
+        
+        self.offsets = read_offset_table(file, self.items_per_asset)
+        asset_count = self.file_count = len(self.offsets)
+        
+        if lazy:
+            self.data = [None for asset in range(asset_count)]
+            return self
         
+        self.data = [[None if offset is None else file[offset[0]:offset[1]] for offset in self.offsets[i]] for i in range(asset_count)]
+        
+        return self
+    
+    def remap(self):
+        # maps the file again without touching the parsed offsets or any injected assets
+        with open(self.path, 'rb') as file:
+            self.file = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+        self.view = memoryview(self.file)
+        self.owner = True
         return self
     
+    def clone(self, update_progress = None):
+        # a copy that shares the parsed offsets and the file map but has its own assets
+        block = Block(self.path, self.items_per_asset, update_progress)
+        block.offsets = list(self.offsets)
+        block.data = list(self.data)
+        block.stat = self.stat
+        block.file_count = self.file_count
+        block.lazy = self.lazy
+        block.owner = False
+        block.origin = self
+        if self.file is not None:
+            block.file = self.file
+            block.view = memoryview(self.file)
+        if self.hashed:
+            block.digests = list(self.digests)
+            block.hash_table = dict(self.hash_table)
+            block.hashed = True
+        return block
+    
+    def close(self):
+        # release the file map, any slices handed out by fetch() have to be dropped first.
+        # clones only let go of their view, the map is closed by the block that opened it
+        if self.file is None:
+            return
+        
+        for i, asset in enumerate(self.data):
+            if asset is not None and any(isinstance(item, memoryview) for item in asset):
+                self.data[i] = None
+        try:
+            self.view.release()
+            if self.owner:
+                self.file.close()
+        except BufferError:
+            # something outside the block still holds a slice, the map is freed with it
+            pass
+        self.file = None
+        self.view = None
+    
+    def resident_size(self):
+        # bytes of asset data held in memory plus the offset table, the untouched parts of a map don't count
+        size = len(self.offsets) * self.items_per_asset * 16
+        for asset in self.data:
+            if asset is not None:
+                size += sum([len(item) for item in asset if item])
+        return size
+    
+    def hash_path(self):
+        return self.path + '.md5.json'
+    
+    def load_hash_index(self):
+        # reuse the digests from the last run if the block on disk has not changed since
+        if self.stat is None:
+            return None
+        try:
+            with open(self.hash_path(), 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if not isinstance(index, dict) or index.get('version') != HASH_INDEX_VERSION:
+            return None
+        if index.get('path') != os.path.abspath(self.path) or [index.get('size'), index.get('mtime')] != list(self.stat):
+            return None
+        digests = index.get('digests')
+        if not isinstance(digests, list) or len(digests) != self.file_count:
+            return None
+        return digests
+    
+    def save_hash_index(self, digests):
+        index = {
+            'version': HASH_INDEX_VERSION,
+            'path': os.path.abspath(self.path),
+            'size': self.stat[0],
+            'mtime': self.stat[1],
+            'digests': digests
+        }
+        try:
+            with open(self.hash_path(), 'w') as f:
+                json.dump(index, f)
+        except OSError as e:
+            # the index is only a cache, a read-only game folder just means we hash again next time
+            print(f"Could not save hash index for {self.path}: {e}")
+    
+    def hash_asset(self, index):
+        return compute_hash(b''.join([item for item in self.fetch(index) if item]))
+    
+    def hash_assets(self):
+        file_count = self.file_count if self.stat is not None else 0
+        replaced = [i for i in self.injected if i < file_count]
+        digests = self.load_hash_index()
+        if digests is None:
+            if self.update_progress:
+                self.update_progress(f"Hashing {self.path}...")
+            digests = [self.hash_asset(i) for i in range(file_count)]
+            # only store digests that describe the file on disk
+            if file_count and not replaced:
+                self.save_hash_index(digests)
+        
+        if self.origin is not None and not replaced and not self.origin.hashed and self.origin.stat == self.stat:
+            # the cached block this was cloned from describes the same file, later clones start out hashed
+            self.origin.digests = list(digests)
+            self.origin.hash_table = {hash: i for i, hash in enumerate(digests)}
+            self.origin.hashed = True
+        
+        self.digests = list(digests)
+        for i in replaced:
+            self.digests[i] = self.hash_asset(i)
+        for i in range(file_count, len(self.data)):
+            self.digests.append(self.hash_asset(i))
+        self.hash_table = {}
+        for i, hash in enumerate(self.digests):
+            self.hash_table[hash] = i
+        self.hashed = True
+    
+    def digest(self, index):
+        if not self.hashed:
+            self.hash_assets()
+        return self.digests[index]
+    
     def write(self):
         asset_count = len(self.data)
         header = bytearray((asset_count * self.items_per_asset + 2) * 4)
@@ -76,18 +377,119 @@ class Block():
         cursor = len(header)
         
         for i in range(asset_count):
+            asset = self.fetch(i)
             for j in range(self.items_per_asset):
-                if self.data[i][j] and len(self.data[i][j]):
+                if asset[j] and len(asset[j]):
                     # write pointer in header
                     struct.pack_into('>I', header, 4 + (i * self.items_per_asset + j) * 4, cursor)
-                    block.append(self.data[i][j])
-                    cursor += len(self.data[i][j])
+                    block.append(asset[j])
+                    cursor += len(asset[j])
                     
         # end header with pointer to end of block
         struct.pack_into('>I', header, (asset_count * self.items_per_asset + 1) * 4, cursor)  
 
         return b''.join(block)
     
+    def commit(self):
+        # write the block back to self.path, only injected assets are written out of memory,
+        # everything else is copied straight from the original file.
+        # the new file is built next to the old one and swapped in once it is complete
+        asset_count = len(self.data)
+        header = bytearray((asset_count * self.items_per_asset + 2) * 4)
+        struct.pack_into('>I', header, 0, asset_count)
+        
+        source = None
+        if self.stat is not None and os.path.exists(self.path):
+            stat = os.stat(self.path)
+            assert (stat.st_size, stat.st_mtime_ns) == self.stat, f"{self.path} changed on disk since it was read"
+            source = os.open(self.path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        
+        if self.update_progress:
+            self.update_progress(f"Writing {self.path}...")
+        
+        fd, temp_path = tempfile.mkstemp(prefix = os.path.basename(self.path) + '.', suffix = '.tmp', dir = self.dir or None)
+        try:
+            # reserve the header, it is filled in once all the pointers are known
+            write_all(fd, header)
+            cursor = len(header)
+            pending = None # (start, end) of original bytes waiting to be copied
+            
+            for i in range(asset_count):
+                original = source is not None and i < len(self.offsets) and i not in self.injected
+                asset = self.offsets[i] if original else self.fetch(i)
+                for j in range(self.items_per_asset):
+                    item = asset[j]
+                    if not item:
+                        continue
+                    length = item[1] - item[0] if original else len(item)
+                    if not length:
+                        continue
+                    
+                    struct.pack_into('>I', header, 4 + (i * self.items_per_asset + j) * 4, cursor)
+                    cursor += length
+                    
+                    if original:
+                        # neighbouring untouched items are one copy
+                        if pending is not None and pending[1] == item[0]:
+                            pending = (pending[0], item[1])
+                            continue
+                        if pending is not None:
+                            copy_range(source, fd, pending[0], pending[1] - pending[0])
+                        pending = item
+                    else:
+                        if pending is not None:
+                            copy_range(source, fd, pending[0], pending[1] - pending[0])
+                            pending = None
+                        write_all(fd, item)
+            
+            if pending is not None:
+                copy_range(source, fd, pending[0], pending[1] - pending[0])
+            
+            struct.pack_into('>I', header, (asset_count * self.items_per_asset + 1) * 4, cursor)
+            os.lseek(fd, 0, os.SEEK_SET)
+            write_all(fd, header)
+            os.fsync(fd)
+        except BaseException:
+            os.close(fd)
+            if source is not None:
+                os.close(source)
+            os.remove(temp_path)
+            raise
+        
+        os.close(fd)
+        if source is not None:
+            os.close(source)
+            shutil.copymode(self.path, temp_path)
+        
+        lazy = self.lazy
+        try:
+            # the old file can't be replaced while it is still mapped on windows,
+            # cached copies are dropped even if closing this one fails
+            try:
+                self.close()
+            finally:
+                invalidate_block(self.path)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            # the old file is still in place, drop the new one and map the old one again so the block stays usable
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            if lazy and self.file is None:
+                self.remap()
+            raise
+        
+        self.offsets = read_offset_table(header, self.items_per_asset)
+        self.file_count = len(self.offsets)
+        stat = os.stat(self.path)
+        self.stat = (stat.st_size, stat.st_mtime_ns)
+        self.injected = set()
+        if self.hashed:
+            # the in memory digests now describe the file on disk
+            self.save_hash_index(self.digests)
+        if lazy:
+            self.read(lazy = True)
+        return self
+    
     def inject(self, data, index):
         assert len(data) == self.items_per_asset, "Number of items not suitable for this block"
         
@@ -97,18 +499,41 @@ class Block():
         if index >= len(self.data):
             for i in range(len(self.data)-1, index):
                 self.data.append([None for j in range(self.items_per_asset)])
+                self.offsets.append([None for j in range(self.items_per_asset)])
         
         self.data[index] = data
+        self.injected.add(index)
+        
+        # keep the hash index in step with the new contents
+        if self.hashed:
+            while len(self.digests) < len(self.data):
+                self.digests.append(self.hash_asset(len(self.digests)))
+            old_hash = self.digests[index]
+            if self.hash_table.get(old_hash) == index:
+                del self.hash_table[old_hash]
+                # another asset may share the old contents
+                for i in range(len(self.digests) - 1, -1, -1):
+                    if i != index and self.digests[i] == old_hash:
+                        self.hash_table[old_hash] = i
+                        break
+            hash = self.hash_asset(index)
+            self.digests[index] = hash
+            self.hash_table[hash] = index
         return self
             
     def fetch(self, index):
+        if self.data[index] is None:
+            assert self.view is not None, f"{self.path} was closed before asset {index} was fetched"
+            self.data[index] = [None if offset is None else self.view[offset[0]:offset[1]] for offset in self.offsets[index]]
         return self.data[index]
     
     def fetch_by_hash(self, hash):
+        if not self.hashed:
+            self.hash_assets()
+            
         if hash in self.hash_table:
             return self.hash_table[hash]
         
         return None
         
 
-
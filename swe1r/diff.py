@@ -0,0 +1,138 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# compares two game folders asset by asset without parsing any models
+# usage (from the add-on folder): python -m swe1r.diff <folder a> <folder b> [--block model|texture|spline]
+
+import os
+import sys
+import argparse
+from .block import Block
+from .model_list import model_list
+from .spline_map import spline_map
+
+block_files = {
+    'model': ('out_modelblock.bin', 2),
+    'texture': ('out_textureblock.bin', 2),
+    'spline': ('out_splineblock.bin', 1),
+}
+
+def asset_name(kind, index):
+    if kind == 'model' and index < len(model_list):
+        return f"{model_list[index]['name']} ({model_list[index]['extension']})"
+    if kind == 'spline':
+        models = [model for model, spline in spline_map.items() if spline == index]
+        if len(models) and models[0] < len(model_list):
+            return model_list[models[0]]['name']
+    return ''
+
+def asset_size(block, index):
+    if index >= len(block.offsets):
+        return None
+    items = [item for item in block.offsets[index] if item is not None]
+    if not len(items):
+        return None
+    return sum([item[1] - item[0] for item in items])
+
+def same_asset(a, b, index, digests):
+    # equal sizes are checked by the caller, cached digests are used when both sides have them,
+    # otherwise the items are compared straight out of the file maps one at a time
+    if digests:
+        return a.digests[index] == b.digests[index]
+    for item_a, item_b in zip(a.offsets[index], b.offsets[index]):
+        if (item_a is None) != (item_b is None):
+            return False
+        if item_a is None:
+            continue
+        if a.file[item_a[0]:item_a[1]] != b.file[item_b[0]:item_b[1]]:
+            return False
+    return True
+
+def diff_blocks(path_a, path_b, items_per_asset, kind = None):
+    a = Block(path_a, items_per_asset).read(lazy = True)
+    b = Block(path_b, items_per_asset).read(lazy = True)
+    try:
+        if os.path.samefile(path_a, path_b):
+            return {'added': [], 'removed': [], 'changed': []}
+
+        digests = False
+        digests_a = a.load_hash_index()
+        digests_b = b.load_hash_index()
+        if digests_a is not None and digests_b is not None:
+            a.digests, b.digests = digests_a, digests_b
+            digests = True
+
+        result = {'added': [], 'removed': [], 'changed': []}
+        for index in range(max(len(a.offsets), len(b.offsets))):
+            size_a = asset_size(a, index)
+            size_b = asset_size(b, index)
+            if size_a is None and size_b is None:
+                continue
+            entry = {'index': index, 'name': asset_name(kind, index), 'size_a': size_a, 'size_b': size_b}
+            if size_a is None:
+                result['added'].append(entry)
+            elif size_b is None:
+                result['removed'].append(entry)
+            elif size_a != size_b or not same_asset(a, b, index, digests):
+                result['changed'].append(entry)
+        return result
+    finally:
+        a.close()
+        b.close()
+
+def diff_folders(folder_a, folder_b, kinds = None):
+    result = {}
+    for kind in kinds or block_files:
+        name, items_per_asset = block_files[kind]
+        path_a = os.path.join(folder_a, name)
+        path_b = os.path.join(folder_b, name)
+        if not os.path.exists(path_a) or not os.path.exists(path_b):
+            continue
+        result[kind] = diff_blocks(path_a, path_b, items_per_asset, kind)
+    return result
+
+def format_diff(result):
+    lines = []
+    for kind, changes in result.items():
+        count = sum([len(entries) for entries in changes.values()])
+        lines.append(f"{block_files[kind][0]}: {count} difference{'' if count == 1 else 's'}")
+        for change, symbol in [('added', '+'), ('removed', '-'), ('changed', '~')]:
+            for entry in changes[change]:
+                sizes = f"{entry['size_a'] or 0} -> {entry['size_b'] or 0} bytes"
+                lines.append(f"  {symbol} {kind} {entry['index']:>4} {sizes:>24}  {entry['name']}")
+    return '\n'.join(lines)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "List the assets that differ between two SWE1R game folders")
+    parser.add_argument('folder_a')
+    parser.add_argument('folder_b')
+    parser.add_argument('--block', choices = list(block_files), action = 'append', help = "only compare this block (can be repeated)")
+    args = parser.parse_args(argv)
+
+    result = diff_folders(args.folder_a, args.folder_b, args.block)
+    if not len(result):
+        print("No matching .bin files found")
+        return 1
+    print(format_diff(result))
+    return 1 if any([len(entries) for changes in result.values() for entries in changes.values()]) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,73 +20,378 @@
 # /licenses>.
 
 import struct
+import hashlib
+import math
+import threading
+import numpy as np
 
     
 def clamp(value, min_value, max_value):
     return max(min(value, max_value), min_value)
 
+def compute_hash(buffer):
+    return hashlib.md5(buffer).hexdigest()
+
+def euclidean_distance(color1, color2):
+    return math.sqrt(sum((c1 - c2) ** 2 for c1, c2 in zip(color1, color2)))
+
+def show_custom_popup(context, title, message):
+    # the popup lives in the add-on, outside of blender (tests, benchmarks, worker processes) the message is printed.
+    # the same goes for worker threads, the ui may only be touched from blender's main thread
+    try:
+        import bpy
+        from ..utils import show_custom_popup as popup
+    except ImportError:
+        print(f"{title}: {message}")
+        return
+    if threading.current_thread() is not threading.main_thread():
+        print(f"{title}: {message}")
+        return
+    popup(context or bpy.context, title, message)
+
+# struct formats are compiled once and shared, struct.unpack_from(format, ...) has to look the format up on every call
+struct_cache = {}
+
+def get_struct(format_string):
+    compiled = struct_cache.get(format_string)
+    if compiled is None:
+        compiled = struct_cache[format_string] = struct.Struct(format_string)
+    return compiled
+
+uint8 = get_struct('>B')
+int8 = get_struct('>b')
+uint16 = get_struct('>H')
+int16 = get_struct('>h')
+uint32 = get_struct('>I')
+int32 = get_struct('>i')
+float32 = get_struct('>f')
+vec3 = get_struct('>fff')
+string4 = get_struct('>4s')
+
+def read_int(codec, buffer, cursor, signed):
+    # reads past the end of the buffer come back as 0 (or whatever bytes are left), like they always have
+    try:
+        return codec.unpack_from(buffer, cursor)[0]
+    except struct.error:
+        return int.from_bytes(buffer[cursor:cursor + codec.size], byteorder='big', signed = signed)
+
 def readUInt8(buffer, cursor):
-    return int.from_bytes(buffer[cursor: cursor+1], byteorder='big')
+    return read_int(uint8, buffer, cursor, False)
 
 def readInt8(buffer, cursor):
-    return int.from_bytes(buffer[cursor: cursor+1], byteorder='big', signed = True)
+    return read_int(int8, buffer, cursor, True)
 
 def readUInt16BE(buffer, cursor):
-    return int.from_bytes(buffer[cursor:cursor + 2], byteorder='big')
+    return read_int(uint16, buffer, cursor, False)
 
 def readInt16BE(buffer, cursor):
-    return int.from_bytes(buffer[cursor:cursor + 2], byteorder='big', signed = True)
+    return read_int(int16, buffer, cursor, True)
 
 def readUInt32BE(buffer, cursor):
-    return int.from_bytes(buffer[cursor:cursor + 4], byteorder='big')
+    return read_int(uint32, buffer, cursor, False)
 
 def readInt32BE(buffer, cursor):
-    return int.from_bytes(buffer[cursor:cursor + 4], byteorder='big', signed = True)
+    return read_int(int32, buffer, cursor, True)
 
 def readString(buffer, cursor):
-    return struct.unpack_from('4s', buffer, cursor)[0].decode('utf-8', errors='replace')
+    return string4.unpack_from(buffer, cursor)[0].decode('utf-8', errors='replace')
 
 def readFloatBE(buffer, cursor):
-    return struct.unpack_from('>f', buffer, cursor)[0]
+    return float32.unpack_from(buffer, cursor)[0]
 
 def readVec3(buffer, cursor):
-    return struct.unpack_from('>fff', buffer, cursor)
+    return vec3.unpack_from(buffer, cursor)
+
+class GrowableBuffer(bytearray):
+    # output buffer for the writers. it starts small and doubles whenever a write goes past the end, so memory
+    # tracks the size of what is actually written. end is the furthest byte written (or reserved) so far and
+    # section names what is being written so errors can say where it went wrong
+    def __init__(self, size = 4096, limit = None, name = 'buffer'):
+        super().__init__(size)
+        self.limit = limit
+        self.name = name
+        self.section = None
+        self.end = 0
+    
+    def where(self):
+        return f"{self.name}{' ' + self.section if self.section else ''}"
+    
+    def ensure(self, end):
+        if end <= self.end:
+            return
+        assert self.limit is None or end <= self.limit, f"{self.where()} overflowed: {end} bytes is past the {self.limit} byte limit"
+        if end > len(self):
+            size = max(end, len(self) * 2)
+            if self.limit is not None:
+                size = min(size, self.limit)
+            self.extend(bytes(size - len(self)))
+        self.end = end
+    
+    def check(self, cursor, size):
+        # pointers are only ever patched into space that has already been written or reserved
+        assert 0 <= cursor and cursor + size <= self.end, f"{self.where()}: pointer patch at {cursor} is outside the {self.end} bytes written so far"
+    
+    def crop(self, end = None):
+        # zero copy, the buffer can't grow any more while the view is held
+        end = self.end if end is None else end
+        self.ensure(end)
+        return memoryview(self)[:end]
+
+def ensure(buffer, end):
+    # plain bytearrays are left alone so the writers still work with a fixed size buffer
+    if type(buffer) is GrowableBuffer:
+        buffer.ensure(end)
+
+def pack_into(codec, buffer, cursor, *values):
+    if isinstance(codec, str):
+        codec = get_struct(codec)
+    ensure(buffer, cursor + codec.size)
+    codec.pack_into(buffer, cursor, *values)
+    return cursor + codec.size
+
+def patch_into(codec, buffer, cursor, *values):
+    # like pack_into but for filling in a pointer behind the cursor
+    if isinstance(codec, str):
+        codec = get_struct(codec)
+    if type(buffer) is GrowableBuffer:
+        buffer.check(cursor, codec.size)
+    codec.pack_into(buffer, cursor, *values)
+    return cursor + codec.size
+
+def write_bytes(buffer, cursor, data):
+    size = len(data)
+    ensure(buffer, cursor + size)
+    buffer[cursor:cursor + size] = data
+    return cursor + size
 
 def writeBulk(buffer, cursor, format_string, arr):
-    struct.pack_into(format_string, buffer, cursor, *arr)
-    return cursor + struct.calcsize(format_string)
+    return pack_into(get_struct(format_string), buffer, cursor, *arr)
 
 def writeString(buffer,  string, cursor):
-    struct.pack_into('>4s', buffer, cursor, string.encode('utf-8'))
-    return cursor + struct.calcsize('4s')
+    return pack_into(string4, buffer, cursor, string.encode('utf-8'))
 
 def writeInt8(buffer, num, cursor):
-    struct.pack_into('>b', buffer, cursor, num)
-    return cursor + struct.calcsize('b')
+    return pack_into(int8, buffer, cursor, num)
 
 def writeUInt8(buffer, num, cursor):
-    struct.pack_into('>B', buffer, cursor, num)
-    return cursor + struct.calcsize('B')
+    return pack_into(uint8, buffer, cursor, num)
 
 def writeInt16BE(buffer, num, cursor):
-    struct.pack_into('>h', buffer, cursor, num)
-    return cursor + struct.calcsize('h')
+    return pack_into(int16, buffer, cursor, num)
 
 def writeUInt16BE(buffer, num, cursor):
-    struct.pack_into('>H', buffer, cursor, num)
-    return cursor + struct.calcsize('H')
+    return pack_into(uint16, buffer, cursor, num)
 
 def writeInt32BE(buffer, num, cursor):
-    struct.pack_into('>i', buffer, cursor, num)
-    return cursor + struct.calcsize('i')
+    return pack_into(int32, buffer, cursor, num)
 
 def writeUInt32BE(buffer, num, cursor):
-    struct.pack_into('>I', buffer, cursor, num)
-    return cursor + struct.calcsize('I')
+    return pack_into(uint32, buffer, cursor, num)
+
+def patchUInt32BE(buffer, num, cursor):
+    return patch_into(uint32, buffer, cursor, num)
 
 def writeFloatBE(buffer, num, cursor):
-    struct.pack_into('>f', buffer, cursor, num)
-    return cursor + struct.calcsize('f')
+    return pack_into(float32, buffer, cursor, num)
+
+class BinaryReader:
+    # reads big endian values from a buffer and keeps track of the cursor
+    def __init__(self, buffer, cursor = 0):
+        self.buffer = memoryview(buffer)
+        self.cursor = cursor
+        
+    def __len__(self):
+        return len(self.buffer)
+    
+    def seek(self, cursor):
+        self.cursor = cursor
+        return self
+    
+    def skip(self, size):
+        self.cursor += size
+        return self
+    
+    def tell(self):
+        return self.cursor
+    
+    def unpack(self, format_string):
+        codec = get_struct(format_string)
+        data = codec.unpack_from(self.buffer, self.cursor)
+        self.cursor += codec.size
+        return data
+    
+    def u8(self):
+        value = uint8.unpack_from(self.buffer, self.cursor)[0]
+        self.cursor += 1
+        return value
+    
+    def i8(self):
+        value = int8.unpack_from(self.buffer, self.cursor)[0]
+        self.cursor += 1
+        return value
+    
+    def u16(self):
+        value = uint16.unpack_from(self.buffer, self.cursor)[0]
+        self.cursor += 2
+        return value
+    
+    def i16(self):
+        value = int16.unpack_from(self.buffer, self.cursor)[0]
+        self.cursor += 2
+        return value
+    
+    def u32(self):
+        value = uint32.unpack_from(self.buffer, self.cursor)[0]
+        self.cursor += 4
+        return value
+    
+    def i32(self):
+        value = int32.unpack_from(self.buffer, self.cursor)[0]
+        self.cursor += 4
+        return value
+    
+    def f32(self):
+        value = float32.unpack_from(self.buffer, self.cursor)[0]
+        self.cursor += 4
+        return value
+    
+    def vec3(self):
+        return self.unpack('>fff')
+    
+    def string(self):
+        return self.unpack('>4s')[0].decode('utf-8', errors='replace')
+    
+    def bytes(self, size):
+        data = self.buffer[self.cursor:self.cursor + size]
+        self.cursor += size
+        return data
+    
+    def read_array(self, dtype, count):
+        # bulk read as a numpy array (a view into the buffer), dtype is a numpy type like '>i2'
+        dtype = np.dtype(dtype)
+        array = np.frombuffer(self.buffer, dtype = dtype, count = count, offset = self.cursor)
+        self.cursor += dtype.itemsize * count
+        return array
+
+class BinaryWriter:
+    # writes big endian values into a buffer and keeps track of the cursor, a GrowableBuffer grows as needed
+    def __init__(self, buffer, cursor = 0):
+        self.buffer = buffer
+        self.cursor = cursor
+    
+    def seek(self, cursor):
+        self.cursor = cursor
+        return self
+    
+    def skip(self, size):
+        self.cursor += size
+        return self
+    
+    def tell(self):
+        return self.cursor
+    
+    def pack(self, format_string, *values):
+        self.cursor = pack_into(get_struct(format_string), self.buffer, self.cursor, *values)
+        return self.cursor
+    
+    def write(self, codec, value):
+        self.cursor = pack_into(codec, self.buffer, self.cursor, value)
+        return self.cursor
+    
+    def u8(self, value):
+        return self.write(uint8, value)
+    
+    def i8(self, value):
+        return self.write(int8, value)
+    
+    def u16(self, value):
+        return self.write(uint16, value)
+    
+    def i16(self, value):
+        return self.write(int16, value)
+    
+    def u32(self, value):
+        return self.write(uint32, value)
+    
+    def i32(self, value):
+        return self.write(int32, value)
+    
+    def f32(self, value):
+        return self.write(float32, value)
+    
+    def vec3(self, value):
+        return self.write_struct(vec3, value)
+    
+    def string(self, value):
+        return self.write(string4, value.encode('utf-8'))
+    
+    def write_struct(self, codec, values):
+        self.cursor = pack_into(codec, self.buffer, self.cursor, *values)
+        return self.cursor
+    
+    def bytes(self, data):
+        self.cursor = write_bytes(self.buffer, self.cursor, data)
+        return self.cursor
+    
+    def write_array(self, array, dtype = None):
+        data = (np.asarray(array) if dtype is None else np.asarray(array, dtype = dtype)).tobytes()
+        return self.bytes(data)
+
+class PointerMap:
+    # every model is preceded by a pointer map where each bit covers 4 bytes of the model (most significant bit first).
+    # the writers only collect the pointer locations, the bits are packed once at the end
+    def __init__(self, pointers = None):
+        self.pointers = [] if pointers is None else pointers
+    
+    def add(self, cursor):
+        self.pointers.append(cursor)
+    
+    def __len__(self):
+        return len(self.pointers)
+    
+    def locations(self):
+        return np.unique(np.asarray(self.pointers, dtype = np.int64))
+    
+    def pack(self, size):
+        # size is the size of the model, the map is padded to a whole number of u32s
+        bits = np.zeros((size + 127) // 128 * 32, dtype = np.uint8)
+        if len(self.pointers):
+            locations = np.fromiter(self.pointers, dtype = np.int64, count = len(self.pointers))
+            first, last = locations.min(), locations.max()
+            assert first >= 0 and last < len(bits) * 4, f"Pointer at {first if first < 0 else last} is outside the {size} byte model"
+            bits[locations >> 2] = 1
+        return np.packbits(bits).tobytes()
+    
+    @classmethod
+    def unpack(cls, buffer, size = None):
+        bits = np.unpackbits(np.frombuffer(buffer, dtype = np.uint8))
+        locations = np.flatnonzero(bits) * 4
+        if size is not None:
+            locations = locations[locations < size]
+        return cls(locations.tolist())
+    
+    def stray(self, buffer):
+        # highlighted words that don't hold 0, an address inside the model or a texture reference
+        # (0x0A000000 | texture index, resolved when the game loads the model)
+        locations = self.locations()
+        locations = locations[locations + 4 <= len(buffer)]
+        if not len(locations):
+            return []
+        words = np.frombuffer(buffer, dtype = '>u4', count = len(buffer) // 4)
+        values = words[locations // 4]
+        return locations[(values != 0) & (values >= len(buffer)) & (values >> 24 != 0x0A)].tolist()
+    
+    def compare(self, other):
+        # locations only this map has and locations only the other one has
+        mine = self.locations()
+        theirs = other.locations()
+        return np.setdiff1d(mine, theirs).tolist(), np.setdiff1d(theirs, mine).tolist()
+    
+    def validate(self, buffer, expected = None):
+        result = {'stray': self.stray(buffer), 'missing': [], 'extra': []}
+        if expected is not None:
+            result['extra'], result['missing'] = self.compare(expected)
+        return result
 
 class Data:
     def get(self):
@@ -94,15 +399,41 @@ class Data:
     def set(self):
         pass
 
+# one subclass per (class, format) for layouts picked at runtime, see DataStruct.set_format
+layout_classes = {}
+
 class DataStruct:
+    # fixed layouts are declared on the class and compiled once when the class is created,
+    # layouts that depend on the contents (vertex buffers, strips) are still passed to __init__ per instance
+    __slots__ = ('parent', 'data')
+    format_string = None
+    codec = None
+    size = 0
     
-    def __init__(self, format_string):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.__dict__.get('format_string') is not None:
+            cls.codec = get_struct(cls.format_string)
+            cls.size = cls.codec.size
+    
+    def __init__(self, format_string = None):
         self.parent = None
-        self.format_string = format_string
-        self.size = struct.calcsize(self.format_string)
+        if format_string is not None and format_string != self.format_string:
+            self.set_format(format_string)
+    
+    def set_format(self, format_string):
+        # the layout stays a class attribute even when it is picked per instance: the instance moves to a
+        # subclass that only adds the layout, so slotted classes (which have nowhere to store it) work too
+        cls = type(self)
+        base = cls.__dict__.get('layout_base', cls)
+        key = (base, format_string)
+        layout_class = layout_classes.get(key)
+        if layout_class is None:
+            layout_class = layout_classes[key] = type(base.__name__, (base,), {'__slots__': (), 'format_string': format_string, 'layout_base': base, '__module__': base.__module__})
+        self.__class__ = layout_class
         
     def read(self, buffer, cursor):
-        self.data = struct.unpack_from(self.format_string, buffer, cursor)
+        self.data = self.codec.unpack_from(buffer, cursor)
         return self
     
     def make(self):
@@ -112,8 +443,7 @@ class DataStruct:
         raise NotImplementedError("Subclasses must implement this method")
     
     def write(self, buffer, cursor):
-        struct.pack_into(self.format_string, buffer, cursor, *self.to_array())
-        return cursor + self.size
+        return pack_into(self.codec, buffer, cursor, *self.to_array())
     
     def from_array(self, data):
         self.data = data
@@ -123,8 +453,10 @@ class DataStruct:
         return self.data
     
 class FloatPosition(DataStruct):
+    format_string = '>3f'
+    __slots__ = ()
     def __init__(self, data = None):
-        super().__init__('>3f')
+        super().__init__()
         self.data = [0,0,0]
         if data is not None:
             self.from_array(data)
@@ -141,6 +473,8 @@ class FloatPosition(DataStruct):
         return self.data
     
 class FloatVector(FloatPosition):
+    __slots__ = ()
+    
     def from_array(self, data = None):
         # for d in data:
         #     if d > 1.0 or d < -1.0:
@@ -152,8 +486,10 @@ class FloatVector(FloatPosition):
         return self.data
 
 class ShortPosition(DataStruct):
+    format_string = '>3h'
+    __slots__ = ()
     def __init__(self, data = None):
-        super().__init__('>3h')
+        super().__init__()
         self.data = [0,0,0]
         if data is not None:
             self.from_array(data)  
@@ -170,8 +506,10 @@ class ShortPosition(DataStruct):
         return [round(min(32767, max(-32768, c))) for c in self.data]
     
 class FloatMatrix(DataStruct):
+    format_string = '>12f'
+    __slots__ = ()
     def __init__(self, data = None):
-        super().__init__('>12f')
+        super().__init__()
         if data is None:
             self.from_array([1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0])
         else:
@@ -207,8 +545,7 @@ class FloatMatrix(DataStruct):
         self.from_array(mat)  
     
     def write(self, buffer, cursor):
-        struct.pack_into(self.format_string, buffer, cursor, *self.to_array())
-        return cursor + self.size
+        return pack_into(self.codec, buffer, cursor, *self.to_array())
 
 class Color(Data):
     def __init__(self, data = None):
@@ -240,8 +577,10 @@ class Color(Data):
         return self.data
     
 class RGB3Bytes(DataStruct):
+    format_string = '>3B'
+    __slots__ = ('r', 'g', 'b')
     def __init__(self, r = 255, g = 255, b = 255):
-        super().__init__('>3B')
+        super().__init__()
         self.r = r
         self.g = g
         self.b = b
@@ -261,8 +600,10 @@ class RGB3Bytes(DataStruct):
         return [self.r, self.g, self.b]
     
 class RGBA4Bytes(DataStruct):
+    format_string = '>4B'
+    __slots__ = ()
     def __init__(self):
-        super().__init__('>4B')
+        super().__init__()
         self.data = [255, 255, 255, 255]
     def to_array(self):
         return self.data
@@ -0,0 +1,101 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# lookup tables shared by the codecs and the add-on, kept free of bpy so the codecs can be used outside blender
+
+# 'bswe1r' for 'blender swe1r'
+# NOTE: use 3-letter code for data_type and group_id
+data_name_prefix_short = 'bswe1r_'
+data_name_format_short = 'bswe1r_{label}'
+data_name_prefix_short_len = 7
+data_name_format = 'bswe1r_{data_type}_{label}'
+data_name_prefix_len = 11
+data_name_format_long = 'bswe1r_{data_type}_{group_id}_{label}'
+data_name_format_long_len = 15
+
+model_types = [
+    ('0', 'All', 'View all models'),
+    ('1', 'MAlt', 'High LOD Pod Models'),
+    ('2', 'Modl', 'Misc animated elements'),
+    ('3', 'Part', 'Misc props'),
+    ('4', 'Podd', 'Pod models'),
+    ('5', 'Pupp', 'Animated characters'),
+    ('6', 'Scen', 'Animated scenes'),
+    ('7', 'Trak', 'Tracks'),
+    ]
+
+header_sizes = [-1,75, 1,2,75,9, 83,6]
+
+Podd_MAlt = {
+    "2": 0,
+    "4": 3,
+    "6": 5,
+    "8": 7,
+    "9": 10,
+    "12": 11,
+    "14": 13,
+    "17": 15,
+    "16": 18,
+    "20": 19,
+    "22": 21,
+    "24": 23,
+    "26": 25,
+    "28": 27,
+    "30": 29,
+    "32": 31,
+    "34": 33,
+    "36": 35,
+    "38": 37,
+    "40": 39,
+    "42": 41,
+    "44": 43,
+    "46": 45,
+    "299": 298,
+    "301": 300
+}
+
+showbytes = {
+    "115": 16,
+    "142": 16,
+    "130": 16,
+    "133": 16,
+    "232": 16,
+    "145": 16,
+    "143": 32,
+    "134": 32,
+    "131": 32,
+    "233": 32,
+    "136": 16,
+    "144": 64,
+    "139": 16,
+    "135": 64,
+    "148": 32,
+    "315": 64,
+    "140": 16,
+    "132": 64,
+    "137": 32,
+    "141": 16,
+    "1": 16,
+    "128": 16,
+    "138": 64,
+    "231": 64,
+    "129": 16
+}
@@ -20,14 +20,22 @@
 # /licenses>.
 
 import struct
-import bpy
-from bpy_extras import anim_utils
-import bmesh
 import math
-import mathutils
-from .general import RGB3Bytes, FloatPosition, FloatVector, DataStruct, RGBA4Bytes, ShortPosition, FloatMatrix, writeFloatBE, writeInt32BE, writeString, writeUInt32BE, writeUInt8, readString, readInt32BE, readUInt32BE, readUInt8, readFloatBE
-from .textureblock import Texture, compute_image_hash, compute_hash
-from ..utils import show_custom_popup, model_types, header_sizes, showbytes, Podd_MAlt
+import numpy as np
+try:
+    import bpy
+    import bmesh
+    import mathutils
+    from bpy_extras import anim_utils
+except ImportError:
+    # headless (tests, benchmarks, worker processes): read and write still work, make and unmake need blender
+    bpy = bmesh = mathutils = anim_utils = None
+from .general import RGB3Bytes, FloatPosition, FloatVector, DataStruct, RGBA4Bytes, ShortPosition, FloatMatrix, writeFloatBE, writeInt32BE, writeString, writeUInt32BE, writeUInt8, readString, readInt32BE, readUInt32BE, readUInt8, readFloatBE, show_custom_popup, PointerMap, GrowableBuffer, ensure, pack_into, patchUInt32BE, write_bytes, BinaryReader, BinaryWriter
+from .textureblock import Texture, compute_image_hash, compute_hash, texture_cache
+from .model_types import model_types, header_sizes, showbytes, Podd_MAlt
+
+# far past any model in the game, a write beyond this is a bug rather than a big model
+MAX_MODEL_SIZE = 64 * 1024 * 1024
 
 def find_existing_light(objects, color, location, rotation):
     for light in objects:
@@ -65,8 +73,9 @@ def ensure_cycles_first(fcurve):
     return m
 
 class Lights(DataStruct):
+    format_string = '>h8b6f'
     def __init__(self, model):
-        super().__init__('>h8b6f')
+        super().__init__()
         self.model = model
         self.flag = 0
         # 00100 = invert affected?
@@ -80,7 +89,7 @@ class Lights(DataStruct):
         self.rot = FloatVector()
         
     def read(self, buffer, cursor):
-        self.flag, ambient_r, ambient_g, ambient_b, color_r, color_g, color_b, self.unk1, self.unk2, x, y, z, rx, ry, rz = struct.unpack_from(self.format_string, buffer, cursor)
+        self.flag, ambient_r, ambient_g, ambient_b, color_r, color_g, color_b, self.unk1, self.unk2, x, y, z, rx, ry, rz = self.codec.unpack_from(buffer, cursor)
         self.ambient.from_array([ambient_r, ambient_g, ambient_b])
         self.color.from_array([color_r, color_g, color_b])
         self.pos.from_array([x, y, z])
@@ -146,8 +155,9 @@ class Lights(DataStruct):
         return self
 
 class Fog(DataStruct):
+    format_string = '>4B2H'
     def __init__(self):
-        super().__init__('>4B2H')
+        super().__init__()
         self.flag = 0
         #0001 = Update color
         #0010 = Update distance
@@ -176,12 +186,12 @@ class Fog(DataStruct):
         return self
     
     def read(self, buffer, cursor):
-        self.flag, r, g, b, self.start, self.end = struct.unpack_from(self.format_string, buffer, cursor)
+        self.flag, r, g, b, self.start, self.end = self.codec.unpack_from(buffer, cursor)
         self.color.from_array([r, g, b])
         return self
         
     def write(self, buffer, cursor):
-        struct.pack_into(self.format_string, buffer, cursor, self.flag, *self.color.to_array(), self.start, self.end)
+        pack_into(self.codec, buffer, cursor, self.flag, *self.color.to_array(), self.start, self.end)
         return cursor + self.size
     
     def to_array(self):
@@ -201,8 +211,9 @@ class TriggerFlagEnum():
     IgnoreAI = (1 << 5)
     
 class TriggerFlag(DataStruct):
+    format_string = '>H'
     def __init__(self):
-        super().__init__('>H')
+        super().__init__()
         # These flags are set in the exe for the tracks, not in modelblock
         self.flags = ['Disabled', 'SpeedCheck150', 'SkipLap1', 'SkipLap2', 'SkipLap3', 'IgnoreAI']
         self.data = 0
@@ -211,7 +222,7 @@ class TriggerFlag(DataStruct):
             setattr(self, attr, False)
 
     def read(self, buffer, cursor):
-        data = struct.unpack_from(self.format_string, buffer, cursor)
+        data = self.codec.unpack_from(buffer, cursor)
         data = data[0]
         self.settings = data >> 6
         for attr in self.flags:
@@ -237,30 +248,33 @@ class TriggerFlag(DataStruct):
         for attr in self.flags:
             data |= (getattr(TriggerFlagEnum, attr) * int(getattr(self, attr)))
         
-        struct.pack_into(self.format_string, buffer, cursor, data)
+        pack_into(self.codec, buffer, cursor, data)
 
 class CollisionTrigger(DataStruct):
+    format_string = '>8fI2hI'
     def __init__(self, parent, model):
-        super().__init__('>8fI2hI')
+        super().__init__()
         self.parent = parent
         self.model = model
         self.position = FloatPosition()
         self.rotation = FloatVector()
         self.width = 100 # FIX: Not scale dependant 
         self.height = 100
-        self.target = 0
+        self.target = 0 # the address of a node after read, the node itself after unmake
         self.id = 0
         self.flags = TriggerFlag()
         self.next = 0
+        self.made = []
     
     def to_array(self):
         return [*self.position.to_array(), *self.rotation.to_array(), self.width, self.height, self.target, self.id, self.flags.data, self.next]
     
     def read(self, buffer, cursor):
-        x, y, z, rx, ry, rz, self.width, self.height, self.target, self.id, flags, self.next = struct.unpack_from(self.format_string, buffer, cursor)
+        x, y, z, rx, ry, rz, self.width, self.height, self.target, self.id, flags, self.next = self.codec.unpack_from(buffer, cursor)
         self.position.from_array([x, y, z])
         self.rotation.from_array([rx, ry, rz])
         self.flags.read(buffer, cursor + 38)
+        self.model.triggers.append(self)
         return self
         
     def make(self, parent = None, collection = None):
@@ -282,7 +296,8 @@ class CollisionTrigger(DataStruct):
         if collection is not None:
             collection.objects.link(trigger_empty)
             
-        self.model.triggers.append(trigger_empty)
+        # targets are connected once the whole model is made
+        self.made.append(trigger_empty)
             
         return trigger_empty
     
@@ -310,14 +325,15 @@ class CollisionTrigger(DataStruct):
     
     def write(self, buffer, cursor):
         self.write_location = cursor
-        struct.pack_into(self.format_string, buffer, cursor, *self.position.to_array(), *self.rotation.to_array(), self.width, self.height, 0, self.id, 0, 0)
+        pack_into(self.codec, buffer, cursor, *self.position.to_array(), *self.rotation.to_array(), self.width, self.height, 0, self.id, 0, 0)
         self.flags.write(buffer, cursor + 38)
         self.model.highlight(cursor + 32)
         return cursor + self.size
     
     def write_target(self, buffer):
-        if self.target:
-            struct.pack_into('>I', buffer, self.write_location + 32, self.target.write_location)
+        target = self.model.written_location(self.target) if self.target else None
+        if target:
+            patchUInt32BE(buffer, target, self.write_location + 32)
 
 class SurfaceEnum():
     ZOn = (1 << 0)
@@ -362,14 +378,15 @@ class SpecialSurfaceEnum():
     Unk5 = (1 << 5) #magnet mode
 
 class SpecialSurfaceFlags(DataStruct):
+    format_string = '>H'
     def __init__(self):
-        super().__init__('>H')
+        super().__init__()
         self.flags = ['Unk0', 'Unk1', 'Unk2', 'Unk3', 'Unk4', 'Unk5']
         for attr in self.flags:
             setattr(self, attr, False)
             
     def read(self, buffer, cursor):
-        data = struct.unpack_from(self.format_string, buffer, cursor)
+        data = self.codec.unpack_from(buffer, cursor)
         data = data[0]
         for attr in self.flags:
             setattr(self, attr, bool(getattr(SpecialSurfaceEnum, attr) & data))
@@ -394,18 +411,19 @@ class SpecialSurfaceFlags(DataStruct):
         for attr in self.flags:
             if getattr(self, attr):
                 data |= (getattr(SpecialSurfaceEnum, attr) * int(getattr(self, attr)))
-        struct.pack_into(self.format_string, buffer, cursor, data)
+        pack_into(self.codec, buffer, cursor, data)
         return cursor + self.size
 
 class SurfaceFlags(DataStruct):
+    format_string = '>I'
     def __init__(self):
-        super().__init__('>I')
+        super().__init__()
         self.flags = ['ZOn', 'ZOff', 'Fast', 'Slow', 'Swst', 'Slip', 'Dust', 'Snow', 'Wet', 'Ruff', 'Swmp', 'NSnw', 'Mirr', 'Lava', 'Fall', 'Soft', 'NRsp', 'Flat', 'Side', 'Surface18', 'Surface19', 'Surface20', 'Surface21', 'Surface22', 'Surface23', 'Surface24', 'Surface25', 'Surface26', 'Surface27', 'Surface28',  'Surface30', 'Surface31']
         for attr in self.flags:
             setattr(self, attr, False)
 
     def read(self, buffer, cursor):
-        data = struct.unpack_from(self.format_string, buffer, cursor)
+        data = self.codec.unpack_from(buffer, cursor)
         data = data[0]
         for attr in self.flags:
             setattr(self, attr, bool(getattr(SurfaceEnum, attr) & data))
@@ -423,7 +441,7 @@ class SurfaceFlags(DataStruct):
         data = 0
         for attr in self.flags:
             data |= (getattr(SurfaceEnum, attr) * int(getattr(self, attr)))
-        struct.pack_into(self.format_string, buffer, cursor, data)
+        pack_into(self.codec, buffer, cursor, data)
 
     def is_set(self, flag):
         return bool(self.value & flag)
@@ -435,9 +453,10 @@ class SurfaceFlags(DataStruct):
         self.value &= ~flag
 
 class CollisionTags(DataStruct):
+    format_string = '>H4B3H8B6fI2H3I'
     def __init__(self, parent, model):
         
-        super().__init__('>H4B3H8B6fI2H3I')
+        super().__init__()
         self.parent = parent
         self.model = model
         self.unk = SpecialSurfaceFlags()
@@ -451,7 +470,7 @@ class CollisionTags(DataStruct):
         self.triggers = []
 
     def read(self, buffer, cursor):
-        data = struct.unpack_from(self.format_string, buffer, cursor)
+        data = self.codec.unpack_from(buffer, cursor)
         self.unk.read(buffer, cursor)
         self.fog.from_array(data[1:7])
         self.lights.from_array(data[7:22])
@@ -507,51 +526,107 @@ class CollisionTags(DataStruct):
         return self
     
     def write(self, buffer, cursor):
-        struct.pack_into(self.format_string, buffer, cursor, *[0, *self.fog.to_array(), *self.lights.to_array(), 0, self.unk1, self.unk2, self.unload, self.load, 0])
+        pack_into(self.codec, buffer, cursor, *[0, *self.fog.to_array(), *self.lights.to_array(), 0, self.unk1, self.unk2, self.unload, self.load, 0])
         self.unk.write(buffer, cursor)
         self.flags.write(buffer, cursor + 44)
         cursor += self.size
         for trigger in self.triggers:
             #write pointer to next trigger
             self.model.highlight(cursor - 4)
-            writeUInt32BE(buffer, cursor, cursor - 4)
+            patchUInt32BE(buffer, cursor, cursor - 4)
             cursor = trigger.write(buffer, cursor)
         return cursor
 
 class CollisionVertBuffer(DataStruct):
+    # collision vertices are kept as an (n, 3) array of big endian shorts
     def __init__(self, parent, model, length = 0):
         
-        super().__init__(f'>{length*3}h')
+        super().__init__()
         self.parent = parent
         self.length = length
         self.model = model
-        self.data = []
+        self.array = np.zeros((length, 3), dtype = '>i2')
 
     def __str__(self):
         return str(self.data)
+    
+    @property
+    def size(self):
+        return self.array.nbytes
+    
+    @property
+    def data(self):
+        return [tuple(vert) for vert in self.array.tolist()]
+    
+    @data.setter
+    def data(self, verts):
+        self.from_array(verts)
 
     def read(self, buffer, cursor):
-        for i in range(self.length):
-            xyz = ShortPosition().read(buffer, cursor)
-            self.data.append(xyz)
-            cursor += xyz.size
-        
+        self.array = BinaryReader(buffer, cursor).read_array('>i2', self.length * 3).reshape(-1, 3).copy()
+        return self
+    
+    def from_array(self, verts):
+        verts = np.asarray(verts, dtype = np.float64).reshape(-1, 3)
+        self.array = np.clip(np.round(verts), -32768, 32767).astype('>i2')
+        self.length = len(self.array)
         return self
 
     def make(self):
-        return [vert.make() for vert in self.data]
+        return self.array.tolist()
     
     def to_array(self):
-        return [a for d in self.data for a in d.to_array()]
+        return self.array.ravel().tolist()
     
     def unmake(self, mesh):
-        self.length = len(mesh.data.vertices)
-        for vert in mesh.data.vertices:
-            co = vert.co #mesh.matrix_world @ 
-            co = [round(c/self.model.scale) for c in co]
-            self.data.append(ShortPosition().from_array(co))
-        super().__init__(f'>{len(self.data)*3}h')
-        return self
+        co = np.zeros(len(mesh.data.vertices) * 3, dtype = np.float32)
+        mesh.data.vertices.foreach_get('co', co)
+        return self.from_array(co.astype(np.float64) / self.model.scale)
+    
+    def write(self, buffer, cursor):
+        BinaryWriter(buffer, cursor).write_array(self.array)
+        return cursor + self.size
+    
+def expand_strips(strips, fixed_size = False):
+    # turns triangle strips into faces over consecutive vertices.
+    # strips read from a vert_strips buffer alternate winding, the fixed strip_size layout uses its own pattern
+    strips = np.asarray(strips, dtype = np.int64)
+    if not len(strips):
+        return []
+    face_counts = np.maximum(strips - 2, 0)
+    total = int(face_counts.sum())
+    if not total:
+        return []
+    
+    starts = np.cumsum(strips) - strips
+    face_starts = np.cumsum(face_counts) - face_counts
+    s = np.arange(total) - np.repeat(face_starts, face_counts)
+    base = np.repeat(starts, face_counts) + s
+    faces = np.stack([base, base + 1, base + 2], axis = 1)
+    even = s % 2 == 0
+    
+    if fixed_size:
+        strip_sizes = np.repeat(strips, face_counts)
+        faces[even & (strip_sizes != 3), 2] += 1
+    else:
+        faces[~even, 0] += 1
+        faces[~even, 1] -= 1
+    return faces.tolist()
+
+def fill_mesh(mesh, verts, faces):
+    # from_pydata for triangles, but fed straight from flat arrays instead of walking python lists
+    verts = np.asarray(verts, dtype = np.float32).reshape(-1, 3)
+    faces = np.asarray(faces, dtype = np.int32).reshape(-1, 3)
+    
+    mesh.vertices.add(len(verts))
+    mesh.vertices.foreach_set('co', verts.ravel())
+    mesh.loops.add(len(faces) * 3)
+    mesh.loops.foreach_set('vertex_index', faces.ravel())
+    mesh.polygons.add(len(faces))
+    # polygon sizes follow from the loop starts since every face is a triangle
+    mesh.polygons.foreach_set('loop_start', np.arange(0, len(faces) * 3, 3, dtype = np.int32))
+    mesh.update(calc_edges = True)
+    return mesh
     
 class CollisionVertStrips(DataStruct):
     def __init__(self, parent, model, count = 0):
@@ -564,6 +639,12 @@ class CollisionVertStrips(DataStruct):
         self.strip_size = 3
         self.include_buffer = False
     
+    def read(self, buffer, cursor):
+        # a strip buffer that was read has to be written back
+        self.data = list(self.codec.unpack_from(buffer, cursor))
+        self.include_buffer = True
+        return self
+    
     # recognizes strips in the pattern of the faces' vertex indices
     def unmake(self, mesh):
         face_buffer = [[v for v in face.vertices] for face in mesh.data.polygons]
@@ -605,9 +686,11 @@ class CollisionVertStrips(DataStruct):
         return self
     
 class VisualsVertChunk(DataStruct):
+    format_string = '>hhh2xhhBBBB'
+    __slots__ = ('model', 'co', 'uv', 'color', 'unmade')
     def __init__(self, parent, model):
        
-        super().__init__('>hhh2xhhBBBB')
+        super().__init__()
         self.parent = parent
         self.model = model
         self.co = []
@@ -615,7 +698,7 @@ class VisualsVertChunk(DataStruct):
         self.color = RGBA4Bytes()
         self.unmade = False
     def read(self, buffer, cursor):
-        x, y, z, uv_x, uv_y, r, g, b, a = struct.unpack_from(self.format_string, buffer, cursor)
+        x, y, z, uv_x, uv_y, r, g, b, a = self.codec.unpack_from(buffer, cursor)
         self.co = [x, y, z]
         self.uv = [uv_x, uv_y]
         self.color.from_array([r, g, b, a])
@@ -626,6 +709,13 @@ class VisualsVertChunk(DataStruct):
     def verts_to_array(self):
         return self.co
     
+    def from_row(self, row):
+        # row of a VisualsVertBuffer array
+        self.co = row['co'].tolist()
+        self.uv = row['uv'].tolist()
+        self.color.from_array(row['color'].tolist())
+        return self
+    
     def __eq__(self, other):
         return self.co == other.co and self.uv == other.uv and self.color == other.color
     
@@ -654,25 +744,62 @@ class VisualsVertChunk(DataStruct):
         self.co = co
         uv =[min(32767, max(-32768, c)) for c in self.uv]
         self.uv = uv
-        struct.pack_into(self.format_string, buffer, cursor, *self.co, *self.uv, *self.color.make())
+        pack_into(self.codec, buffer, cursor, *self.co, *self.uv, *self.color.make())
         return cursor + self.size
     
+# matches VisualsVertChunk, 16 bytes per vertex
+visuals_vert_dtype = np.dtype([('co', '>i2', 3), ('pad', 'V2'), ('uv', '>i2', 2), ('color', 'u1', 4)])
+
 class VisualsVertBuffer():
+    # imported buffers are kept as one structured array, per vertex VisualsVertChunks are only created
+    # when something asks for .data (export builds its vertices that way)
     def __init__(self, parent, model, length = 0):
         self.parent = parent
         self.model = model
-        self.data = []
+        self.array = None
+        self.chunks = []
         self.length = length
         
+    @property
+    def data(self):
+        if self.chunks is None:
+            self.chunks = [VisualsVertChunk(self, self.model).from_row(row) for row in self.array]
+        return self.chunks
+    
+    @data.setter
+    def data(self, chunks):
+        self.chunks = chunks
+        self.array = None
+        self.length = len(chunks)
+        
     def read(self, buffer, cursor):
-        for i in range(self.length):
-            vert = VisualsVertChunk(self, self.model)
-            cursor = vert.read(buffer, cursor)
-            self.data.append(vert)
+        # copied so the model doesn't hold on to the block it was read from
+        self.array = BinaryReader(buffer, cursor).read_array(visuals_vert_dtype, self.length).copy()
+        self.array['pad'] = b'\x00\x00'
+        self.chunks = None
         return self
     
+    def as_array(self):
+        if self.chunks is None:
+            return self.array
+        
+        array = np.zeros(len(self.chunks), dtype = visuals_vert_dtype)
+        if len(self.chunks):
+            array['co'] = np.clip(np.array([v.co for v in self.chunks]), -32768, 32767)
+            array['uv'] = np.clip(np.array([v.uv for v in self.chunks]), -32768, 32767)
+            array['color'] = np.array([v.color.make() for v in self.chunks])
+        return array
+    
     def make(self):
-        return [v.co for v in self.data]
+        if self.chunks is None:
+            return self.array['co'].tolist()
+        return [v.co for v in self.chunks]
+    
+    def uvs(self):
+        return (self.as_array()['uv'] / 4096).astype(np.float32)
+    
+    def colors(self):
+        return (self.as_array()['color'] / 255).astype(np.float32)
     
     def unmake(self, mesh):
         uv_data = None
@@ -716,20 +843,22 @@ class VisualsVertBuffer():
         assert index_buffer.offset, "Index buffer must be written before vertex buffer"
         
         vert_buffer_addr = cursor
-        for vert in self.data:
-            cursor = vert.write(buffer, cursor)
+        array = self.as_array()
+        cursor = BinaryWriter(buffer, cursor).write_array(array)
         
         #we write the references within index buffer to this vert buffer
         for i, chunk in enumerate(index_buffer.data):
             if chunk.type == 1:
-                writeUInt32BE(buffer, vert_buffer_addr + chunk.start * 16, index_buffer.offset + i * 8 + 4)
+                patchUInt32BE(buffer, vert_buffer_addr + chunk.start * 16, index_buffer.offset + i * 8 + 4)
             
         return cursor
     
 class VisualsIndexChunk1(DataStruct):
+    format_string = '>BBBBI'
+    __slots__ = ('model', 'type', 'unk1', 'unk2', 'start', 'max')
     # http://n64devkit.square7.ch/n64man/gsp/gSPVertex.htm
     def __init__(self, parent, model, type):
-        super().__init__('>BBBBI')
+        super().__init__()
         
         self.parent = parent
         self.model = model
@@ -740,7 +869,8 @@ class VisualsIndexChunk1(DataStruct):
         self.max = 0 #we'll set this in VisualsIndexBuffer.unmake()
         
     def read(self, buffer, cursor, vert_buffer_addr):
-        self.type, self.unk1, self.unk2, self.max, start = struct.unpack_from(self.format_string, buffer, cursor)
+        self.type, self.unk1, self.unk2, max_doubled, start = self.codec.unpack_from(buffer, cursor)
+        self.max = max_doubled // 2
         self.start = round((start - vert_buffer_addr)/16)
         return cursor + self.size
     
@@ -749,13 +879,15 @@ class VisualsIndexChunk1(DataStruct):
     
     def write(self, buffer, cursor):
         self.model.highlight(cursor + 4)
-        struct.pack_into(self.format_string, buffer, cursor, self.type, self.unk1, self.unk2, self.max*2, self.start)
+        pack_into(self.codec, buffer, cursor, self.type, self.unk1, self.unk2, self.max*2, self.start)
         return cursor + self.size
       
 class VisualsIndexChunk3(DataStruct):
+    format_string = '>B6xB'
+    __slots__ = ('model', 'type', 'unk')
     # http://n64devkit.square7.ch/n64man/gsp/gSPCullDisplayList.htm
     def __init__(self, parent, model, type):
-        super().__init__('>B6xB')
+        super().__init__()
         
         self.parent = parent
         self.model = model
@@ -766,14 +898,16 @@ class VisualsIndexChunk3(DataStruct):
         return [self.type, self.unk]
     
     def read(self, buffer, cursor, vert_buffer_addr):
-        self.type, self.unk = struct.unpack_from(self.format_string, buffer, cursor)
+        self.type, self.unk = self.codec.unpack_from(buffer, cursor)
         
         return cursor + self.size
         
 class VisualsIndexChunk5(DataStruct):
+    format_string = '>BBBB4x'
+    __slots__ = ('model', 'type', 'base', 'f1', 'f2', 'f3')
     # http://n64devkit.square7.ch/n64man/gsp/gSP1Triangle.htm
     def __init__(self, parent, model, type):
-        super().__init__('>BBBB4x')
+        super().__init__()
         
         self.parent = parent
         self.model = model
@@ -802,20 +936,22 @@ class VisualsIndexChunk5(DataStruct):
         self.f3 = self.f3 - offset
         
     def read(self, buffer, cursor, vert_buffer_addr):
-        self.type, f1, f2, f3 = struct.unpack_from(self.format_string, buffer, cursor)
+        self.type, f1, f2, f3 = self.codec.unpack_from(buffer, cursor)
         self.f1 = round(f1/2)
         self.f2 = round(f2/2)
         self.f3 = round(f3/2)
         return cursor + self.size
     
     def write(self, buffer, cursor):
-        struct.pack_into(self.format_string, buffer, cursor, self.type, *[(i-self.base)*2 for i in self.to_array()])
+        pack_into(self.codec, buffer, cursor, self.type, *[(i-self.base)*2 for i in self.to_array()])
         return cursor + self.size
         
 class VisualsIndexChunk6(DataStruct):
+    format_string = '>BBBBxBBB'
+    __slots__ = ('model', 'type', 'base', 'f1', 'f2', 'f3', 'f4', 'f5', 'f6')
     # http://n64devkit.square7.ch/n64man/gsp/gSP2Triangles.htm
     def __init__(self, parent, model, type):
-        super().__init__('>BBBBxBBB')
+        super().__init__()
         
         self.parent = parent
         self.model = model
@@ -842,7 +978,7 @@ class VisualsIndexChunk6(DataStruct):
         return max(self.to_array())
         
     def read(self, buffer, cursor, vert_buffer_addr):
-        self.type, f1, f2, f3, f4, f5, f6 = struct.unpack_from(self.format_string, buffer, cursor)
+        self.type, f1, f2, f3, f4, f5, f6 = self.codec.unpack_from(buffer, cursor)
         self.f1 = round(f1/2)
         self.f2 = round(f2/2)
         self.f3 = round(f3/2)
@@ -852,47 +988,100 @@ class VisualsIndexChunk6(DataStruct):
         return cursor + self.size
     
     def write(self, buffer, cursor):
-        struct.pack_into(self.format_string, buffer, cursor, self.type, *[(i-self.base)*2 for i in self.to_array()])
+        pack_into(self.codec, buffer, cursor, self.type, *[(i-self.base)*2 for i in self.to_array()])
         return cursor + self.size
             
 class VisualsIndexBuffer():
+    # imported display lists are kept as an (n, 8) array of commands, chunk objects are only built
+    # when something asks for .data (export builds its chunks that way)
     def __init__(self, parent, model):
         self.parent = parent
         self.model = model
         self.offset = 0
-        self.data = []
+        self.commands = None
+        self.vert_buffer_addr = 0
+        self.chunks = []
         self.map = {
             1: VisualsIndexChunk1,
             3: VisualsIndexChunk3,
             5: VisualsIndexChunk5,
             6: VisualsIndexChunk6,
         }
-    def read(self, buffer, cursor, vert_buffer_addr):
-        chunk_type = readUInt8(buffer, cursor)
         
-        while(chunk_type != 223):
-            chunk_class = self.map.get(chunk_type)
-            assert chunk_class, f"Invalid index chunk type {chunk_type}"
-            chunk = chunk_class(self, self.model, chunk_class)
-            chunk.read(buffer, cursor, vert_buffer_addr)
-            self.data.append(chunk)
-            cursor += 8
-            chunk_type = readUInt8(buffer, cursor)
-            
+    @property
+    def data(self):
+        if self.chunks is None:
+            commands = self.commands.tobytes()
+            self.chunks = []
+            for i, chunk_type in enumerate(self.commands[:, 0].tolist()):
+                chunk = self.map[chunk_type](self, self.model, chunk_type)
+                chunk.read(commands, i * 8, self.vert_buffer_addr)
+                self.chunks.append(chunk)
+        return self.chunks
+    
+    @data.setter
+    def data(self, chunks):
+        self.chunks = chunks
+        self.commands = None
+        
+    def read(self, buffer, cursor, vert_buffer_addr):
+        # the list ends with a 223 (gSPEndDisplayList) command, look for it a window of commands at a time
+        end = len(buffer)
+        count = None
+        window = 64
+        checked = 0
+        while count is None:
+            available = (end - cursor + 7) // 8 - checked
+            assert available > 0, f"Invalid index chunk type {readUInt8(buffer, cursor + checked * 8)}"
+            size = min(window, available)
+            offset = cursor + checked * 8
+            opcodes = np.frombuffer(buffer, dtype = np.uint8, count = min(size * 8, end - offset), offset = offset)[::8]
+            found = np.flatnonzero(opcodes == 223)
+            if len(found):
+                count = checked + int(found[0])
+            checked += size
+            window *= 2
+        
+        self.commands = BinaryReader(buffer, cursor).read_array(np.uint8, count * 8).reshape(-1, 8).copy()
+        invalid = ~np.isin(self.commands[:, 0], list(self.map))
+        assert not invalid.any(), f"Invalid index chunk type {self.commands[np.argmax(invalid), 0]}"
+        self.vert_buffer_addr = vert_buffer_addr
+        self.chunks = None
         return self
+    
+    def starts(self):
+        # vertex index each command's faces are relative to, set by the last type 1 (gSPVertex) before it
+        commands = self.commands
+        load = commands[:, 0] == 1
+        addresses = commands[:, 4:8].copy().view('>u4').ravel().astype(np.int64)
+        loads = np.rint((addresses - self.vert_buffer_addr) / 16).astype(np.int64)
+        last_load = np.maximum.accumulate(np.where(load, np.arange(len(commands)), -1))
+        return np.where(last_load >= 0, loads[np.maximum(last_load, 0)], 0)
             
     def make(self):
-        faces = []
-        start = 0
-        for chunk in self.data:
-            if chunk.type == 1:
-                start = chunk.start
-            elif chunk.type == 5:
-                faces.append([start + chunk.f1, start + chunk.f2, start + chunk.f3])
-            elif chunk.type == 6:
-                faces.append([start + chunk.f1, start + chunk.f2, start + chunk.f3])
-                faces.append([start + chunk.f4, start + chunk.f5, start + chunk.f6])
-        return faces
+        if self.commands is None:
+            faces = []
+            start = 0
+            for chunk in self.data:
+                if chunk.type == 1:
+                    start = chunk.start
+                elif chunk.type == 5:
+                    faces.append([start + chunk.f1, start + chunk.f2, start + chunk.f3])
+                elif chunk.type == 6:
+                    faces.append([start + chunk.f1, start + chunk.f2, start + chunk.f3])
+                    faces.append([start + chunk.f4, start + chunk.f5, start + chunk.f6])
+            return faces
+        
+        if not len(self.commands):
+            return []
+        
+        # every command gets room for two triangles, type 5 only uses the first and type 6 both
+        commands = self.commands
+        opcodes = commands[:, 0]
+        triangles = np.rint(commands[:, [1, 2, 3, 5, 6, 7]] / 2).astype(np.int64).reshape(-1, 2, 3)
+        triangles += self.starts()[:, None, None]
+        used = np.stack([(opcodes == 5) | (opcodes == 6), opcodes == 6], axis = 1)
+        return triangles[used].tolist()
     
     def to_array(self):
         return [d.to_array() for d in self.data]
@@ -958,8 +1147,9 @@ class VisualsIndexBuffer():
         return cursor + 8
     
 class MaterialTextureChunk(DataStruct):
+    format_string = '>4H4x2H'
     def __init__(self, parent, model):
-        super().__init__('>4H4x2H')
+        super().__init__()
         
         self.parent = parent
         self.data = []
@@ -974,22 +1164,23 @@ class MaterialTextureChunk(DataStruct):
     def read(self, buffer, cursor):
         if cursor > len(buffer):
             return self
-        self.unk0, self.unk1, self.unk2, self.unk3, self.unk4, self.unk5 = struct.unpack_from(self.format_string, buffer, cursor)
+        self.unk0, self.unk1, self.unk2, self.unk3, self.unk4, self.unk5 = self.codec.unpack_from(buffer, cursor)
         return self
         
     def unmake(self, texture):
         return self
     
     def write(self, buffer, cursor):
-        struct.pack_into(self.format_string, buffer, cursor, self.unk0, self.unk1, self.unk2, self.unk3, self.unk4, self.unk5)
+        pack_into(self.codec, buffer, cursor, self.unk0, self.unk1, self.unk2, self.unk3, self.unk4, self.unk5)
         return cursor + self.size
     
     def to_array(self):
         return [self.unk0, self.unk1, self.unk2, self.unk3, self.unk4, self.unk5]
     
 class MaterialTexture(DataStruct):
+    format_string = '>I2H4x8H6I4xHH4x'
     def __init__(self, parent, model):
-        super().__init__('>I2H4x8H6I4xHH4x')
+        super().__init__()
 
         self.parent = parent
         self.model = model
@@ -1013,9 +1204,10 @@ class MaterialTexture(DataStruct):
 
         unk_pointers = []
         self.id = cursor
-        self.unk0, unk1, unk3, self.format, self.unk4, self.width, self.height, unk5, unk6, self.unk7, self.unk8, *unk_pointers, self.unk9, self.id = struct.unpack_from(self.format_string, buffer, cursor)
+        self.unk0, unk1, unk3, self.format, self.unk4, self.width, self.height, unk5, unk6, self.unk7, self.unk8, *unk_pointers, self.unk9, self.id = self.codec.unpack_from(buffer, cursor)
         for pointer in unk_pointers:
-            if pointer:
+            # write() fills the slots without a chunk with 3, which can't be a (word aligned) address
+            if pointer and pointer % 4 == 0:
                 chunk = MaterialTextureChunk(self, self.model)
                 chunk.read(buffer, pointer)
                 self.chunks.append(chunk)
@@ -1032,9 +1224,20 @@ class MaterialTexture(DataStruct):
             return
         textureblock = self.model.modelblock.textureblock
         self.texture = Texture(self.id, self.format, self.width, self.height)
+        
+        # textures are shared between models, each one is only fetched and decoded once per import
         pixel_buffer, palette_buffer = textureblock.fetch(self.id)
-        self.texture.read(pixel_buffer, palette_buffer)
-        return self.texture.make()
+        key = texture_cache.key([pixel_buffer, palette_buffer], self.id, self.format, self.width, self.height)
+        image = texture_cache.image(key)
+        if image is not None:
+            return image
+        entry = texture_cache.entries.get(key)
+        if entry is None:
+            self.texture.read(pixel_buffer, palette_buffer)
+        image = self.texture.make(rgba = None if entry is None else entry['rgba'])
+        if image is not None and self.texture.rgba is not None:
+            texture_cache.put(key, self.texture.rgba, image)
+        return image
 
     def unmake(self, image):
         if image is None:
@@ -1069,9 +1272,10 @@ class MaterialTexture(DataStruct):
                 # so re-exports stay deterministic even when two textureblock entries are byte-identical
                 # (fetch_by_hash returns whichever colliding entry was last loaded into hash_table)
                 stored_id = self.id
-                tb_data = self.model.textureblock.data
-                if 0 <= stored_id < len(tb_data) and tb_data[stored_id] and any(tb_data[stored_id]):
-                    stored_buffer = b''.join([item for item in tb_data[stored_id] if item])
+                textureblock = self.model.textureblock
+                stored_data = textureblock.fetch(stored_id) if 0 <= stored_id < len(textureblock.data) else None
+                if stored_data and any(stored_data):
+                    stored_buffer = b''.join([item for item in stored_data if item])
                     if compute_hash(stored_buffer) == image.get('external_hash'):
                         self.model.image_map[image.name] = stored_id
                         print('found', image.name, 'already in modelblock as', stored_id)
@@ -1122,19 +1326,20 @@ class MaterialTexture(DataStruct):
     def write(self, buffer, cursor):
         chunk_addr = cursor + 28
         self.model.highlight(cursor + 56)
-        #struct.pack_into(self.format_string, buffer, cursor, self.unk0, min(self.width*4, 65535), min(self.height*4, 65535), self.format, self.unk4, self.width, self.height, min(self.width*512, 65535), min(self.height*512, 65535), self.unk7, self.unk8, *[0, 0, 0, 0, 0, 0], self.unk9, self.id)
-        struct.pack_into(self.format_string, buffer, cursor, 0, min(self.width*4, 65535), min(self.height*8, 65535), self.format, 3, self.width, self.height, min(self.width*512, 65535), min(self.height*512, 65535), 683, 503, *[3, 3, 3, 3, 3, 3], self.unk9, self.id)
+        #self.codec.pack_into(buffer, cursor, self.unk0, min(self.width*4, 65535), min(self.height*4, 65535), self.format, self.unk4, self.width, self.height, min(self.width*512, 65535), min(self.height*512, 65535), self.unk7, self.unk8, *[0, 0, 0, 0, 0, 0], self.unk9, self.id)
+        pack_into(self.codec, buffer, cursor, 0, min(self.width*4, 65535), min(self.height*8, 65535), self.format, 3, self.width, self.height, min(self.width*512, 65535), min(self.height*512, 65535), 683, 503, *[3, 3, 3, 3, 3, 3], self.unk9, self.id)
         cursor += self.size
 
         for i, chunk in enumerate(self.chunks):
             self.model.highlight(chunk_addr + i * 4)
-            writeUInt32BE(buffer, cursor, chunk_addr + i*4)
+            patchUInt32BE(buffer, cursor, chunk_addr + i*4)
             cursor = chunk.write(buffer, cursor)
         return cursor
 
 class MaterialShader(DataStruct):
+    format_string = '>IH4I2x2I6x7H'
     def __init__(self, parent, model):
-        super().__init__('>IH4I2x2I6x7H')
+        super().__init__()
         
         self.parent = parent
         # this whole struct can be 0
@@ -1192,7 +1397,7 @@ class MaterialShader(DataStruct):
         self.color = RGBA4Bytes()
         self.unk = []
     def read(self, buffer, cursor):
-        self.unk1, self.combiner_cycle_type, self.color_combine_mode_cycle1, self.alpha_combine_mode_cycle1, self.color_combine_mode_cycle2, self.alpha_combine_mode_cycle2, self.render_mode_1, self.render_mode_2, *self.unk = struct.unpack_from(self.format_string, buffer, cursor)
+        self.unk1, self.combiner_cycle_type, self.color_combine_mode_cycle1, self.alpha_combine_mode_cycle1, self.color_combine_mode_cycle2, self.alpha_combine_mode_cycle2, self.render_mode_1, self.render_mode_2, *self.unk = self.codec.unpack_from(buffer, cursor)
         self.color.read(buffer, cursor + 34)
     
     def make(self, material):
@@ -1260,7 +1465,7 @@ class MaterialShader(DataStruct):
         return [self.unk1, self.combiner_cycle_type, self.color_combine_mode_cycle1, self.alpha_combine_mode_cycle1, self.color_combine_mode_cycle2, self.alpha_combine_mode_cycle2, self.render_mode_1, self.render_mode_2, self.color.to_array(), self.unk]
     
     def write(self, buffer, cursor):
-        struct.pack_into(self.format_string, buffer, cursor, self.unk1, self.combiner_cycle_type, self.color_combine_mode_cycle1, self.alpha_combine_mode_cycle1, self.color_combine_mode_cycle2, self.alpha_combine_mode_cycle2, self.render_mode_1, self.render_mode_2, 0, 0, 0, 0, 0, 0, 0)
+        pack_into(self.codec, buffer, cursor, self.unk1, self.combiner_cycle_type, self.color_combine_mode_cycle1, self.alpha_combine_mode_cycle1, self.color_combine_mode_cycle2, self.alpha_combine_mode_cycle2, self.render_mode_1, self.render_mode_2, 0, 0, 0, 0, 0, 0, 0)
         self.color.write(buffer, cursor + 34)
         return cursor + self.size
     
@@ -1268,8 +1473,9 @@ class MaterialShader(DataStruct):
 # MARK: MATERIAL
 
 class Material(DataStruct):
+    format_string = '>I4xII'
     def __init__(self, parent, model):
-        super().__init__('>I4xII')
+        super().__init__()
         self.parent = parent
         self.id = None
         self.model = model
@@ -1307,7 +1513,7 @@ class Material(DataStruct):
         
     def read(self, buffer, cursor):
         self.id = cursor
-        self.format, texture_addr, shader_addr = struct.unpack_from(self.format_string, buffer, cursor)
+        self.format, texture_addr, shader_addr = self.codec.unpack_from(buffer, cursor)
             
         self.texture = MaterialTexture(self, self.model).read(buffer, texture_addr)
         
@@ -1325,6 +1531,7 @@ class Material(DataStruct):
             mat_name = str(self.id)
             material = bpy.data.materials.get(mat_name)
         if material is not None and not remake:
+            mat_index.add(self.id, material)
             return material
         if not remake or material is None:
             material = bpy.data.materials.new(mat_name)
@@ -1337,6 +1544,7 @@ class Material(DataStruct):
         material.material_color = [c/255 for c in self.shader.color.to_array()]
         material.node_tree.links.new(node_0.outputs['BSDF'], output_node.inputs['Surface'])
         material['id'] = self.id
+        mat_index.add(self.id, material)
         material['format'] = self.format
         material['normal_map'] = self.format & 0x1
         
@@ -1570,7 +1778,7 @@ class Material(DataStruct):
         self.model.highlight(material_start + 12)
         shader_addr = cursor
         cursor = self.shader.write(buffer, cursor)
-        struct.pack_into(self.format_string, buffer, material_start, self.format, tex_addr, shader_addr)
+        pack_into(self.codec, buffer, material_start, self.format, tex_addr, shader_addr)
         return cursor
     def remake(self, material, tex_name = None):
         self.unmake(material)
@@ -1578,11 +1786,12 @@ class Material(DataStruct):
         return material
 
 class MeshBoundingBox(DataStruct):
+    format_string = '>6f'
     """Defines the minimum and maximum bounds of a mesh"""
     
     #only need to calculate bounding box for export workflow
     def __init__(self, parent, model):
-        super().__init__('>6f')
+        super().__init__()
         
         self.parent = parent
         self.model = model
@@ -1614,10 +1823,15 @@ class MeshBoundingBox(DataStruct):
         self.max_y = max([vert[1] for vert in verts])
         self.max_z = max([vert[2] for vert in verts])
         return self
+    def read(self, buffer, cursor):
+        return self.from_array(self.codec.unpack_from(buffer, cursor))
+    def from_array(self, data):
+        self.min_x, self.min_y, self.min_z, self.max_x, self.max_y, self.max_z = data
+        return self
     def to_array(self):
         return [self.min_x, self.min_y, self.min_z, self.max_x, self.max_y, self.max_z]
     def write(self, buffer, cursor):
-        struct.pack_into(self.format_string, buffer, cursor, *self.to_array())
+        pack_into(self.codec, buffer, cursor, *self.to_array())
         return self.size + cursor
     
 def get_uv_bounds(uv_coords):
@@ -1847,8 +2061,9 @@ class MeshGroupBoundingBox(MeshBoundingBox):
 # MARK: MESH
     
 class Mesh(DataStruct):
+    format_string = '>2I6f2H5I2H2xH'
     def __init__(self, parent, model):
-        super().__init__('>2I6f2H5I2H2xH')
+        super().__init__()
         
         self.parent = parent
         self.model = model
@@ -1923,7 +2138,7 @@ class Mesh(DataStruct):
     
     def read(self, buffer, cursor):
         self.id = cursor
-        mat_addr, collision_tags_addr, min_x, min_y, min_z, max_x, max_y, max_z, self.strip_count, self.strip_size, vert_strips_addr, self.group_parent_id, collision_vert_buffer_addr, visuals_index_buffer_addr, visuals_vert_buffer_addr, collision_vert_count, visuals_vert_count, self.group_count = struct.unpack_from(self.format_string, buffer, cursor)
+        mat_addr, collision_tags_addr, min_x, min_y, min_z, max_x, max_y, max_z, self.strip_count, self.strip_size, vert_strips_addr, self.group_parent_id, collision_vert_buffer_addr, visuals_index_buffer_addr, visuals_vert_buffer_addr, collision_vert_count, visuals_vert_count, self.group_count = self.codec.unpack_from(buffer, cursor)
         
         
         if mat_addr:
@@ -1934,10 +2149,12 @@ class Mesh(DataStruct):
         if collision_tags_addr:
             self.collision_tags = CollisionTags(self, self.model).read(buffer, collision_tags_addr)
                 
-        #we can ignore saving bounding box data (min_x, min_y...) upon read, we'll just calculate it during unmake
+        # unmake calculates the bounding box again, it is only kept so a read model can be written back
+        self.bounding_box = MeshBoundingBox(self, self.model).from_array([min_x, min_y, min_z, max_x, max_y, max_z])
                     
         if vert_strips_addr:
             self.vert_strips = CollisionVertStrips(self, self.model, self.strip_count).read(buffer, vert_strips_addr)
+            self.vert_strips.strip_size = self.strip_size
                     
         if visuals_index_buffer_addr:
             self.visuals_index_buffer = VisualsIndexBuffer(self, self.model).read(buffer, visuals_index_buffer_addr, visuals_vert_buffer_addr)
@@ -1952,42 +2169,25 @@ class Mesh(DataStruct):
     
     def make(self, parent, collection):
         if self.has_collision():
-            verts = self.collision_vert_buffer.make()
-            edges = []
-            faces = []
-            start = 0
+            verts = self.collision_vert_buffer.array
             vert_strips = [self.strip_size for s in range(self.strip_count)]
             
             if(self.vert_strips is not None): 
-                
-                vert_strips = self.vert_strips.make()
-                for strip in vert_strips:
-                    for s in range(strip -2):
-                        if (s % 2) == 0:
-                            faces.append( [start+s, start+s+1, start+s+2])
-                        else:
-                            faces.append( [start+s+1, start+s, start+s+2])
-                    start += strip
+                faces = expand_strips(self.vert_strips.make())
             else: 
-                for strip in vert_strips:
-                    for s in range(strip -2):
-                        if (strip == 3):
-                            faces.append( [start+s, start+s+1, start+s+2])
-                        elif (s % 2) == 0:
-                            faces.append( [start+s, start+s+1, start+s+3])
-                        else:
-                            faces.append( [start+s, start+s+1, start+s+2])
-                    start += strip
+                faces = expand_strips(vert_strips, fixed_size = True)
+                
             mesh_name = '{:07d}'.format(self.id) + "_" + "collision"
             mesh = bpy.data.meshes.new(mesh_name)
             b_obj = bpy.data.objects.new(mesh_name, mesh)
             
             b_obj.collidable = True   
             b_obj.id = str(self.id)
+            obj_index.add(self.id, b_obj)
             b_obj.scale = [self.model.scale, self.model.scale, self.model.scale]
 
             collection.objects.link(b_obj)
-            mesh.from_pydata(verts, edges, faces)
+            fill_mesh(mesh, verts, faces)
             b_obj.parent = parent
 
             if(self.collision_tags is not None): 
@@ -2000,19 +2200,18 @@ class Mesh(DataStruct):
                 
         if self.has_visuals():
             
-            verts = self.visuals_vert_buffer.make()
-           
-            edges = []
+            verts = self.visuals_vert_buffer.as_array()['co']
             faces = self.visuals_index_buffer.make()
             mesh_name = '{:07d}'.format(self.id) + "_" + "visuals"
             mesh = bpy.data.meshes.new(mesh_name)
             b_obj = bpy.data.objects.new(mesh_name, mesh)
             b_obj.visible = True
             b_obj.id = str(self.id)
+            obj_index.add(self.id, b_obj)
             b_obj.scale = [self.model.scale, self.model.scale, self.model.scale]
 
             collection.objects.link(b_obj)
-            mesh.from_pydata(verts, edges, faces)
+            fill_mesh(mesh, verts, faces)
             mesh.validate() #clean_customdata=False
             b_obj.parent = parent
             
@@ -2027,11 +2226,10 @@ class Mesh(DataStruct):
             uv_layer = b_obj.data.uv_layers.active.data
             color_layer = b_obj.data.vertex_colors.active.data                
             
-            for poly in mesh.polygons:
-                for p in range(len(poly.vertices)):
-                    v = self.visuals_vert_buffer.data[poly.vertices[p]]
-                    uv_layer[poly.loop_indices[p]].uv = [u/4096 for u in v.uv]
-                    color_layer[poly.loop_indices[p]].color = [a/255 for a in v.color.to_array()]
+            loop_verts = np.zeros(len(mesh.loops), dtype = np.int32)
+            mesh.loops.foreach_get('vertex_index', loop_verts)
+            uv_layer.foreach_set('uv', self.visuals_vert_buffer.uvs()[loop_verts].ravel())
+            color_layer.foreach_set('color', self.visuals_vert_buffer.colors()[loop_verts].ravel())
                     
             for i in range(24):
                 view_layer = bpy.context.scene.view_layers[i + 1]
@@ -2040,10 +2238,13 @@ class Mesh(DataStruct):
                     
             if self.group_parent_id:
                 #convert vertices coordinates to global coordinates
-                inv_matrix_world = b_obj.matrix_world.inverted()
-                for i, v in enumerate(b_obj.data.vertices):
-                    if i < self.group_count:
-                        v.co = inv_matrix_world @ (b_obj.matrix_world @ v.co)
+                matrix = np.array(b_obj.matrix_world.inverted() @ b_obj.matrix_world, dtype = np.float32)
+                co = np.zeros(len(mesh.vertices) * 3, dtype = np.float32)
+                mesh.vertices.foreach_get('co', co)
+                co = co.reshape(-1, 3)
+                count = min(self.group_count, len(co))
+                co[:count] = co[:count] @ matrix[:3, :3].T + matrix[:3, 3]
+                mesh.vertices.foreach_set('co', co.ravel())
                 vg = b_obj.vertex_groups.get(f'{self.id}')
                 if vg is None:
                     vg = b_obj.vertex_groups.new(name=f'{self.id}')
@@ -2273,13 +2474,10 @@ class Mesh(DataStruct):
             
             strip_list = [2+ len(strip) for strip in strips]
             self.collision_vert_buffer.data = new_verts
-            self.collision_vert_buffer.format_string = f'>{len(new_verts)*3}h'
-            self.collision_vert_buffer.size = struct.calcsize(f'>{len(new_verts)*3}h')
             self.strip_count = len(strip_list)
             self.vert_strips.strip_count = len(strip_list)
             self.vert_strips.data = strip_list
-            self.vert_strips.format_string = f'>{len(strip_list)}I'
-            self.vert_strips.size = struct.calcsize(f'>{len(strip_list)}I')
+            self.vert_strips.set_format(f'>{len(strip_list)}I')
             self.vert_strips.strip_size = 5
             self.vert_strips.include_buffer = True
         
@@ -2299,8 +2497,8 @@ class Mesh(DataStruct):
         visuals_vert_buffer_addr = 0
         collision_vert_count = 0
         visuals_vert_count = 0
-        strip_count = 0
-        strip_size = 3
+        strip_count = self.strip_count
+        strip_size = self.strip_size
         #save mesh location and move cursor to end of mesh header (that we haven't written yet)
         mesh_start = cursor
         cursor += self.size
@@ -2322,7 +2520,7 @@ class Mesh(DataStruct):
             self.model.highlight(mesh_start + 44)
             collision_vert_buffer_addr = cursor
             cursor = self.collision_vert_buffer.write(buffer, cursor)
-            collision_vert_count = len(self.collision_vert_buffer.data)
+            collision_vert_count = self.collision_vert_buffer.length
             #byte align (otherwise game will crash)
             cursor += 4 - (cursor % 4)
                 
@@ -2345,7 +2543,7 @@ class Mesh(DataStruct):
             self.model.highlight(mesh_start + 52)
             visuals_vert_buffer_addr = cursor
             cursor = self.visuals_vert_buffer.write(buffer, cursor, self.visuals_index_buffer)
-            visuals_vert_count = len(self.visuals_vert_buffer.data)
+            visuals_vert_count = self.visuals_vert_buffer.length
             
         if self.collision_tags:
             self.model.highlight(mesh_start + 4)
@@ -2353,7 +2551,8 @@ class Mesh(DataStruct):
             cursor = self.collision_tags.write(buffer, cursor)
         
         #finally, write mesh header
-        struct.pack_into(self.format_string, buffer, mesh_start, mat_addr, collision_tags_addr, *self.bounding_box.to_array(), strip_count, strip_size, vert_strips_addr, self.group_parent_id, collision_vert_buffer_addr, visuals_index_buffer_addr, visuals_vert_buffer_addr, collision_vert_count, visuals_vert_count, self.group_count)
+        group_parent_id = self.model.written_location(self.group_parent_id) if self.group_parent_id else 0
+        pack_into(self.codec, buffer, mesh_start, mat_addr, collision_tags_addr, *self.bounding_box.to_array(), strip_count, strip_size, vert_strips_addr, group_parent_id, collision_vert_buffer_addr, visuals_index_buffer_addr, visuals_vert_buffer_addr, collision_vert_count, visuals_vert_count, self.group_count)
         return cursor
             
 def create_node(node_type, parent, model):
@@ -2374,9 +2573,10 @@ def create_node(node_type, parent, model):
 # MARK: NODE
     
 class Node(DataStruct):
+    format_string = '>3I2H3I'
     
     def __init__(self, parent, model, type, header = []):
-        super().__init__('>3I2H3I')
+        super().__init__()
         self.parent = parent
         self.type = type
         self.id = None
@@ -2401,7 +2601,7 @@ class Node(DataStruct):
         
     def read(self, buffer, cursor):
         self.id = cursor
-        self.node_type, self.vis_flags, self.col_flags, self.transform_flags, self.light_index, self.mirror_flags, self.child_count, self.child_start = struct.unpack_from(self.format_string, buffer, cursor)
+        self.node_type, self.vis_flags, self.col_flags, self.transform_flags, self.light_index, self.mirror_flags, self.child_count, self.child_start = self.codec.unpack_from(buffer, cursor)
         
         if self.model.AltN and cursor in self.model.AltN:
             self.AltN = [i for i, h in enumerate(self.model.AltN) if h == cursor]
@@ -2412,10 +2612,10 @@ class Node(DataStruct):
                 self.skybox = True
 
         if not self.model.ref_map.get(self.id):
-            self.model.ref_map[self.id] = True
+            self.model.ref_map[self.id] = self
         
-        for i in range(self.child_count):
-            child_address = readUInt32BE(buffer, self.child_start + i * 4)
+        child_addresses = BinaryReader(buffer, self.child_start).read_array('>u4', self.child_count).tolist()
+        for i, child_address in enumerate(child_addresses):
             if not child_address:
                 #print('no child adress for child', i, 'on node', self.id)
                 if (self.child_start + i * 4) in self.model.AltN:
@@ -2484,6 +2684,7 @@ class Node(DataStruct):
 
         #set group tags
         b_node.id  = str(self.id)
+        obj_index.add(self.id, b_node)
         b_node['node_type'] = self.node_type
         b_node['vis_flags'] = str(self.vis_flags)
         b_node['col_flags'] = str(self.col_flags)
@@ -2502,8 +2703,12 @@ class Node(DataStruct):
             if 'bonus' in parent and False:
                 b_node.location += mathutils.Vector(parent['bonus'][:3]) * self.model.scale * -1
         
-        for node in self.children:
-            if not isinstance(node, dict):
+        children = [node for node in self.children if not isinstance(node, dict)]
+        if self.model.make_queue is not None:
+            # Model.make_steps pops these itself so the hierarchy can be built over several calls
+            self.model.make_queue.extend([(node, b_node, collection) for node in reversed(children)])
+        else:
+            for node in children:
                 node.make(b_node, collection)
             
         if self.id in self.model.header.offsets:
@@ -2561,38 +2766,44 @@ class Node(DataStruct):
         
         #write references to this node in the model header
         for i in self.header:
-            struct.pack_into(f">{len(self.header)}I", buffer, 4 + 4*i, *[cursor]*len(self.header))
+            patchUInt32BE(buffer, cursor, 4 + 4*i)
              
-        struct.pack_into(self.format_string, buffer, cursor, self.node_type, self.vis_flags, self.col_flags, self.transform_flags, self.light_index, self.mirror_flags, 0, 0)
+        pack_into(self.codec, buffer, cursor, self.node_type, self.vis_flags, self.col_flags, self.transform_flags, self.light_index, self.mirror_flags, 0, 0)
         return cursor + self.size
     
     def write_children(self, buffer, cursor, child_data_addr):
         num_children = len(self.children)
         
         #write child count and child list pointer
-        writeUInt32BE(buffer, num_children, child_data_addr)
+        patchUInt32BE(buffer, num_children, child_data_addr)
         self.model.highlight(child_data_addr + 4)
         
         if not len(self.children):
             return cursor
         
-        writeUInt32BE(buffer, cursor, child_data_addr + 4)
+        patchUInt32BE(buffer, cursor, child_data_addr + 4)
         
         #write child ptr list
         child_list_addr = cursor
         cursor += num_children * 4
+        ensure(buffer, cursor)
         
         #write children        
         for index, child in enumerate(self.children):
             child_ptr = child_list_addr + 4*index
             self.model.highlight(child_ptr)
+            if isinstance(child, dict):
+                # a read model refers to nodes it already has by address, empty and AltN slots stay 0
+                child = self.model.ref_map.get(child['id'])
+                if not isinstance(child, Node):
+                    continue
             if child is None:
                 continue
             #check if child is already written
             if child.write_location:
-                writeUInt32BE(buffer, child.write_location, child_ptr)
+                patchUInt32BE(buffer, child.write_location, child_ptr)
             else:
-                writeUInt32BE(buffer, cursor, child_ptr)
+                patchUInt32BE(buffer, cursor, child_ptr)
                 cursor = child.write(buffer, cursor)
             
         return cursor
@@ -2640,6 +2851,7 @@ class MeshGroup(Node):
         
     def read(self, buffer, cursor):
         super().read(buffer, cursor)
+        self.bounding_box = MeshGroupBoundingBox(self, self.model).read(buffer, cursor + self.size)
         return self
     
     def make(self, parent = None, collection = None):
@@ -2684,7 +2896,8 @@ class NodeTransformed(Node):
         return self
     def make(self, parent = None, collection = None):
         empty = super().make(parent, collection)
-        empty.matrix_world = self.matrix.make(self.model.scale)
+        # the matrix is relative to the parent node, its children may have been queued and not exist yet
+        empty.matrix_basis = self.matrix.make(self.model.scale)
         return empty
     def unmake(self, node):
         super().unmake(node)
@@ -2718,7 +2931,7 @@ class NodeTransformedWithPivot(Node):
     def make(self, parent = None, collection = None):
         empty = super().make(parent, collection)
         if not isinstance(empty, bpy.types.Collection):
-            empty.matrix_world = self.matrix.make(self.model.scale)
+            empty.matrix_basis = self.matrix.make(self.model.scale)
             v = mathutils.Vector(self.bonus.to_array()[:3])
             # empty.location += v * self.model.scale
         empty['bonus'] = self.bonus.to_array()
@@ -2777,7 +2990,7 @@ class Group53350(Node):
     def write(self, buffer, cursor):
         cursor = super().write(buffer, cursor)
         child_data_start = cursor - 8
-        struct.pack_into('>hh12x', buffer, cursor, self.follow_position, self.track_position)
+        pack_into('>hh12x', buffer, cursor, self.follow_position, self.track_position)
         self.up_vector.write(buffer, cursor+4)
         cursor += struct.calcsize('>hh12x')
         
@@ -2833,7 +3046,7 @@ class Group20582(Node):
     def make(self, parent = None, collection = None):
         empty = super().make(parent, collection)
         empty['floats'] = self.floats
-        return self
+        return empty
     def unmake(self, node):
         super().unmake(node)
         self.floats = node['floats']
@@ -2841,20 +3054,21 @@ class Group20582(Node):
     def write(self, buffer, cursor):
         cursor = super().write(buffer, cursor)
         child_data_start = cursor - 8
-        struct.pack_into(">11f", buffer, cursor, *self.floats)
+        pack_into(">11f", buffer, cursor, *self.floats)
         cursor += 11*4
         cursor = super().write_children(buffer, cursor, child_data_start)
         return cursor
       
 class LStr(DataStruct):
+    format_string = '>4x3f'
     def __init__(self, parent, model):
-        super().__init__('>4x3f')
+        super().__init__()
         
         self.parent = parent
         self.data = FloatPosition()
         self.model = model
     def read(self, buffer, cursor):
-        x, y, z = struct.unpack_from(self.format_string, buffer, cursor)
+        x, y, z = self.codec.unpack_from(buffer, cursor)
         self.data.from_array([x, y , z])
         return self
     def make(self):
@@ -2869,7 +3083,7 @@ class LStr(DataStruct):
         return self    
 
     def write(self, buffer, cursor):
-        struct.pack_into(self.format_string, buffer, cursor, *self.data.to_array())
+        pack_into(self.codec, buffer, cursor, *self.data.to_array())
         writeString(buffer, "LStr", cursor)
         return cursor + self.size
         
@@ -2915,21 +3129,22 @@ class ModelData():
         for thing in self.data:
             cursor = thing.write(buffer, cursor)
         size = int((cursor - (sizeAddress+4))/4)
-        writeUInt32BE(buffer, size, sizeAddress)
+        patchUInt32BE(buffer, size, sizeAddress)
         
         return cursor
     
 
 class LocationPose(DataStruct):
+    format_string = '>3f'
     def __init__(self, parent, model):
-        super().__init__('>3f')
+        super().__init__()
         
         self.parent = parent
         self.model = model
         self.data = FloatPosition()
         
     def read(self, buffer, cursor):
-        x, y, z = struct.unpack_from(self.format_string, buffer, cursor)
+        x, y, z = self.codec.unpack_from(buffer, cursor)
         self.data.from_array([x, y, z])
         return self
     
@@ -2942,15 +3157,16 @@ class LocationPose(DataStruct):
         return self
     
     def write(self, buffer, cursor):
-        struct.pack_into(self.format_string, buffer, cursor, *self.data.to_array())
+        pack_into(self.codec, buffer, cursor, *self.data.to_array())
         return cursor + self.size
     
     def to_array(self):
         return self.data.to_array()
     
 class RotationPose(DataStruct):
+    format_string = '>4f'
     def __init__(self, parent, model):
-        super().__init__('>4f')
+        super().__init__()
         
         self.parent = parent
         self.model = model
@@ -2979,8 +3195,9 @@ class RotationPose(DataStruct):
         return self
     
 class UVPose(DataStruct):
+    format_string = '>f'
     def __init__(self, parent, model):
-        super().__init__('>f')
+        super().__init__()
         
         self.parent = parent
         self.model = model
@@ -3025,8 +3242,9 @@ class UVPose(DataStruct):
 
     
 class TexturePose(DataStruct):
+    format_string = '>I'
     def __init__(self, parent, model):
-        super().__init__('>I')
+        super().__init__()
         
         self.parent = parent
         self.model = model
@@ -3095,8 +3313,9 @@ def get_animations(obj, model, entity):
             model.animations.append(Anim(entity, model).unmake(times, poses, path, loop = keyframes[path]['loop']))
     
 class Anim(DataStruct):
+    format_string = '>244x3f2HI5f4I'
     def __init__(self, parent, model):
-        super().__init__('>244x3f2HI5f4I')
+        super().__init__()
         
         self.parent = parent
         self.model = model
@@ -3121,17 +3340,17 @@ class Anim(DataStruct):
         return [self.float1,self.float2,self.float3,self.flag1,self.flag2,self.num_keyframes,self.float4,self.float5,self.float6,self.float7,self.float8,self.keyframes,self.keyframe_times,self.keyframe_poses,self.target,self.unk32]
     
     def read(self, buffer, cursor):
-        self.float1, self.float2, self.float3, self.flag1, self.flag2, self.num_keyframes, self.float4, self.float5, self.float6, self.float7, self.float8, keyframe_times_addr, keyframe_poses_addr, self.target, self.unk2 = struct.unpack_from(self.format_string, buffer, cursor)
+        self.float1, self.float2, self.float3, self.flag1, self.flag2, self.num_keyframes, self.float4, self.float5, self.float6, self.float7, self.float8, keyframe_times_addr, keyframe_poses_addr, self.target, self.unk32 = self.codec.unpack_from(buffer, cursor)
         if self.flag2 in [2, 18]:
             self.target = readUInt32BE(buffer, self.target)
 
         if not keyframe_poses_addr or not keyframe_times_addr:
                 return self
 
+        self.keyframe_times = BinaryReader(buffer, keyframe_times_addr).read_array('>f4', self.num_keyframes).tolist()
         cursor = keyframe_poses_addr
         #get keyframes
         for f in range(self.num_keyframes):
-            self.keyframe_times.append(readFloatBE(buffer, keyframe_times_addr + f * 4))
             pose = None
             if self.flag2 & 0b111 == 0b000:  # rotation (4)
                 pose = RotationPose(self, self.model).read(buffer, cursor)
@@ -3271,7 +3490,7 @@ class Anim(DataStruct):
         keyframe_poses_addr = cursor
         for pose in self.keyframe_poses:
             cursor = pose.write(buffer, cursor)
-        struct.pack_into(self.format_string, buffer, anim_addr, self.float1, self.float2, self.float3, self.flag1, self.flag2, len(self.keyframe_times), self.float4, self.float5, self.float6, self.float7, self.float8, keyframe_times_addr, keyframe_poses_addr, self.target.write_location, self.unk32)
+        pack_into(self.codec, buffer, anim_addr, self.float1, self.float2, self.float3, self.flag1, self.flag2, len(self.keyframe_times), self.float4, self.float5, self.float6, self.float7, self.float8, keyframe_times_addr, keyframe_poses_addr, self.model.written_location(self.target), self.unk32)
         return cursor
     
     def to_array(self):
@@ -3492,17 +3711,88 @@ def assign_objs_to_node_by_type(objects, root, model):
         root.children.append(node) 
         
 
+class IdIndex():
+    # id -> datablock lookups that don't walk bpy.data on every call.
+    # while Model.make_steps runs the makers register what they create, so an import resolves against its own
+    # objects. anything else comes from a scan of bpy.data, which is redone when the datablock count changes,
+    # a cached datablock was removed or no longer has its id, or the cached scan misses
+    def __init__(self, datablocks, get_id, key):
+        self.datablocks = datablocks
+        self.get_id = get_id
+        self.key = key
+        self.made = None
+        self.scanned = None
+        self.scanned_count = 0
+        
+    def begin_import(self):
+        self.made = {}
+        
+    def end_import(self):
+        self.made = None
+        
+    def invalidate(self):
+        self.scanned = None
+        
+    def add(self, id, datablock):
+        if id is None or self.made is None:
+            return
+        # the first datablock made for an id wins, same as the collision mesh coming before the visuals
+        self.made.setdefault(self.key(id), datablock)
+        
+    def matches(self, datablock, key):
+        try:
+            id = self.get_id(datablock)
+            return id is not None and self.key(id) == key
+        except (ReferenceError, ValueError, TypeError):
+            return False
+        
+    def scan(self):
+        datablocks = self.datablocks()
+        if self.scanned is not None and len(datablocks) == self.scanned_count:
+            return self.scanned
+        self.scanned = {}
+        for datablock in datablocks:
+            id = self.get_id(datablock)
+            if id is None:
+                continue
+            try:
+                self.scanned.setdefault(self.key(id), datablock)
+            except (ValueError, TypeError):
+                continue
+        self.scanned_count = len(datablocks)
+        return self.scanned
+    
+    def get(self, id):
+        if id is None:
+            return None
+        key = self.key(id)
+        datablock = None if self.made is None else self.made.get(key)
+        if datablock is not None:
+            if self.matches(datablock, key):
+                return datablock
+            del self.made[key]
+        
+        cached = self.scanned is not None
+        datablock = self.scan().get(key)
+        if cached and (datablock is None or not self.matches(datablock, key)):
+            # ids can change without the count changing, so a cached scan is never trusted to be complete
+            self.invalidate()
+            datablock = self.scan().get(key)
+        if datablock is not None and not self.matches(datablock, key):
+            return None
+        return datablock
+    
+def get_material_id(mat):
+    return mat['id'] if 'id' in mat else None
+
+obj_index = IdIndex(lambda: bpy.data.objects, lambda obj: obj.id or None, str)
+mat_index = IdIndex(lambda: bpy.data.materials, get_material_id, int)
+
 def get_obj_by_id(id):
-    for obj in bpy.data.objects:
-        if obj.id == str(id):
-            return obj
-    return None
+    return obj_index.get(id)
 
 def get_mat_by_id(id):
-    for mat in bpy.data.materials:
-        if 'id' in mat and mat['id'] is not None and int(mat['id']) == int(id):
-            return mat
-    return None
+    return mat_index.get(id)
 
 def deep_select_objects(collection):
     for obj in collection.objects:
@@ -3622,14 +3912,17 @@ def link_nodes(parent, children):
 # MARK: MODEL
 
 class Model():    
-    def __init__(self, id):
+    def __init__(self, id, fps = None):
         self.parent = None
         self.modelblock = None
         self.collection = None
         self.type = None
         self.id = id
         self.scale = 0.01
-        self.fps = bpy.context.scene.render.fps
+        # only make and unmake use fps, headless it falls back to blender's default
+        if fps is None:
+            fps = bpy.context.scene.render.fps if bpy else 24
+        self.fps = fps
         
         self.ref_map = {} # where we'll map node ids to their written locations
         self.ref_keeper = {} # where we'll remember locations of node refs to go back and update with the ref_map at the end
@@ -3645,6 +3938,7 @@ class Model():
         self.textures = {}
         self.nodes = []
         self.triggers = []
+        self.make_queue = None
 
     def read(self, buffer):
         if self.id is None:
@@ -3652,7 +3946,7 @@ class Model():
         cursor = 0
         cursor = self.header.read(buffer, cursor)
         if cursor is None:
-            show_custom_popup(bpy.context, "Unrecognized Model Extension", f"This model extension was not recognized: {self.header.model.type}")
+            show_custom_popup(None, "Unrecognized Model Extension", f"This model extension was not recognized: {self.header.model.type}")
             return None
         
         if self.type == "4":
@@ -3660,7 +3954,7 @@ class Model():
             #get MAlt
             MAlt_id = Podd_MAlt[str(self.id)]
             MAlt_buffer = self.modelblock.fetch(MAlt_id)[1]
-            MAlt = Model(MAlt_id).read(MAlt_buffer)
+            MAlt = Model(MAlt_id, self.fps).read(MAlt_buffer)
             
             for i, offset in enumerate(self.header.offsets):
                 if offset:
@@ -3680,7 +3974,16 @@ class Model():
         return self
 
     def make(self):
+        for node in self.make_steps():
+            pass
+        return self.collection
+    
+    def make_steps(self):
+        # yields after every node it makes, so a caller can stop between nodes and pick up later.
+        # nodes are taken from a stack in the same order the recursive make used to visit them
         ensure_24_view_layers()
+        obj_index.begin_import()
+        mat_index.begin_import()
         collection = bpy.data.collections.new(f"model_{self.id}_{self.type}")
         collection.export_type = self.type
         collection.collection_type = "MODEL"
@@ -3688,30 +3991,39 @@ class Model():
         bpy.context.scene.collection.children.link(collection)
         self.collection = collection
         
-        for node in self.nodes:
-            self.modelblock.update_progress(f"Making node {node.id}")
-            node.make(None, collection)
-
-        # update trigger targets
-        for trigger in self.triggers:
-            if 'target_id' in trigger and trigger['target_id']:
-                target = get_obj_by_id(trigger['target_id'])
-                trigger.target = target
-                
-        # transform parents with transforms
-        # bpy.context.scene.tool_settings.use_transform_skip_children = True
-        # for obj in collection.objects:
-        #     if 'bonus' in obj:
-        #         obj.select_set(True)
-        #         bpy.ops.transform.translate(value=([v * self.scale for v in obj['bonus']] ))
-        #         obj.select_set(False)
-        # bpy.context.scene.tool_settings.use_transform_skip_children = False
-
-                
-        #header should be made last for the animations
-        self.header.make()
+        self.make_queue = [(node, None, collection) for node in reversed(self.nodes)]
+        try:
+            while len(self.make_queue):
+                node, parent, node_collection = self.make_queue.pop()
+                if parent is None:
+                    self.modelblock.update_progress(f"Making node {node.id}")
+                node.make(parent, node_collection)
+                yield node
+            self.make_queue = None
+
+            # update trigger targets
+            for trigger in self.triggers:
+                for trigger_empty in trigger.made:
+                    if trigger_empty['target_id'] and trigger_empty['target_id'] != '0':
+                        trigger_empty.target = get_obj_by_id(trigger_empty['target_id'])
+                    
+            # transform parents with transforms
+            # bpy.context.scene.tool_settings.use_transform_skip_children = True
+            # for obj in collection.objects:
+            #     if 'bonus' in obj:
+            #         obj.select_set(True)
+            #         bpy.ops.transform.translate(value=([v * self.scale for v in obj['bonus']] ))
+            #         obj.select_set(False)
+            # bpy.context.scene.tool_settings.use_transform_skip_children = False
 
-        return collection
+                    
+            #header should be made last for the animations
+            self.header.make()
+        finally:
+            # lookups after the import go back to bpy.data
+            self.make_queue = None
+            obj_index.end_import()
+            mat_index.end_import()
 
     def unmake(self, collection, texture_export, textureblock):
         self.textureblock = textureblock
@@ -3971,36 +4283,43 @@ class Model():
         return self
 
     def write(self):
-        buffer = bytearray(8000000)
-        self.hl = bytearray(1000000)
+        # both buffers grow as they are written, so only the real model size is ever allocated
+        buffer = GrowableBuffer(limit = MAX_MODEL_SIZE, name = f'model {self.id}')
+        self.hl = PointerMap()
         cursor = 0
 
+        buffer.section = 'header'
         cursor = self.header.write(buffer, cursor)
 
         # write all nodes
-        for node in self.nodes:
+        for i, node in enumerate(self.nodes):
+            buffer.section = f'node {i}'
             cursor = node.write(buffer, cursor)
             
         # write all animations
         if self.Anim:
             for i, anim in enumerate(self.Anim.data):
-                writeUInt32BE(buffer, cursor, self.anim_list + i*4)
+                buffer.section = f'animation {i}'
+                patchUInt32BE(buffer, cursor, self.anim_list + i*4)
                 cursor = anim.write(buffer, cursor)
             
         # write trigger targets
+        buffer.section = 'trigger targets'
         for trigger in self.triggers:
             trigger.write_target(buffer)
                 
-        crop = math.ceil(cursor / (32 * 4)) * 4
-        
-        return [self.hl[:crop], buffer[:cursor]]
+        return [self.hl.pack(cursor), buffer.crop(cursor)]
+            
+    def written_location(self, target):
+        # after unmake, anim and trigger targets and group parents are objects, after read they are addresses in the
+        # original model that have to be mapped to wherever that node or material was written this time
+        if isinstance(target, int):
+            target = self.ref_map.get(target) or self.materials.get(target) or target
+        return target.write_location if hasattr(target, 'write_location') else target
             
     def highlight(self, cursor):
         # This function is called whenever an address needs to be 'highlighted' because it is a pointer
         # Every model begins with a pointer map where each bit represents 4 bytes in the following model
         # If the bit is 1, that corresponding DWORD is to be read as a pointer
-
-        highlight_offset = cursor // 32
-        bit = 2 ** (7 - ((cursor % 32) // 4))
-        highlight = self.hl[highlight_offset]
-        self.hl[highlight_offset] = highlight | bit
+        # The locations are collected here and packed into the map once the model is written
+        self.hl.add(cursor)
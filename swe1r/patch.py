@@ -0,0 +1,127 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# patch files only hold the assets an export changed, so a mod can be shared without the whole block
+#
+# 'SWRP', u32 version, u32 block count
+# per block:  u8 name length, name, u32 items per asset, 32 byte md5 (hex) and u32 size of the base file, u32 change count
+# per change: u32 asset index, per item a u32 length (0xFFFFFFFF for an empty item) followed by the item
+
+import struct
+import os
+import hashlib
+from .block import Block, load_block
+
+PATCH_MAGIC = b'SWRP'
+PATCH_VERSION = 1
+EMPTY_ITEM = 0xFFFFFFFF
+
+def hash_file(path, chunk_size = 1 << 20):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+def write_patch(path, blocks):
+    # writes the assets injected into each block since it was read
+    buffer = [PATCH_MAGIC, struct.pack('>II', PATCH_VERSION, len(blocks))]
+    for block in blocks:
+        assert block.stat is not None, f"{block.path} has no base file to patch against"
+        name = os.path.basename(block.path).encode('ascii')
+        changes = sorted(block.injected)
+        buffer.append(struct.pack(f'>B{len(name)}sI32sII', len(name), name, block.items_per_asset, hash_file(block.path).encode('ascii'), block.stat[0], len(changes)))
+        for index in changes:
+            buffer.append(struct.pack('>I', index))
+            for item in block.fetch(index):
+                if item is None:
+                    buffer.append(struct.pack('>I', EMPTY_ITEM))
+                    continue
+                buffer.append(struct.pack('>I', len(item)))
+                buffer.append(bytes(item))
+
+    buffer = b''.join(buffer)
+    with open(path, 'wb') as file:
+        file.write(buffer)
+    return len(buffer)
+
+def read_patch(path):
+    with open(path, 'rb') as file:
+        buffer = file.read()
+
+    assert buffer[:4] == PATCH_MAGIC, f"{path} is not a patch file"
+    version, block_count = struct.unpack_from('>II', buffer, 4)
+    assert version == PATCH_VERSION, f"Unsupported patch version {version}"
+    cursor = 12
+
+    blocks = []
+    for b in range(block_count):
+        name_length = buffer[cursor]
+        name, items_per_asset, base_hash, base_size, change_count = struct.unpack_from(f'>{name_length}sI32sII', buffer, cursor + 1)
+        cursor += 1 + struct.calcsize(f'>{name_length}sI32sII')
+
+        changes = {}
+        for c in range(change_count):
+            index = struct.unpack_from('>I', buffer, cursor)[0]
+            cursor += 4
+            items = []
+            for j in range(items_per_asset):
+                length = struct.unpack_from('>I', buffer, cursor)[0]
+                cursor += 4
+                if length == EMPTY_ITEM:
+                    items.append(None)
+                    continue
+                assert cursor + length <= len(buffer), f"{path} is truncated"
+                items.append(buffer[cursor:cursor + length])
+                cursor += length
+            changes[index] = items
+
+        blocks.append({
+            'name': name.decode('ascii'),
+            'items_per_asset': items_per_asset,
+            'base_hash': base_hash.decode('ascii'),
+            'base_size': base_size,
+            'changes': changes
+        })
+
+    return blocks
+
+def apply_patch(path, folder, update_progress = None):
+    patch = read_patch(path)
+
+    # check every base file before touching any of them
+    for entry in patch:
+        block_path = os.path.join(folder, entry['name'])
+        assert os.path.exists(block_path), f"Missing {entry['name']}"
+        if update_progress:
+            update_progress(f"Checking {entry['name']}...")
+        assert os.path.getsize(block_path) == entry['base_size'] and hash_file(block_path) == entry['base_hash'], f"{entry['name']} does not match the file this patch was made from"
+
+    for entry in patch:
+        block = load_block(os.path.join(folder, entry['name']), entry['items_per_asset'], update_progress)
+        try:
+            for index, items in entry['changes'].items():
+                block.inject(items, index)
+            block.commit()
+        finally:
+            block.close()
+
+    return patch
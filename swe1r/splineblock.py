@@ -20,16 +20,21 @@
 # /licenses>.
 
 import struct
-import bpy
 import math
+try:
+    import bpy
+except ImportError:
+    # only make and unmake use blender
+    bpy = None
 from .general import *
 from .modelblock import DataStruct, FloatPosition, FloatVector
-from ..utils import show_custom_popup
 from .spline_map import spline_map
 
 class SplinePoint(DataStruct):
+    format_string = '>8h48x10h'
+    __slots__ = ('id', 'next', 'previous', 'position', 'rotation', 'handle1', 'handle2', 'progress', 'unk_set', 'unk')
     def __init__(self):
-        super().__init__('>8h48x10h')
+        super().__init__()
         self.next = []
         self.previous = []
         self.position = FloatPosition()
@@ -44,7 +49,7 @@ class SplinePoint(DataStruct):
         return str(self.to_array())
     
     def read(self, buffer, cursor):
-        next_count, previous_count, next1, next2, previous1, previous2, previous3, previous4, self.progress, *self.unk_set, self.unk = struct.unpack_from(self.format_string, buffer, cursor)
+        next_count, previous_count, next1, next2, previous1, previous2, previous3, previous4, self.progress, *self.unk_set, self.unk = self.codec.unpack_from(buffer, cursor)
         self.next = [next1, next2][:next_count]
         self.previous = [previous1, previous2, previous3, previous4][:previous_count]
         self.position.read(buffer, cursor + 16)
@@ -59,7 +64,7 @@ class SplinePoint(DataStruct):
         previous_count = len(self.previous)
         self.next = self.next + [-1] * (2 - len(self.next))
         self.previous = self.previous + [-1] * (4 - len(self.previous))
-        struct.pack_into(self.format_string, buffer, cursor, next_count, previous_count, *self.next, *self.previous, self.progress, *self.unk_set, self.unk) 
+        pack_into(self.codec, buffer, cursor, next_count, previous_count, *self.next, *self.previous, self.progress, *self.unk_set, self.unk) 
         self.position.write(buffer, cursor + 16)
         self.rotation.write(buffer, cursor + 28)
         self.handle1.write(buffer, cursor + 40)
@@ -102,8 +107,9 @@ class SplinePoint(DataStruct):
         self.progress, *self.unk_set, self.unk = data[20:]
     
 class Spline(DataStruct):
+    format_string = '>2H2I4B'
     def __init__(self, id = None):
-        super().__init__('>2H2I4B')
+        super().__init__()
         self.id = id
         self.unk = 1 # always 1 spline visibility?
         self.unk1 = 0
@@ -119,7 +125,7 @@ class Spline(DataStruct):
         if self.id is None:
             return
         cursor = 0
-        self.unk, self.unk1, self.point_count, self.segment_count, self.unk2, self.unk3, self.unk4, self.unk5 = struct.unpack_from(self.format_string, buffer, cursor)
+        self.unk, self.unk1, self.point_count, self.segment_count, self.unk2, self.unk3, self.unk4, self.unk5 = self.codec.unpack_from(buffer, cursor)
         cursor += self.size
         for i in range(self.point_count):
             point = SplinePoint().read(buffer, cursor)
@@ -356,13 +362,15 @@ class Spline(DataStruct):
         return closest_index
     
     def write(self):
-        buffer = bytearray(8000000)
+        buffer = GrowableBuffer(size = self.size + len(self.points) * SplinePoint.size, name = f'spline {self.id}')
         cursor = 0
-        struct.pack_into(self.format_string, buffer, cursor, self.unk, self.unk1, self.point_count, self.segment_count, self.unk2, self.unk3, self.unk4, self.unk5)
+        buffer.section = 'header'
+        pack_into(self.codec, buffer, cursor, self.unk, self.unk1, self.point_count, self.segment_count, self.unk2, self.unk3, self.unk4, self.unk5)
         cursor += self.size
-        for point in self.points:
+        for i, point in enumerate(self.points):
+            buffer.section = f'point {i}'
             point.write(buffer, cursor)
             cursor += point.size
-        return buffer[:cursor]
+        return buffer.crop(cursor)
 
 
@@ -23,9 +23,15 @@ import struct
 import hashlib
 import numpy as np
 import math
-import bpy
-from ..utils import euclidean_distance, data_name_format
+from collections import OrderedDict
+try:
+    import bpy
+except ImportError:
+    # textures can still be read and written without blender
+    bpy = None
+from .model_types import data_name_format
 from .modelblock import DataStruct
+from .general import compute_hash, euclidean_distance, BinaryReader
 
 format_map = {
     3: 4,
@@ -35,13 +41,11 @@ format_map = {
     1025: 1
 }
 
-def compute_hash(buffer):
-    return hashlib.md5(buffer).hexdigest()
-
 def compute_image_hash(image):
     # Assume 'image' is a Blender image object
-    pixels = image.pixels[:]  # Get pixel data
-    pixel_bytes = bytes([int(p * 255) for p in pixels])  # Convert to 0-255 range
+    pixels = np.zeros(len(image.pixels), dtype = np.float32)
+    image.pixels.foreach_get(pixels)
+    pixel_bytes = (pixels.astype(np.float64) * 255).astype(np.uint8).tobytes()  # Convert to 0-255 range
     return compute_hash(pixel_bytes)
 
 def reduce_colors(image_array, num_colors=255, max_iter=3):
@@ -99,6 +103,62 @@ def page_width_padding(width, format):
     elif format == 3:
         return (width + 0x1) & 0xFFFFFFFE
 
+class TextureCache():
+    # decoded textures shared between the models of one import, so a texture used by many models is only
+    # fetched and decoded once. entries are keyed by texture id, a hash of that texture's bytes and
+    # the layout it is read with, and hold the rgba array plus the image made from it.
+    # the least recently used entries are dropped once the decoded arrays hold more than max_pixels
+    def __init__(self, max_pixels = 16 * 1024 * 1024):
+        self.max_pixels = max_pixels
+        self.entries = OrderedDict()
+        self.pixel_count = 0
+        self.hits = 0
+        self.misses = 0
+        
+    def clear(self):
+        self.entries = OrderedDict()
+        self.pixel_count = 0
+        self.hits = 0
+        self.misses = 0
+        
+    def key(self, items, id, format, width, height):
+        # items are the texture's pixel and palette buffers from the textureblock. only they are hashed,
+        # the rest of the block is never read
+        return (int(id), compute_hash(b''.join([bytes(item) for item in items if item])), format, width, height)
+    
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+    
+    def image(self, key):
+        # the image is only handed out while it still exists, users and file loads can remove it
+        entry = self.get(key)
+        if entry is None or entry['image'] is None:
+            return None
+        try:
+            if bpy is not None and entry['image'].name in bpy.data.images:
+                return entry['image']
+        except ReferenceError:
+            pass
+        entry['image'] = None
+        return None
+    
+    def put(self, key, rgba, image = None):
+        if key in self.entries:
+            self.pixel_count -= len(self.entries.pop(key)['rgba']) // 4
+        self.entries[key] = {'rgba': rgba, 'image': image}
+        self.pixel_count += len(rgba) // 4
+        while self.pixel_count > self.max_pixels and len(self.entries) > 1:
+            key, entry = self.entries.popitem(last = False)
+            self.pixel_count -= len(entry['rgba']) // 4
+    
+texture_cache = TextureCache()
+
 def next_power_of_2(value):
     next = 16
     
@@ -115,6 +175,7 @@ class Texture():
         self.height = height
         self.palette = None
         self.pixels = None
+        self.rgba = None
     def read(self, pixel_buffer, palette_buffer):
         if self.id is None or self.id < 0:
             return
@@ -124,12 +185,26 @@ class Texture():
             
         self.pixels = Pixels(self)
         self.pixels.read(pixel_buffer)
-    def make(self, cache_dir=None):
+    def decode(self):
+        # flat rgba floats, one row after another
+        pixels = np.asarray(self.pixels.data)
+        if self.format in [512, 513]:
+            rgba = self.palette.as_array()[pixels.astype(np.intp)]
+        elif self.format in [1024, 1025]:
+            gray = pixels / (0xF if self.format == 1024 else 255)
+            rgba = np.ones((len(gray), 4))
+            rgba[:, :3] = gray[:, None]
+        elif self.format == 3:
+            rgba = pixels.reshape(-1, 4) / 255
+        return rgba.astype(np.float32).ravel()
+    
+    def make(self, cache_dir=None, rgba=None):
         """
         Create and save texture image, using cached version if available.
         
         Args:
             cache_dir: Directory to save texture files. If None, creates in-memory only.
+            rgba: Already decoded pixels (see decode). If None, the texture's pixels are decoded.
         
         Returns:
             bpy.types.Image: The created image (loaded from disk if cache_dir provided)
@@ -138,7 +213,7 @@ class Texture():
         
         if int(self.id) < 0:
             return
-        if self.pixels is None or not self.pixels:
+        if rgba is None and (self.pixels is None or not self.pixels):
             print(f"Texture {self.id} does not have any pixels")
             return
 
@@ -177,36 +252,11 @@ class Texture():
         # Set the alpha mode BEFORE setting pixels
         new_image.alpha_mode = 'CHANNEL_PACKED'  # Use 'STRAIGHT' if your alpha is not premultiplied
         
-        image_pixels = []
-        pixels = self.pixels.data
-        palette = None if self.palette is None or self.palette.data is None else self.palette.data
-        
-        #make image
-        for i in range(self.height):
-            for j in range(self.width):
-                ind = i * self.width + j
-                p = None
-                color = None
-
-                if self.format in [512, 513]:
-                    color = palette[pixels[ind]].to_array()
-
-                if self.format == 1024:
-                    p = pixels[ind]/0xF
-                    color = [p, p, p, 1.0]
-                    
-                elif self.format == 1025:
-                    p = pixels[ind]/255
-                    color = [p, p, p, 1.0]
-
-                elif self.format == 3:
-                    p = pixels[ind]
-                    color = [i / 255 for i in p]
-                    
-                image_pixels.extend(color)
-                
-        if len(image_pixels):
-            new_image.pixels = [p for p in image_pixels]
+        if rgba is None:
+            rgba = self.decode()
+        self.rgba = rgba
+        if len(rgba):
+            new_image.pixels.foreach_set(rgba)
         
         new_image['format'] = self.format
         new_image['id'] = self.id
@@ -315,14 +365,16 @@ class Texture():
         return self
     
 class RGBA5551(DataStruct):
+    format_string = '>H'
+    __slots__ = ('r', 'g', 'b', 'a')
     def __init__(self):
-        super().__init__('>H')
+        super().__init__()
         self.r = 0
         self.g = 0
         self.b = 0
         self.a = 0
     def read(self, buffer, cursor):
-        pallete_color = struct.unpack_from(self.format_string, buffer, cursor)[0]
+        pallete_color = self.codec.unpack_from(buffer, cursor)[0]
         self.a = ((pallete_color >> 0) & 0x1) * 1.0
         self.b = (((pallete_color >> 1) & 0x1F) / 0x1F)
         self.g = (((pallete_color >> 6) & 0x1F) / 0x1F)
@@ -343,31 +395,50 @@ class RGBA5551(DataStruct):
         b = int(self.b * 0x1F) << 1
         a = int(self.a)
         color = (((r | g) | b) | a)
-        struct.pack_into(self.format_string, buffer, cursor, color)
+        self.codec.pack_into(buffer, cursor, color)
         return cursor + self.size
     def distance(self, other):
         return sum([abs(self.r - other.r), abs(self.g - other.g), abs(self.b - other.b)])
     def __eq__(self, other):
         return self.r == other.r and self.g == other.g and self.b == other.b and self.a == other.a
     
+def rgba5551_lut():
+    # every 16 bit color decoded the same way RGBA5551.read does it, alpha is forced on for anything but black
+    color = np.arange(0x10000, dtype = np.uint32)
+    lut = np.zeros((0x10000, 4), dtype = np.float64)
+    lut[:, 0] = ((color >> 11) & 0x1F) / 0x1F
+    lut[:, 1] = ((color >> 6) & 0x1F) / 0x1F
+    lut[:, 2] = ((color >> 1) & 0x1F) / 0x1F
+    lut[:, 3] = color & 0x1
+    lut[(lut[:, 0] + lut[:, 1] + lut[:, 2] > 0), 3] = 1.0
+    return lut
+
+RGBA5551_LUT = rgba5551_lut()
+    
 class Palette():
     def __init__(self, texture):
         self.texture = texture
         self.data = []
+        self.array = None
         self.map = {}
     
     def read(self, buffer):
         if not buffer:
             return []
 
-        for cursor in range(0, len(buffer), 2):
-            self.data.append(RGBA5551().read(buffer, cursor))
+        self.array = RGBA5551_LUT[BinaryReader(buffer).read_array('>u2', len(buffer) // 2)]
+        self.data = [RGBA5551().from_array(color) for color in self.array.tolist()]
 
         return self.data
     
     def to_array(self):
         return [c.to_array() for c in self.data]
     
+    def as_array(self):
+        if self.array is not None and len(self.array) == len(self.data):
+            return self.array
+        return np.array(self.to_array(), dtype = np.float64).reshape(-1, 4)
+    
     def unmake(self, image, override_format = None):
         if override_format is not None:
             threshold = 16 if int(override_format) == 512 else 256
@@ -418,75 +489,26 @@ class Pixels():
         if buffer is None:
             return self.data
         
-        cursor = 0
-        pixel_count = self.texture.width * self.texture.height
-        padded_width = page_width_padding(self.texture.width, self.texture.format)
+        # rows are padded to page_width_padding, so the buffer is viewed as (height, padded row) and cropped.
+        # 4 bit formats keep the high nibble first
+        width, height, format = self.texture.width, self.texture.height, self.texture.format
+        padded_width = page_width_padding(width, format)
+        stride = int(padded_width * format_map[format])
+        row_size = int(math.ceil(width * format_map[format]))
         
-        # if self.texture.format == 3:
-        #     for i in range(pixel_count):
-        #         r, g, b, a = struct.unpack('>BBBB', buffer[cursor:cursor + 4])
-        #         self.data.append([r, g, b, a])
-        #         cursor += 4
-
-        # elif self.texture.format == 512:
-        #     for i in range(min(round(pixel_count/2), len(buffer))):
-        #         p = buffer[cursor]
-        #         pixel_0 = (p >> 4) & 0xF
-        #         pixel_1 = p & 0xF
-        #         self.data.extend([pixel_0, pixel_1])
-        #         cursor += 1
-
-        # elif self.texture.format == 513:
-        #     for i in range(pixel_count):
-        #         pixel = buffer[cursor]
-        #         self.data.append(pixel)
-        #         cursor += 1
-
-        # elif self.texture.format == 1024:
-        #     for i in range(round(pixel_count/2)):
-        #         p = buffer[cursor]
-        #         pixel_0 = ((p >> 4) & 0xF) * 0x11
-        #         pixel_1 = (p & 0xF) * 0x11
-        #         self.data.extend([pixel_0, pixel_1])
-        #         cursor += 1
-
-        # elif self.texture.format == 1025:
-        #     for i in range(pixel_count):
-        #         pixel = buffer[cursor]
-        #         self.data.append(pixel)
-        #         cursor += 1
-
-
-        #for each row in the pixel buffer
-        for r in range(self.texture.height):
-
-            cursor = r * padded_width * format_map[self.texture.format]
-            #for each pixel in a row
-            for p in range(self.texture.width):
-                if cursor >= len(buffer) :
-                    print("buffer was shorter than expected")
-                    return self.data
-                
-                p8 = buffer[math.floor(cursor)]
-                
-                if self.texture.format == 3:
-                    r = p8
-                    g = buffer[int(cursor) + 1]
-                    b = buffer[int(cursor) + 2]
-                    a = buffer[int(cursor) + 3]
-                    self.data.append([r, g, b, a])
-                    cursor += 4
-                    
-                elif self.texture.format in [512, 1024]:
-                    p4 = (p8 >> 4) & 0xF
-                    if cursor % 1:
-                        p4 = (p8) & 0xF
-                    self.data.append(p4)
-                    cursor += 0.5
-                    
-                elif self.texture.format in [513, 1025]:
-                    self.data.append(p8)
-                    cursor += 1
+        buffer = BinaryReader(buffer).read_array(np.uint8, len(buffer))
+        if len(buffer) < (height - 1) * stride + row_size:
+            print("buffer was shorter than expected")
+        if len(buffer) < height * stride:
+            buffer = np.concatenate([buffer, np.zeros(height * stride - len(buffer), dtype = np.uint8)])
+        rows = buffer[:height * stride].reshape(height, stride)[:, :row_size]
+        
+        if format == 3:
+            self.data = rows.reshape(-1, 4)
+        elif format in [512, 1024]:
+            self.data = np.stack([rows >> 4, rows & 0xF], axis = 2).reshape(height, -1)[:, :width].ravel()
+        elif format in [513, 1025]:
+            self.data = rows.ravel()
 
         return self.data
 
@@ -20,110 +20,144 @@
 # /licenses>.
 
 import bpy
+import os
 from .swe1r.modelblock import Model
 from .swe1r.splineblock import Spline
 from .swe1r.textureblock import Texture
-from .swe1r.block import Block
+from .swe1r.block import Block, load_block, load_blocks, release_block_maps
 from .swe1r.general import *
+from .swe1r.patch import write_patch
 from .swe1r.textureblock import compute_hash
 from .utils import Podd_MAlt, show_custom_popup
 from datetime import datetime
     
 scale = 100
 
+def collection_types(col):
+    types = [obj.type for obj in col.objects]
+    for child in col.children:
+        for obj in child.objects:
+            types.append(obj.type)
+    return types
+
+def write_debug_file(file_path, model_id, model_buffer, offset_buffer, timestamp):
+    debug_text = ["float, int32, int16_1, int16_2, int8_1, int8_2, int8_3, int8_4, local_offset, pointer"]
+    for i in range(0, len(model_buffer), 4):
+        debug_string = f"{readFloatBE(model_buffer, i)}, {readUInt32BE(model_buffer, i)}, {readInt16BE(model_buffer, i)}, {readInt16BE(model_buffer, i+2)}, {readUInt8(model_buffer, i)}, {readUInt8(model_buffer, i + 1)}, {readUInt8(model_buffer, i + 2)}, {readUInt8(model_buffer, i + 3)}, {i}, {readUInt8(offset_buffer, i//32)}, {(readUInt8(offset_buffer, i//32) >> (7-((i//4)%8)) )& 1 }"
+        debug_text.append(debug_string)
+        
+    with open(file_path + 'model_' + str(model_id) + '_' + timestamp + 'debug.txt', 'a') as file:
+        for string in debug_text:
+            file.write(string + '\n')
+
 def export_model(col, file_path, exports, update_progress):
+    return export_models([col], file_path, exports, update_progress)
+
+def export_models(cols, file_path, exports, update_progress):
+    # every block is parsed once, all collections are injected into it and it is committed in a single write.
+    # if any collection fails nothing is written
+    
     # prepare blender scene for export
     bpy.context.scene.frame_set(0)
     if bpy.context.object and bpy.context.object.mode == 'EDIT':
     # Switch to Object Mode
         bpy.ops.object.mode_set(mode='OBJECT')
     
-    types = [obj.type for obj in col.objects]
-    for child in col.children:
-        for obj in child.objects:
-            types.append(obj.type)
     model_export, texture_export, spline_export = exports
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
     if not len(exports):
-        show_custom_popup(bpy.context, "No Export", f"Please select an element to export")
-        
-    if 'MESH' in types and model_export:
-        
-        update_progress("Parsing .bin files...")
-        
-        modelblock = Block(file_path + 'out_modelblock.bin', 2, update_progress).read()
-        textureblock = Block(file_path + 'out_textureblock.bin', 2, update_progress).read()
-
-        update_progress(f'Unmaking {col.name}...')
-        
-        model = Model(col.export_model).unmake(col, texture_export, textureblock)
-        id = model.id
-        if model is None:
-            show_custom_popup(bpy.context, "Model Error", "There was an issue while exporting the model")
-            return
-        
-        update_progress(f'Writing {col.name}...')
-        
-        offset_buffer, model_buffer = model.write()
-        modelblock.inject([offset_buffer, model_buffer], id)
-        
-        if model.id in Podd_MAlt:
-            # If we're exporting a Podd, write a blank MAlt model
-            MAlt_id = Podd_MAlt[model.id]
-            MAlt = Model(MAlt_id)
-            MAlt.type = '1'
-            MAlt_offset_buffer, MAlt_model_buffer = MAlt.write()
-            modelblock.inject([MAlt_offset_buffer, MAlt_model_buffer], MAlt_id)
+        show_custom_popup(bpy.context, "No Export", "Please select an element to export")
+    
+    types = {col.name: collection_types(col) for col in cols}
+    model_cols = [col for col in cols if 'MESH' in types[col.name]] if model_export else []
+    spline_cols = [col for col in cols if 'CURVE' in types[col.name]] if spline_export else []
+    
+    modelblock = textureblock = splineblock = None
+    separate = []
+    debug = []
+    try:
+        if len(model_cols):
+            update_progress("Parsing .bin files...")
+            
+            modelblock, textureblock = load_blocks([
+                (file_path + 'out_modelblock.bin', 2),
+                (file_path + 'out_textureblock.bin', 2)
+            ], update_progress)
         
-        with open(file_path + 'out_modelblock.bin', 'wb') as file:
-            file.write(modelblock.write())
+        for col in model_cols:
+            update_progress(f'Unmaking {col.name}...')
             
-        if texture_export:
-            update_progress(f'Writing textures...')
+            model = Model(col.export_model).unmake(col, texture_export, textureblock)
+            if model is None:
+                show_custom_popup(bpy.context, "Model Error", f"There was an issue while exporting {col.name}")
+                return
             
-            with open(file_path + 'out_textureblock.bin', 'wb') as file:
-                file.write(textureblock.write())
+            update_progress(f'Writing {col.name}...')
             
-        if bpy.context.scene.is_export_separate:
-            update_progress(f'Writing separate .bin file...')
+            offset_buffer, model_buffer = model.write()
+            modelblock.inject([offset_buffer, model_buffer], model.id)
             
-            with open(file_path + 'model_' + str(model.id) + '_' + timestamp +'.bin', 'wb') as file:
-                file.write(model_buffer)
-            with open(file_path + 'offset_' + str(model.id) + '_' + timestamp +'.bin', 'wb') as file:
-                file.write(offset_buffer)
+            if model.id in Podd_MAlt:
+                # If we're exporting a Podd, write a blank MAlt model
+                MAlt_id = Podd_MAlt[model.id]
+                MAlt = Model(MAlt_id)
+                MAlt.type = '1'
+                MAlt_offset_buffer, MAlt_model_buffer = MAlt.write()
+                modelblock.inject([MAlt_offset_buffer, MAlt_model_buffer], MAlt_id)
             
-        # write debug file
-        debug_text = ["float, int32, int16_1, int16_2, int8_1, int8_2, int8_3, int8_4, local_offset, pointer"]
-        for i in range(0, len(model_buffer), 4):
-            debug_string = f"{readFloatBE(model_buffer, i)}, {readUInt32BE(model_buffer, i)}, {readInt16BE(model_buffer, i)}, {readInt16BE(model_buffer, i+2)}, {readUInt8(model_buffer, i)}, {readUInt8(model_buffer, i + 1)}, {readUInt8(model_buffer, i + 2)}, {readUInt8(model_buffer, i + 3)}, {i}, {readUInt8(offset_buffer, i//32)}, {(readUInt8(offset_buffer, i//32) >> (7-((i//4)%8)) )& 1 }"
-            debug_text.append(debug_string)
+            if bpy.context.scene.is_export_separate:
+                separate.append(('model_' + str(model.id) + '_' + timestamp + '.bin', model_buffer))
+                separate.append(('offset_' + str(model.id) + '_' + timestamp + '.bin', offset_buffer))
             
-        with open(file_path + 'model_' + str(model.id) + '_' + timestamp + 'debug.txt', 'a') as file:
-            for string in debug_text:
-                file.write(string + '\n')
-    
-    if 'CURVE' in types and spline_export:
-        update_progress(f'Unmaking spline...')
-        
-        splineblock = Block(file_path + 'out_splineblock.bin', 1, update_progress).read()
-        spline = Spline().unmake(col)
+            debug.append((model.id, model_buffer, offset_buffer))
         
-        if spline is None:
-            show_custom_popup(bpy.context, "Spline Error", "There was an issue while exporting the spline")
-            return
+        if len(spline_cols):
+            splineblock = load_block(file_path + 'out_splineblock.bin', 1, update_progress)
         
-        update_progress(f'Writing spline...')
-        
-        spline_buffer = spline.write()
-        splineblock.inject([spline_buffer], spline.id)
+        for col in spline_cols:
+            update_progress('Unmaking spline...')
+            
+            spline = Spline().unmake(col)
+            if spline is None:
+                show_custom_popup(bpy.context, "Spline Error", f"There was an issue while exporting the spline in {col.name}")
+                return
+            
+            spline_buffer = spline.write()
+            splineblock.inject([spline_buffer], spline.id)
+            
+            if bpy.context.scene.is_export_separate:
+                separate.append(('spline_' + str(spline.id) + '_' + timestamp + '.bin', spline_buffer))
         
-        with open(file_path + 'out_splineblock.bin', 'wb') as file:
-            file.write(splineblock.write())
+        blocks = [block for block in [modelblock, textureblock if texture_export else None, splineblock] if block is not None]
+        if bpy.context.scene.is_export_patch:
+            # leave the game files alone and only save what changed
+            update_progress('Writing patch...')
+            patch_path = file_path + 'patch_' + timestamp + '.swrp'
+            write_patch(patch_path, blocks)
+        else:
+            # only the injected assets are rewritten, the rest is copied from the original file
+            for block in blocks:
+                update_progress(f'Writing {os.path.basename(block.path)}...')
+                block.commit()
         
-        if bpy.context.scene.is_export_separate:
-            with open(file_path + 'spline_' + str(spline.id) + '_' + timestamp + '.bin', 'wb') as file:
-                file.write(spline_buffer)
-            
-    show_custom_popup(bpy.context, "Exported!", f"Model {col.export_model} was successfully exported")
-    
\ No newline at end of file
+        # debug files only describe exports that actually made it to disk
+        for model_id, model_buffer, offset_buffer in debug:
+            write_debug_file(file_path, model_id, model_buffer, offset_buffer, timestamp)
+    finally:
+        for block in [modelblock, textureblock, splineblock]:
+            if block is not None:
+                block.close()
+        release_block_maps()
+    
+    if len(separate):
+        update_progress('Writing separate .bin files...')
+        for name, buffer in separate:
+            with open(file_path + name, 'wb') as file:
+                file.write(buffer)
+    
+    if bpy.context.scene.is_export_patch:
+        show_custom_popup(bpy.context, "Exported!", f"Patch saved to {patch_path}")
+        return
+    
+    show_custom_popup(bpy.context, "Exported!", f"Model{'s' if len(cols) > 1 else ''} {', '.join([str(col.export_model) for col in cols])} {'were' if len(cols) > 1 else 'was'} successfully exported")
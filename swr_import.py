@@ -20,86 +20,201 @@
 # /licenses>.
 
 import bpy
+import threading
+import traceback
 from .swe1r.modelblock import Model
 from .swe1r.splineblock import Spline
 from .swe1r.spline_map import spline_map
-from .swe1r.block import Block
+from .swe1r.block import Block, load_block, load_blocks, release_block_maps
+from .swe1r.textureblock import texture_cache
 from .utils import UpdateVisibleSelectable, show_custom_popup
 
 scale = 0.01
 
-def import_model(file_path, selector=None, update_progress=None):
-    if selector is None:
-        selector = range(324)
+def count_nodes(nodes):
+    count = 0
+    for node in nodes:
+        if node is None or isinstance(node, dict):
+            continue
+        count += 1 + count_nodes(getattr(node, 'children', []))
+    return count
+
+def remove_collection(collection):
+    # removes a collection with everything that was made in it
+    for child in list(collection.children):
+        remove_collection(child)
+    for obj in list(collection.objects):
+        data = obj.data
+        bpy.data.objects.remove(obj, do_unlink = True)
+        if data is not None and data.users == 0:
+            if isinstance(data, bpy.types.Mesh):
+                bpy.data.meshes.remove(data)
+            elif isinstance(data, bpy.types.Curve):
+                bpy.data.curves.remove(data)
+            elif isinstance(data, bpy.types.Light):
+                bpy.data.lights.remove(data)
+    bpy.data.collections.remove(collection)
+
+class ImportJob():
+    # an import in two halves. read() parses the blocks, models and splines without touching bpy so it can run on a
+    # worker thread, make_steps() then builds the scene one node at a time on the main thread.
+    # cancel() can be called at any point and removes the collections made so far.
+    # the id indexes and the texture cache are shared, so only one job may run at a time
+    active = None
+    
+    def __init__(self, file_path, selector, fps, update_progress = None):
+        self.file_path = file_path
+        self.selector = list(selector)
+        self.fps = fps
+        self.callback = update_progress
+        self.status = "Parsing .bin files"
+        self.progress = 0.0
+        self.error = None
+        self.models = []
+        self.blocks = []
+        self.node_count = 0
+        self.nodes_made = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.reading = True
+        self.cancelled = False
         
-    # cleanup
-
-    mats_removed = 0
-    # update_progress("Deleting unused materials")    
-    # for mat in bpy.data.materials:
-    #     if mat.name.startswith(data_name_prefix_short) and (mat.users == 0 or int(mat.name[11:14]) in selector):
-    #         bpy.data.materials.remove(mat)
-    #         mats_removed += 1
-
-    # if mats_removed > 0:
-    #     print(f'Removed {mats_removed} unused materials.')
-
-
-    # update_progress("Deleting unused images")    
-
-    # imgs_removed = 0
-    # for img in bpy.data.images:
-    #     if img.name.startswith(data_name_prefix_short) and img.users == 0:
-    #         bpy.data.images.remove(img)
-    #         imgs_removed += 1
-
-    # if imgs_removed > 0:
-    #     print(f'Removed {imgs_removed} unused images.')
+    def begin(self):
+        assert ImportJob.active is None, "Another import is still running"
+        ImportJob.active = self
         
-    # setup
-    
-    update_progress("Parsing .bin files")
-    
-    modelblock = Block(file_path + 'out_modelblock.bin', 2, update_progress).read()
-    textureblock = Block(file_path + 'out_textureblock.bin', 2, update_progress).read()
-    splineblock = Block(file_path + 'out_splineblock.bin', 1, update_progress).read()
-
-    modelblock.textureblock = textureblock
-    modelblock.splineblock = splineblock
-
-    # unpacking
-
-    for model_id in selector:
-        update_progress(f'Reading model {model_id}')
-
-        model_buffer = modelblock.fetch(model_id)[1]
-        model = Model(model_id)
-        model.modelblock = modelblock
-        model = model.read(model_buffer)
-        if model is None:
-            print("There was an error while parsing the model")
-            return 
-        update_progress(f'Making model {model_id}')
-
-        collection = model.make()
-        if model_id in spline_map:
-            spline_id = spline_map[model_id]
-            spline_buffer = splineblock.fetch(spline_id)[0]
-            update_progress(f'Reading spline {spline_id}')
+    def start(self):
+        # reads on a worker thread, nothing in there touches bpy
+        self.thread = threading.Thread(target = self.read, daemon = True)
+        self.thread.start()
+        
+    def release(self):
+        if ImportJob.active is self:
+            ImportJob.active = None
+        
+    def update_progress(self, status):
+        self.status = status
+        if self.callback:
+            self.callback(status)
+        
+    def read(self):
+        try:
+            self.update_progress("Parsing .bin files")
             
-            spline = Spline(spline_id).read(spline_buffer)
-            update_progress(f'Making spline {spline_id}')
-            collection.objects.link(spline.make(model.scale))
+            # import only touches the selected models, so the blocks are mapped instead of read into memory
+            modelblock, textureblock, splineblock = self.blocks = load_blocks([
+                (self.file_path + 'out_modelblock.bin', 2),
+                (self.file_path + 'out_textureblock.bin', 2),
+                (self.file_path + 'out_splineblock.bin', 1)
+            ], self.update_progress)
+
+            modelblock.textureblock = textureblock
+            modelblock.splineblock = splineblock
+            
+            for i, model_id in enumerate(self.selector):
+                if self.cancelled:
+                    return
+                self.update_progress(f'Reading model {model_id}')
+
+                model_buffer = modelblock.fetch(model_id)[1]
+                model = Model(model_id, self.fps)
+                model.modelblock = modelblock
+                model = model.read(model_buffer)
+                assert model is not None, f"There was an error while parsing model {model_id}"
+                
+                spline = None
+                if model_id in spline_map:
+                    spline_id = spline_map[model_id]
+                    self.update_progress(f'Reading spline {spline_id}')
+                    spline = Spline(spline_id).read(splineblock.fetch(spline_id)[0])
+                
+                self.models.append((model, spline))
+                self.node_count += count_nodes(model.nodes)
+                # reading is the first fifth of the bar, making the rest
+                self.progress = 0.2 * (i + 1) / len(self.selector)
+        except Exception as e:
+            self.error = e
+            traceback.print_exception(type(e), e, e.__traceback__)
+        finally:
+            with self.lock:
+                self.reading = False
+                if self.cancelled or self.error is not None:
+                    self.close()
+                # a job cancelled while it was reading is only done once the worker stops using the blocks
+                if self.cancelled:
+                    self.release()
+                
+    def make_steps(self):
+        # one texture cache per import, shared by all of its models
+        texture_cache.clear()
+        for model, spline in self.models:
+            for node in model.make_steps():
+                self.nodes_made += 1
+                self.progress = 0.2 + 0.8 * self.nodes_made / max(self.node_count, 1)
+                yield node
+            
+            if spline is not None:
+                self.update_progress(f'Making spline {spline.id}')
+                model.collection.objects.link(spline.make(model.scale))
+                yield spline
+        self.progress = 1.0
+                
+    def close(self):
+        for block in self.blocks:
+            block.close()
+        self.blocks = []
+        release_block_maps()
+        
+    def end_session(self):
+        print(f'Texture cache: {texture_cache.hits} hits, {texture_cache.misses} misses')
+        texture_cache.clear()
+        
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            # a worker that is still reading closes the blocks and releases the job itself once it notices
+            reading = self.reading
+            if not reading:
+                self.close()
+        for model, spline in self.models:
+            if model.collection is not None and model.collection.name in bpy.data.collections:
+                remove_collection(model.collection)
+            model.collection = None
+        texture_cache.clear()
+        if not reading:
+            self.release()
             
-    # reset view layer
-    view_layer = bpy.context.scene.view_layers.get("ViewLayer")
-    bpy.context.window.view_layer = view_layer
-    # toggle visible/selectable
-    UpdateVisibleSelectable(None)
+    def finish(self):
+        self.close()
+        self.end_session()
+        self.release()
+        
+        # reset view layer
+        view_layer = bpy.context.scene.view_layers.get("ViewLayer")
+        bpy.context.window.view_layer = view_layer
+        # toggle visible/selectable
+        UpdateVisibleSelectable(None)
+
+        # reporting
 
-    # reporting
+        print(f'Successfully unpacked {len(self.selector)} models')
 
-    print(f'Successfully unpacked {len(selector)} models')
+        show_custom_popup(bpy.context, "IMPORTED!", f"Successfully unpacked {len(self.selector)} models.")
 
-    show_custom_popup(bpy.context, "IMPORTED!", f"Successfully unpacked {len(selector)} models.")
+def import_model(file_path, selector=None, update_progress=None):
+    # the blocking version of what ImportOperator does from a timer
+    if selector is None:
+        selector = range(324)
     
+    job = ImportJob(file_path, selector, bpy.context.scene.render.fps, update_progress)
+    job.begin()
+    try:
+        job.read()
+        if job.error is not None:
+            raise job.error
+        for step in job.make_steps():
+            pass
+    except BaseException:
+        job.cancel()
+        raise
+    job.finish()
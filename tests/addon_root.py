@@ -0,0 +1,33 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# the add-on folder has an __init__.py, so pytest would collect it as a package and import it before running
+# anything in tests/, which needs blender. loaded through pytest.ini, it collects the folder as a plain directory
+
+import os
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.hookimpl(tryfirst = True)
+def pytest_collect_directory(path, parent):
+    if str(path) == root:
+        return pytest.Dir.from_parent(parent, path = path)
@@ -0,0 +1,44 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# scan summaries have to count what read actually parsed, not only what an export would write
+import numpy as np
+
+from swe1r.block import Block
+from swe1r import batch
+import fixtures
+
+def test_summary_counts_read_animations_and_triggers(tmp_path):
+    rng = np.random.default_rng(0)
+    assets = [fixtures.make_model(0, 2, 2, 12, [], rng), fixtures.make_model(1, 2, 2, 12, [], rng, triggers = 3, anims = 2)]
+    path = str(tmp_path / 'out_modelblock.bin')
+    fixtures.write_block(path, 2, assets)
+    
+    batch.init_worker(path)
+    try:
+        plain, animated = batch.read_model(0), batch.read_model(1)
+    finally:
+        batch.worker_block.close()
+    
+    assert plain['error'] is None and animated['error'] is None
+    assert (plain['animations'], plain['triggers']) == (0, 0)
+    assert (animated['animations'], animated['triggers']) == (2, 3)
+    assert animated['meshes'] == plain['meshes'] == 4
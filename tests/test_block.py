@@ -0,0 +1,160 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# the numpy offset table against the pointer loop, and commit against a full write
+import os
+import json
+import struct
+import random
+import pytest
+
+from swe1r.block import Block, read_offset_table, load_block, release_block_maps, invalidate_block, block_cache
+from swe1r.textureblock import compute_hash
+import fixtures
+
+def reference_offset_table(file, items_per_asset):
+    # the pointer at a time loop Block.read used to run, scanning forward past empty slots for each end
+    asset_count = struct.unpack_from('>I', file, 0)[0]
+    offsets = [[] for asset in range(asset_count)]
+    for i in range(asset_count):
+        for j in range(items_per_asset):
+            offset = i * 4 * items_per_asset + j * 4
+            asset_start = struct.unpack_from('>I', file, 4 + offset)[0]
+            if not asset_start:
+                offsets[i].append(None)
+                continue
+            asset_end = 0
+            while not asset_end and offset < len(file):
+                asset_end = struct.unpack_from('>I', file, 4 + offset + 4)[0]
+                offset += 4
+            offsets[i].append((asset_start, asset_end))
+    return offsets
+
+def sparse_block(asset_count, items_per_asset, empty_ratio, seed):
+    random.seed(seed)
+    item_count = asset_count * items_per_asset
+    header = bytearray((item_count + 2) * 4)
+    struct.pack_into('>I', header, 0, asset_count)
+    cursor = len(header)
+    for k in range(item_count):
+        if random.random() < empty_ratio:
+            continue
+        struct.pack_into('>I', header, 4 + k * 4, cursor)
+        cursor += random.randint(4, 64)
+    struct.pack_into('>I', header, (item_count + 1) * 4, cursor)
+    return bytes(header) + bytes(cursor - len(header))
+
+def test_offset_table_matches_the_pointer_loop():
+    for seed, (asset_count, items_per_asset, empty_ratio) in enumerate([(1, 1, 0.0), (64, 1, 0.6), (50, 2, 0.5), (30, 2, 0.95), (10, 3, 1.0)]):
+        buffer = sparse_block(asset_count, items_per_asset, empty_ratio, seed)
+        assert read_offset_table(buffer, items_per_asset) == reference_offset_table(buffer, items_per_asset)
+
+def test_empty_block():
+    assert read_offset_table(struct.pack('>2I', 0, 8), 2) == []
+
+def write_assets(folder, seed = 0):
+    random.seed(seed)
+    assets = [[bytes(random.getrandbits(8) for k in range(random.randint(8, 64))), None if i % 3 else bytes(16)] for i in range(12)]
+    assets[4] = [None, None]
+    path = os.path.join(str(folder), 'out_testblock.bin')
+    fixtures.write_block(path, 2, assets)
+    return path
+
+def edit(block):
+    block.inject([b'replaced' * 3, None], 2)
+    block.inject([None, b'second item'], 4)
+    block.inject([b'appended past the end', b'x'], 15)
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_commit_matches_write(tmp_path, lazy):
+    path = write_assets(tmp_path)
+    block = Block(path, 2).read(lazy = lazy)
+    edit(block)
+    expected = bytes(block.write())
+    
+    block.commit()
+    with open(path, 'rb') as file:
+        assert file.read() == expected
+    assert block.file_count == 16 and not block.injected
+    assert bytes(block.fetch(2)[0]) == b'replaced' * 3 and bytes(block.fetch(7)[0]) == bytes(Block(path, 2).read().fetch(7)[0])
+    block.close()
+    assert [name for name in os.listdir(str(tmp_path)) if name.endswith('.tmp')] == []
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_block_stays_usable_after_a_failed_replace(tmp_path, monkeypatch, lazy):
+    path = write_assets(tmp_path)
+    with open(path, 'rb') as file:
+        original = file.read()
+    block = Block(path, 2).read(lazy = lazy)
+    edit(block)
+    expected = bytes(block.write())
+    
+    def replace(src, dst):
+        raise OSError("the file is in use")
+    monkeypatch.setattr(os, 'replace', replace)
+    with pytest.raises(OSError):
+        block.commit()
+    monkeypatch.undo()
+    
+    with open(path, 'rb') as file:
+        assert file.read() == original
+    assert [name for name in os.listdir(str(tmp_path)) if name.endswith('.tmp')] == []
+    # untouched assets still come from the old file and the edits are still pending
+    assert bytes(block.fetch(0)[0]) == original[block.offsets[0][0][0]:block.offsets[0][0][1]]
+    assert bytes(block.write()) == expected
+    
+    block.commit()
+    with open(path, 'rb') as file:
+        assert file.read() == expected
+    block.close()
+
+def test_commit_updates_the_hash_sidecar(tmp_path):
+    path = write_assets(tmp_path)
+    block = Block(path, 2).read(lazy = True)
+    block.hash_assets()
+    edit(block)
+    block.commit()
+    block.close()
+    
+    with open(path + '.md5.json') as file:
+        index = json.load(file)
+    stat = os.stat(path)
+    assert [index['size'], index['mtime']] == [stat.st_size, stat.st_mtime_ns]
+    
+    fresh = Block(path, 2).read()
+    assert index['digests'] == [compute_hash(b''.join([item for item in fresh.fetch(i) if item])) for i in range(len(fresh.data))]
+    # a new read trusts the sidecar instead of hashing again
+    assert fresh.load_hash_index() == index['digests']
+
+def test_released_maps_are_mapped_again(tmp_path):
+    path = write_assets(tmp_path)
+    block = load_block(path, 2)
+    expected = bytes(block.fetch(7)[0])
+    block.close()
+    
+    release_block_maps()
+    assert all(cached.file is None for cached in block_cache.values())
+    
+    # the cached offsets are reused and the file is mapped again for the next import
+    block = load_block(path, 2)
+    assert bytes(block.fetch(7)[0]) == expected
+    block.close()
+    invalidate_block()
@@ -0,0 +1,58 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# per-instance layouts switch to a cached class, so slotted DataStructs read and write like before
+import struct
+
+from swe1r.general import DataStruct, FloatPosition, ShortPosition
+from swe1r.modelblock import CollisionVertStrips
+
+class Triple(DataStruct):
+    format_string = '>3h'
+    __slots__ = ()
+
+def test_layouts_are_compiled_per_class():
+    assert FloatPosition.size == 12 and ShortPosition.size == 6
+    assert FloatPosition().codec is FloatPosition.codec
+    assert not hasattr(FloatPosition(), '__dict__')
+
+def test_slotted_instance_takes_its_own_layout():
+    buffer = struct.pack('>4h', 1, -2, 3, 4)
+    wide = Triple()
+    wide.set_format('>4h')
+    narrow = Triple()
+    
+    assert isinstance(wide, Triple) and not hasattr(wide, '__dict__')
+    assert (wide.size, narrow.size, Triple.size) == (8, 6, 6)
+    assert wide.read(buffer, 0).data == (1, -2, 3, 4)
+    assert narrow.read(buffer, 0).data == (1, -2, 3)
+    
+    # switching again starts from the declared class, not the previous layout
+    wide.set_format('>2h')
+    assert wide.read(buffer, 0).data == (1, -2) and type(wide).__bases__ == (Triple,)
+
+def test_strip_layouts_are_per_instance():
+    a = CollisionVertStrips(None, None, 2)
+    b = CollisionVertStrips(None, None, 3)
+    assert (a.size, b.size) == (8, 12)
+    assert type(a) is type(CollisionVertStrips(None, None, 2))
+    a.set_format('>1I')
+    assert (a.size, b.size) == (4, 12)
@@ -0,0 +1,96 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# the digest and file map comparisons behind the diff script
+import os
+import shutil
+import pytest
+
+from swe1r import diff
+from swe1r.block import Block
+import fixtures
+
+def write_folder(folder, models, textures):
+    os.makedirs(folder)
+    fixtures.write_block(os.path.join(folder, 'out_modelblock.bin'), 2, models)
+    fixtures.write_block(os.path.join(folder, 'out_textureblock.bin'), 2, textures)
+    return folder
+
+@pytest.fixture
+def folders(tmp_path):
+    models = [[bytes([i]) * 8, bytes([i]) * (16 + i)] for i in range(8)]
+    textures = [[bytes([i]) * 32, None] for i in range(4)]
+    a = write_folder(str(tmp_path / 'a'), models, textures)
+    
+    models = list(models)
+    models[1] = [models[1][0], b'\xff' * len(models[1][1])] # same size, other bytes
+    models[2] = [models[2][0], models[2][1] + b'longer']
+    models[5] = [None, None]
+    models += [[b'added', b'model']]
+    b = write_folder(str(tmp_path / 'b'), models, textures)
+    
+    same = str(tmp_path / 'same')
+    shutil.copytree(a, same)
+    return a, b, same
+
+def changes(result, kind = 'model'):
+    return {change: [entry['index'] for entry in entries] for change, entries in result[kind].items()}
+
+expected = {'added': [8], 'removed': [5], 'changed': [1, 2]}
+
+@pytest.fixture
+def compared(monkeypatch):
+    # records whether each content comparison used the sidecar digests
+    calls = []
+    same_asset = diff.same_asset
+    def spy(a, b, index, digests):
+        calls.append(digests)
+        return same_asset(a, b, index, digests)
+    monkeypatch.setattr(diff, 'same_asset', spy)
+    return calls
+
+def test_diff_compares_file_maps_without_sidecars(folders, compared):
+    a, b, same = folders
+    result = diff.diff_folders(a, b)
+    assert changes(result) == expected
+    assert changes(result, 'texture') == {'added': [], 'removed': [], 'changed': []}
+    assert len(compared) and not any(compared)
+
+def test_diff_uses_sidecar_digests(folders, compared):
+    a, b, same = folders
+    for folder in [a, b]:
+        for name in ['out_modelblock.bin', 'out_textureblock.bin']:
+            block = Block(os.path.join(folder, name), 2).read(lazy = True)
+            block.hash_assets()
+            block.close()
+            assert os.path.exists(os.path.join(folder, name + '.md5.json'))
+    
+    result = diff.diff_folders(a, b)
+    assert changes(result) == expected
+    assert len(compared) and all(compared)
+
+def test_cli_return_code(folders, capsys):
+    a, b, same = folders
+    assert diff.main([a, same]) == 0
+    assert diff.main([a, b]) == 1
+    output = capsys.readouterr().out
+    assert 'out_modelblock.bin: 4 differences' in output and 'out_textureblock.bin: 0 differences' in output
+    assert diff.main([a, b, '--block', 'texture']) == 0
@@ -0,0 +1,111 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# nested transformed nodes made by Model.make_steps have to end up where the old recursive make put them.
+# needs blender's python module (the bpy wheel, or blender --background --python-expr "import pytest; pytest.main()")
+
+import os
+import sys
+import importlib.util
+import pytest
+
+bpy = pytest.importorskip('bpy')
+mathutils = pytest.importorskip('mathutils')
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope = 'module')
+def addon():
+    spec = importlib.util.spec_from_file_location('swe1r_addon', os.path.join(root, '__init__.py'), submodule_search_locations = [root])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['swe1r_addon'] = module
+    spec.loader.exec_module(module)
+    module.register()
+    yield module
+    module.unregister()
+    del sys.modules['swe1r_addon']
+
+class Progress():
+    def update_progress(self, status):
+        pass
+
+def make_model():
+    # transformed root -> transformed child -> pivot grandchild -> transformed leaf, each with its own matrix
+    from swe1r_addon.swe1r.modelblock import Model, create_node
+    from swe1r_addon.swe1r.general import FloatMatrix, FloatPosition
+
+    model = Model(1, fps = 24)
+    model.type = '3'
+    model.modelblock = Progress()
+    model.header.offsets = [100]
+
+    matrices = [
+        [0.0, 1.0, 0.0, -1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 100.0, 0.0, 0.0],
+        [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, -1.0, 0.0, 0.0, 50.0, 0.0],
+        [2.0, 0.0, 0.0, 0.0, 2.0, 0.0, 0.0, 0.0, 2.0, 0.0, 0.0, 25.0],
+        [0.0, 0.0, 1.0, 0.0, 1.0, 0.0, -1.0, 0.0, 0.0, 10.0, 20.0, 30.0],
+    ]
+    parent = model
+    for i, (node_type, matrix) in enumerate(zip([53348, 53348, 53349, 53348], matrices)):
+        node = create_node(node_type, parent, model)
+        node.id = 100 + i * 100
+        node.matrix = FloatMatrix(matrix)
+        if node_type == 53349:
+            node.bonus = FloatPosition().from_array([0.0, 0.0, 0.0])
+        if parent is model:
+            model.nodes.append(node)
+        else:
+            parent.children.append(node)
+        parent = node
+    return model, matrices
+
+def world_matrices(collection):
+    bpy.context.view_layer.update()
+    return {obj.id: obj.matrix_world.copy() for obj in collection.all_objects}
+
+def test_nested_transforms_match_recursive_make(addon):
+    from swe1r_addon.swe1r.modelblock import FloatMatrix
+
+    model, matrices = make_model()
+    stepped = world_matrices(model.make())
+
+    # the same hierarchy made the old way, every node making its children before returning
+    model, matrices = make_model()
+    collection = bpy.data.collections.new('recursive')
+    bpy.context.scene.collection.children.link(collection)
+    model.collection = collection
+    for node in model.nodes:
+        node.make(None, collection)
+    recursive = world_matrices(collection)
+
+    assert sorted(stepped) == sorted(recursive) == ['100', '200', '300', '400']
+
+    expected = mathutils.Matrix.Identity(4)
+    for i, matrix in enumerate(matrices):
+        local = bpy.data.objects.new('local', None)
+        local.matrix_basis = FloatMatrix(matrix).make(model.scale)
+        expected = expected @ local.matrix_basis
+        bpy.data.objects.remove(local)
+
+        id = str(100 + i * 100)
+        for made in [stepped[id], recursive[id]]:
+            for row, expected_row in zip(made, expected):
+                assert list(row) == pytest.approx(list(expected_row), abs = 1e-5)
@@ -0,0 +1,138 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# the vectorized face builders against the loops they replaced
+
+import struct
+import random
+import pytest
+
+from swe1r.modelblock import expand_strips, VisualsIndexBuffer
+
+def reference_strips(strips):
+    faces = []
+    start = 0
+    for strip in strips:
+        for s in range(strip - 2):
+            if (s % 2) == 0:
+                faces.append([start + s, start + s + 1, start + s + 2])
+            else:
+                faces.append([start + s + 1, start + s, start + s + 2])
+        start += strip
+    return faces
+
+def reference_fixed_strips(strips):
+    faces = []
+    start = 0
+    for strip in strips:
+        for s in range(strip - 2):
+            if (strip == 3):
+                faces.append([start + s, start + s + 1, start + s + 2])
+            elif (s % 2) == 0:
+                faces.append([start + s, start + s + 1, start + s + 3])
+            else:
+                faces.append([start + s, start + s + 1, start + s + 2])
+        start += strip
+    return faces
+
+@pytest.mark.parametrize('seed', range(20))
+def test_expand_strips_matches_the_loops(seed):
+    random.seed(seed)
+    strips = [random.choice([0, 1, 2, 3, 3, 4, 5, random.randint(6, 40)]) for i in range(random.randint(0, 30))]
+    assert expand_strips(strips) == reference_strips(strips)
+    assert expand_strips(strips, fixed_size = True) == reference_fixed_strips(strips)
+    
+    # meshes without a strip buffer use strip_count strips of strip_size
+    size = random.randint(3, 8)
+    assert expand_strips([size] * 5, fixed_size = True) == reference_fixed_strips([size] * 5)
+
+def reference_display_list(buffer, cursor, vert_buffer_addr):
+    # the chunk at a time read and the old make, chunks are (type, values) pairs
+    chunks = []
+    while buffer[cursor] != 223:
+        chunk_type = buffer[cursor]
+        assert chunk_type in [1, 3, 5, 6], f"Invalid index chunk type {chunk_type}"
+        if chunk_type == 1:
+            type, unk1, unk2, max_doubled, start = struct.unpack_from('>BBBBI', buffer, cursor)
+            chunks.append((type, [type, unk1, unk2, max_doubled // 2, round((start - vert_buffer_addr) / 16)]))
+        elif chunk_type == 3:
+            type, unk = struct.unpack_from('>B6xB', buffer, cursor)
+            chunks.append((type, [type, unk]))
+        elif chunk_type == 5:
+            type, *f = struct.unpack_from('>BBBB4x', buffer, cursor)
+            chunks.append((type, [round(i / 2) for i in f]))
+        else:
+            type, *f = struct.unpack_from('>BBBBxBBB', buffer, cursor)
+            chunks.append((type, [round(i / 2) for i in f]))
+        cursor += 8
+    
+    faces = []
+    start = 0
+    for type, values in chunks:
+        if type == 1:
+            start = values[4]
+        elif type == 5:
+            faces.append([start + i for i in values])
+        elif type == 6:
+            faces.append([start + i for i in values[:3]])
+            faces.append([start + i for i in values[3:]])
+    return chunks, faces
+
+def display_list(count, vert_buffer_addr, rng):
+    # 223 shows up as a vertex index too, only the first byte of a command is an opcode
+    commands = []
+    for i in range(count):
+        type = rng.choice([1, 3, 5, 6, 6, 6])
+        if type == 1:
+            commands.append(struct.pack('>BBBBI', 1, rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 64) * 2, vert_buffer_addr + 16 * rng.randint(0, 500)))
+        elif type == 3:
+            commands.append(struct.pack('>B6xB', 3, rng.randint(0, 255)))
+        else:
+            commands.append(bytes([type] + [rng.choice([223, rng.randint(0, 255)]) for k in range(7)]))
+    return b''.join(commands)
+
+# the terminator is looked for 64, then 128, 256... commands at a time
+@pytest.mark.parametrize('count', [0, 1, 63, 64, 65, 191, 192, 193, 447, 448, 1000])
+@pytest.mark.parametrize('tail', [b'', b'\x00\x00\x00', b'\x00' * 7 + b'\x05' * 64])
+def test_display_list_decode_matches_the_chunk_loop(count, tail):
+    rng = random.Random(count)
+    vert_buffer_addr = 0x1230
+    header = bytes(rng.randint(0, 255) for i in range(24))
+    body = display_list(count, vert_buffer_addr, rng)
+    buffer = header + body + b'\xdf' + tail
+    
+    chunks, faces = reference_display_list(buffer, len(header), vert_buffer_addr)
+    index_buffer = VisualsIndexBuffer(None, None).read(buffer, len(header), vert_buffer_addr)
+    assert len(index_buffer.commands) == count
+    assert index_buffer.make() == faces
+    
+    # chunk objects are built on demand from the same commands
+    assert [(chunk.type, chunk.to_array()) for chunk in index_buffer.data] == chunks
+    index_buffer.data = index_buffer.data
+    assert index_buffer.make() == faces
+
+def test_display_list_rejects_unknown_commands():
+    buffer = struct.pack('>BBBBI', 1, 0, 0, 2, 16) + bytes([4]) + bytes(7) + bytes([223]) + bytes(7)
+    with pytest.raises(AssertionError):
+        VisualsIndexBuffer(None, None).read(buffer, 0, 0)
+    # a list that never ends
+    with pytest.raises(AssertionError):
+        VisualsIndexBuffer(None, None).read(bytes([6]) * 8 * 70, 0, 0)
@@ -0,0 +1,95 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# an applied patch has to rebuild the exported blocks byte for byte and refuse any other base
+import os
+import shutil
+import pytest
+
+from swe1r.block import Block, invalidate_block
+from swe1r.patch import write_patch, read_patch, apply_patch
+import fixtures
+
+names = ['out_modelblock.bin', 'out_textureblock.bin']
+
+@pytest.fixture
+def folders(tmp_path):
+    # base is the unmodded game, mod is where the export happens, target is someone else's copy of base
+    base = tmp_path / 'base'
+    base.mkdir()
+    for name, seed in zip(names, [1, 2]):
+        fixtures.write_block(str(base / name), 2, [[os.urandom(seed * 8 + i), None if i % 4 == 3 else os.urandom(i + 1)] for i in range(10)])
+    shutil.copytree(str(base), str(tmp_path / 'mod'))
+    shutil.copytree(str(base), str(tmp_path / 'target'))
+    yield base, tmp_path / 'mod', tmp_path / 'target'
+    invalidate_block()
+
+def edited_blocks(mod):
+    blocks = [Block(str(mod / name), 2).read(lazy = True) for name in names]
+    blocks[0].inject([b'new model offsets', b'new model'], 3)
+    blocks[0].inject([b'past the end', None], 13)
+    blocks[1].inject([b'pixels', b'palette'], 0)
+    return blocks
+
+def read_bytes(path):
+    with open(str(path), 'rb') as file:
+        return file.read()
+
+def test_applied_patch_matches_the_export(folders, tmp_path):
+    base, mod, target = folders
+    blocks = edited_blocks(mod)
+    patch = str(tmp_path / 'mod.swrp')
+    size = write_patch(patch, blocks)
+    expected = [bytes(block.write()) for block in blocks]
+    for block in blocks:
+        block.commit()
+        block.close()
+    
+    assert size < sum([os.path.getsize(str(base / name)) for name in names])
+    assert [sorted(entry['changes']) for entry in read_patch(patch)] == [[3, 13], [0]]
+    
+    apply_patch(patch, str(target))
+    for name, data in zip(names, expected):
+        assert read_bytes(target / name) == read_bytes(mod / name) == data
+
+@pytest.mark.parametrize('change', ['contents', 'size'])
+def test_patch_rejects_a_different_base(folders, tmp_path, change):
+    base, mod, target = folders
+    blocks = edited_blocks(mod)
+    patch = str(tmp_path / 'mod.swrp')
+    write_patch(patch, blocks)
+    for block in blocks:
+        block.close()
+    
+    # only the second block differs, the first one must not be touched either
+    path = target / names[1]
+    data = bytearray(read_bytes(path))
+    if change == 'contents':
+        data[-1] ^= 0xFF
+    else:
+        data += b'\x00' * 4
+    with open(str(path), 'wb') as file:
+        file.write(data)
+    
+    with pytest.raises(AssertionError):
+        apply_patch(patch, str(target))
+    assert read_bytes(target / names[0]) == read_bytes(base / names[0])
+    assert read_bytes(path) == bytes(data)
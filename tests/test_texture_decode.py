@@ -0,0 +1,98 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# Texture.decode against the per pixel loops of the old Pixels.read and Texture.make
+
+import math
+import random
+import numpy as np
+import pytest
+
+from swe1r.textureblock import Texture, page_width_padding, format_map
+
+def reference_palette(buffer):
+    colors = []
+    for cursor in range(0, len(buffer), 2):
+        color = (buffer[cursor] << 8) | buffer[cursor + 1]
+        a = ((color >> 0) & 0x1) * 1.0
+        b = (((color >> 1) & 0x1F) / 0x1F)
+        g = (((color >> 6) & 0x1F) / 0x1F)
+        r = (((color >> 11) & 0x1F) / 0x1F)
+        if (r + g + b) > 0 and a == 0:
+            a = 1.0
+        colors.append([r, g, b, a])
+    return colors
+
+def reference_pixels(buffer, format, width, height):
+    data = []
+    padded_width = page_width_padding(width, format)
+    for r in range(height):
+        cursor = r * padded_width * format_map[format]
+        for p in range(width):
+            p8 = buffer[math.floor(cursor)]
+            if format == 3:
+                data.append([p8, buffer[int(cursor) + 1], buffer[int(cursor) + 2], buffer[int(cursor) + 3]])
+                cursor += 4
+            elif format in [512, 1024]:
+                p4 = (p8 >> 4) & 0xF
+                if cursor % 1:
+                    p4 = (p8) & 0xF
+                data.append(p4)
+                cursor += 0.5
+            elif format in [513, 1025]:
+                data.append(p8)
+                cursor += 1
+    return data
+
+def reference_decode(pixel_buffer, palette_buffer, format, width, height):
+    pixels = reference_pixels(pixel_buffer, format, width, height)
+    palette = reference_palette(palette_buffer) if format in [512, 513] else None
+    image_pixels = []
+    for i in range(height):
+        for j in range(width):
+            ind = i * width + j
+            if format in [512, 513]:
+                color = palette[pixels[ind]]
+            elif format == 1024:
+                p = pixels[ind] / 0xF
+                color = [p, p, p, 1.0]
+            elif format == 1025:
+                p = pixels[ind] / 255
+                color = [p, p, p, 1.0]
+            elif format == 3:
+                color = [c / 255 for c in pixels[ind]]
+            image_pixels.extend(color)
+    return np.array(image_pixels, dtype = np.float32)
+
+@pytest.mark.parametrize('format', [3, 512, 513, 1024, 1025])
+@pytest.mark.parametrize('width, height', [(1, 1), (3, 5), (7, 2), (16, 16), (17, 9), (33, 4), (5, 31), (64, 3)])
+def test_decode_matches_the_pixel_loop(format, width, height):
+    rng = random.Random(format * 1000 + width * 10 + height)
+    stride = int(page_width_padding(width, format) * format_map[format])
+    pixel_buffer = bytes(rng.getrandbits(8) for i in range(stride * height))
+    palette_buffer = bytes(rng.getrandbits(8) for i in range({512: 32, 513: 512}.get(format, 0)))
+    
+    texture = Texture(1, format, width, height)
+    texture.read(pixel_buffer, palette_buffer or None)
+    rgba = texture.decode()
+    
+    assert rgba.dtype == np.float32 and rgba.shape == (width * height * 4,)
+    assert rgba.tolist() == reference_decode(pixel_buffer, palette_buffer, format, width, height).tolist()
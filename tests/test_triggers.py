@@ -0,0 +1,49 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# collision triggers keep their targets through read and write
+import struct
+import numpy as np
+
+from swe1r.modelblock import Model, Mesh
+from swe1r.batch import walk_nodes
+import fixtures
+
+def test_triggers_keep_their_targets_through_read_and_write():
+    rng = np.random.default_rng(0)
+    offset_buffer, buffer = fixtures.make_model(7, 3, 2, 10, [], rng, triggers = 3, anims = 1)
+    buffer = bytes(buffer)
+    
+    model = Model(7, fps = 24).read(buffer)
+    root = model.nodes[0]
+    assert [trigger.id for trigger in model.triggers] == [1, 2, 3]
+    assert model.triggers == [trigger for node in walk_nodes(model) if isinstance(node, Mesh) and node.collision_tags for trigger in node.collision_tags.triggers]
+    assert [trigger.target for trigger in model.triggers] == [root.id] * 3
+    
+    # written again, every trigger points at wherever the root was written
+    written_offsets, written = model.write()
+    written = bytes(written)
+    for trigger in model.triggers:
+        assert struct.unpack_from('>I', written, trigger.write_location + 32)[0] == root.write_location
+    assert written == buffer and bytes(written_offsets) == bytes(offset_buffer)
+    
+    again = Model(7, fps = 24).read(written)
+    assert [trigger.target for trigger in again.triggers] == [again.nodes[0].id] * 3
@@ -0,0 +1,70 @@
+# Copyright (C) 2021-2024
+# lightningpirate@gmail.com
+
+# Created by LightningPirate
+
+# This file is part of SWE1R Import/Export.
+
+#     SWE1R Import/Export is free software; you can redistribute it and/or
+#     modify it under the terms of the GNU General Public License
+#     as published by the Free Software Foundation; either version 3
+#     of the License, or (at your option) any later version.
+
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#     GNU General Public License for more details.
+
+#     You should have received a copy of the GNU General Public License
+#     along with this program; if not, see <https://www.gnu.org
+# /licenses>.
+
+# imported visuals vertices live in one structured array, they have to read like the old per vertex chunks did
+
+import struct
+import numpy as np
+import pytest
+
+from swe1r.modelblock import Model, Mesh
+from swe1r.batch import walk_nodes
+import fixtures
+
+def reference_verts(buffer, cursor, count):
+    # VisualsVertChunk.read and the uv/color loop of the old Mesh.make, one vertex at a time
+    verts = []
+    for i in range(count):
+        x, y, z, uv_x, uv_y, r, g, b, a = struct.unpack_from('>hhh2xhhBBBB', buffer, cursor + i * 16)
+        verts.append({'co': [x, y, z], 'uv': [u / 4096 for u in [uv_x, uv_y]], 'color': [c / 255 for c in [r, g, b, a]], 'raw': [x, y, z, uv_x, uv_y, r, g, b, a]})
+    return verts
+
+@pytest.mark.parametrize('seed', range(3))
+def test_structured_verts_match_the_vertex_loop(seed):
+    rng = np.random.default_rng(seed)
+    buffer = bytearray(fixtures.make_model(seed, 3, 3, int(rng.integers(3, 200)), [], rng)[1])
+    model = Model(seed, fps = 24)
+    
+    # the padding between position and uv is not part of a vertex
+    meshes = [struct.unpack_from(Mesh.format_string, buffer, node.id) for node in walk_nodes(model.read(bytes(buffer))) if isinstance(node, Mesh)]
+    for header in meshes:
+        for i in range(header[16]):
+            buffer[header[14] + i * 16 + 6:header[14] + i * 16 + 8] = b'\xab\xcd'
+    
+    model = Model(seed, fps = 24).read(bytes(buffer))
+    checked = 0
+    for mesh in [node for node in walk_nodes(model) if isinstance(node, Mesh)]:
+        header = struct.unpack_from(Mesh.format_string, buffer, mesh.id)
+        expected = reference_verts(buffer, header[14], header[16])
+        vert_buffer = mesh.visuals_vert_buffer
+        
+        assert vert_buffer.make() == [vert['co'] for vert in expected]
+        assert vert_buffer.uvs().tolist() == np.array([vert['uv'] for vert in expected], dtype = np.float32).tolist()
+        assert vert_buffer.colors().tolist() == np.array([vert['color'] for vert in expected], dtype = np.float32).tolist()
+        
+        # chunks built on demand and written back give the same vertices, with the padding cleared
+        assert [chunk.to_array() for chunk in vert_buffer.data] == [vert['raw'] for vert in expected]
+        for array in [vert_buffer.array, vert_buffer.as_array()]:
+            data = array.tobytes()
+            assert data[6::16] == data[7::16] == bytes(len(expected))
+            assert [list(struct.unpack_from('>hhh2xhhBBBB', data, i * 16)) for i in range(len(expected))] == [vert['raw'] for vert in expected]
+        checked += len(expected)
+    assert checked
@@ -29,85 +29,8 @@ import mathutils
 import copy
 
 from .swe1r.model_list import *
-
-# 'bswe1r' for 'blender swe1r'
-# NOTE: use 3-letter code for data_type and group_id
-data_name_prefix_short = 'bswe1r_'
-data_name_format_short = 'bswe1r_{label}'
-data_name_prefix_short_len = 7
-data_name_format = 'bswe1r_{data_type}_{label}'
-data_name_prefix_len = 11
-data_name_format_long = 'bswe1r_{data_type}_{group_id}_{label}'
-data_name_format_long_len = 15
-
-model_types = [
-    ('0', 'All', 'View all models'),
-    ('1', 'MAlt', 'High LOD Pod Models'),
-    ('2', 'Modl', 'Misc animated elements'),
-    ('3', 'Part', 'Misc props'),
-    ('4', 'Podd', 'Pod models'),
-    ('5', 'Pupp', 'Animated characters'),
-    ('6', 'Scen', 'Animated scenes'),
-    ('7', 'Trak', 'Tracks'),
-    ]
-
-header_sizes = [-1,75, 1,2,75,9, 83,6]
-
-Podd_MAlt = {
-    "2": 0,
-    "4": 3,
-    "6": 5,
-    "8": 7,
-    "9": 10,
-    "12": 11,
-    "14": 13,
-    "17": 15,
-    "16": 18,
-    "20": 19,
-    "22": 21,
-    "24": 23,
-    "26": 25,
-    "28": 27,
-    "30": 29,
-    "32": 31,
-    "34": 33,
-    "36": 35,
-    "38": 37,
-    "40": 39,
-    "42": 41,
-    "44": 43,
-    "46": 45,
-    "299": 298,
-    "301": 300
-}
-
-showbytes = {
-    "115": 16,
-    "142": 16,
-    "130": 16,
-    "133": 16,
-    "232": 16,
-    "145": 16,
-    "143": 32,
-    "134": 32,
-    "131": 32,
-    "233": 32,
-    "136": 16,
-    "144": 64,
-    "139": 16,
-    "135": 64,
-    "148": 32,
-    "315": 64,
-    "140": 16,
-    "132": 64,
-    "137": 32,
-    "141": 16,
-    "1": 16,
-    "128": 16,
-    "138": 64,
-    "231": 64,
-    "129": 16
-}
+from .swe1r.model_types import *
+from .swe1r.general import euclidean_distance
 
 SETTINGS_FILE = os.path.join(bpy.utils.user_resource('CONFIG'), "blender_swe1r_settings.json")
 
@@ -206,7 +129,7 @@ def UpdateVisibleSelectable(self, context = None):
             
     
 def save_settings(self, context):
-    keys = ['import_folder', 'import_type', 'import_model', 'export_folder', 'is_export_model', 'is_export_texture', 'is_export_spline']
+    keys = ['import_folder', 'import_type', 'import_model', 'export_folder', 'is_export_model', 'is_export_texture', 'is_export_spline', 'is_export_patch']
     settings = load_settings()
     for key in [key for key in keys if context.scene.get(key) is not None]:
         settings[key] = context.scene.get(key)
@@ -243,9 +166,6 @@ def SelCol(self, context = None):
 def open_url(url: str) -> None:
     webbrowser.open(url)
 
-def euclidean_distance(color1, color2):
-    return math.sqrt(sum((c1 - c2) ** 2 for c1, c2 in zip(color1, color2)))
-
 def blend_multiply(a: float, b: float) -> float:
     return a*b 
 